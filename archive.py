@@ -0,0 +1,181 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Arquivos ZIP e tar de uma pasta de playlist, gerados durante o envio
+"""
+import io
+import os
+import json
+import time
+import hashlib
+import tarfile
+import zipfile
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+# Tamanho dos blocos lidos dos arquivos e enviados ao cliente
+CHUNK_SIZE = 64 * 1024
+
+# Arquivos da pasta que não entram no pacote (manifesto, downloads incompletos)
+IGNORED_SUFFIXES = (".part", ".tmp", ".ytdl")
+
+class ArchiveEntry(NamedTuple):
+    """Arquivo incluído no pacote"""
+    arcname: str
+    path: str
+    size: int
+    mtime: int
+
+def list_entries(directory: str) -> List[ArchiveEntry]:
+    """Arquivos da pasta da playlist em ordem de nome, dentro de uma pasta com o nome dela"""
+    root = os.path.basename(os.path.normpath(directory))
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.startswith(".") or entry.name.endswith(IGNORED_SUFFIXES) or not entry.is_file():
+            continue
+        stat = entry.stat()
+        entries.append(ArchiveEntry(f"{root}/{entry.name}", entry.path, stat.st_size, int(stat.st_mtime)))
+    return sorted(entries)
+
+class TarArchive:
+    """
+    Arquivo tar (formato PAX, sem compressão) montado sob demanda.
+
+    O tamanho e a posição de cada cabeçalho e arquivo são calculados antes do
+    envio, então qualquer intervalo de bytes pode ser gerado sem montar o pacote
+    inteiro: é isso que permite retomar um download interrompido (Range). O
+    ETag muda sempre que algum arquivo da pasta muda.
+    """
+
+    def __init__(self, entries: List[ArchiveEntry]):
+        # Segmentos do pacote: (início, tamanho, bytes fixos ou caminho de um arquivo)
+        self.segments: List[Tuple[int, int, object]] = []
+        offset = 0
+        for entry in entries:
+            info = tarfile.TarInfo(entry.arcname)
+            info.size = entry.size
+            info.mtime = entry.mtime
+            info.mode = 0o644
+            header = info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")
+            offset = self._add(offset, header)
+            if entry.size:
+                self.segments.append((offset, entry.size, entry.path))
+                offset += entry.size
+            padding = -entry.size % tarfile.BLOCKSIZE
+            if padding:
+                offset = self._add(offset, tarfile.NUL * padding)
+
+        # Fim do pacote: dois blocos vazios
+        self.size = self._add(offset, tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+
+        digest = hashlib.sha256(json.dumps(entries).encode("utf-8")).hexdigest()
+        self.etag = f'"tar-{digest[:32]}"'
+
+    def _add(self, offset: int, data: bytes) -> int:
+        """Acrescenta um segmento de bytes fixos e retorna a posição seguinte"""
+        self.segments.append((offset, len(data), data))
+        return offset + len(data)
+
+    def iter_range(self, start: int, end: int) -> Iterator[bytes]:
+        """Gera os bytes de start até end (inclusive) do pacote"""
+        for offset, length, content in self.segments:
+            if offset + length <= start:
+                continue
+            if offset > end:
+                break
+
+            first = max(start - offset, 0)
+            last = min(end - offset, length - 1)
+            if isinstance(content, bytes):
+                yield content[first:last + 1]
+                continue
+
+            with open(content, "rb") as source:
+                source.seek(first)
+                remaining = last - first + 1
+                while remaining > 0:
+                    chunk = source.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise IOError(f"Arquivo alterado durante o envio: {content}")
+                    remaining -= len(chunk)
+                    yield chunk
+
+class _ChunkWriter(io.RawIOBase):
+    """Destino sem seek para o zipfile: guarda o que foi escrito até ser repassado ao cliente"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        """Retorna e descarta os bytes escritos desde a última chamada"""
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def iter_zip(entries: List[ArchiveEntry]) -> Iterator[bytes]:
+    """
+    Gera um ZIP sem compressão (o áudio já é comprimido) enquanto lê os arquivos.
+
+    Como o destino não permite seek, o zipfile grava o CRC e os tamanhos de
+    cada arquivo depois dos dados (data descriptor), sem arquivo temporário e
+    com memória constante. O conteúdo só é conhecido ao final, então o ZIP não
+    tem tamanho prévio nem permite retomar por intervalo de bytes.
+    """
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for entry in entries:
+            # O formato ZIP não representa datas anteriores a 1980
+            date_time = max(time.localtime(entry.mtime)[:6], (1980, 1, 1, 0, 0, 0))
+            info = zipfile.ZipInfo(entry.arcname, date_time=date_time)
+            info.compress_type = zipfile.ZIP_STORED
+            info.file_size = entry.size
+            force_zip64 = entry.size >= zipfile.ZIP64_LIMIT
+            with open(entry.path, "rb") as source, archive.open(info, "w", force_zip64=force_zip64) as target:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    target.write(chunk)
+                    yield writer.take()
+            yield writer.take()
+    yield writer.take()
+
+def parse_byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta um header Range com um único intervalo ("bytes=início-fim",
+    "bytes=início-" ou "bytes=-sufixo") e retorna (início, fim) inclusivo.
+    Retorna None se o header não puder ser atendido como intervalo (o conteúdo
+    inteiro é enviado) e levanta ValueError se o intervalo estiver fora do conteúdo.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    first, separator, last = (part.strip() for part in ranges.strip().partition("-"))
+    if not separator or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if size == 0:
+        raise ValueError("Conteúdo vazio")
+
+    if not first:
+        # Sufixo: os últimos N bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("Intervalo vazio")
+        return max(size - suffix, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise ValueError("Intervalo fora do conteúdo")
+    if start > end:
+        return None
+    return start, min(end, size - 1)
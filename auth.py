@@ -7,6 +7,8 @@ Licensed under MIT License - see LICENSE file for details.
 
 Autenticação e controle de acesso
 """
+import time
+import hmac
 from datetime import datetime, timedelta
 from typing import Optional
 
@@ -14,10 +16,16 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from config import JWT_SECRET_KEY, JWT_ALGORITHM, JWT_ACCESS_TOKEN_EXPIRE_MINUTES
-from database import get_db
+from config import (
+    JWT_SECRET_KEY, JWT_ALGORITHM, JWT_ACCESS_TOKEN_EXPIRE_MINUTES,
+    AUTH_CACHE_TTL, AUTH_CACHE_MAX_ENTRIES, METRICS_TOKEN
+)
+from cache import TTLCache
+from database import get_async_db
 from models import User
 
 # Configuração do contexto de criptografia de senha
@@ -26,6 +34,18 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 # Configuração do esquema OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Caches da resolução token -> usuário (evitam decodificar o JWT e consultar o banco a cada requisição)
+_token_cache = TTLCache(AUTH_CACHE_TTL, AUTH_CACHE_MAX_ENTRIES)
+_user_cache = TTLCache(AUTH_CACHE_TTL, AUTH_CACHE_MAX_ENTRIES)
+
+def _detached_user_copy(user: User) -> User:
+    """Cópia do usuário desvinculada de sessões (segura para reutilizar entre requisições)"""
+    return User(**{column.name: getattr(user, column.name) for column in User.__table__.columns})
+
+def invalidate_user_cache(username: str):
+    """Remove um usuário do cache de autenticação (chamar após alterá-lo ou excluí-lo)"""
+    _user_cache.delete(username)
+
 def verify_password(plain_password, hashed_password):
     """Verifica se a senha em texto está correta"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -57,7 +77,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     """Obtém o usuário atual a partir do token JWT"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -65,19 +85,32 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    username = _token_cache.get(token)
+    if username is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+            username: str = payload.get("sub")
+            if username is None:
+                raise credentials_exception
+        except JWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        
+        # Nunca manter o token em cache além da sua expiração
+        expires_in = payload["exp"] - time.time() if "exp" in payload else None
+        _token_cache.set(token, username, expires_in)
     
-    user = db.query(User).filter(User.username == username).first()
+    cached_user = _user_cache.get(username)
+    if cached_user is not None:
+        return _detached_user_copy(cached_user)
+    
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
     
-    return user
+    user = _detached_user_copy(user)
+    _user_cache.set(username, user)
+    return _detached_user_copy(user)
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
     """Verifica se o usuário atual está ativo"""
@@ -92,4 +125,13 @@ async def get_admin_user(current_user: User = Depends(get_current_active_user)):
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Acesso negado. Permissão de administrador necessária."
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+async def verify_metrics_access(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    """
+    Libera /metrics para o token fixo METRICS_TOKEN (usado pelo Prometheus)
+    ou, caso contrário, para um administrador autenticado
+    """
+    if METRICS_TOKEN and hmac.compare_digest(token.encode("utf-8"), METRICS_TOKEN.encode("utf-8")):
+        return
+    await get_admin_user(await get_current_active_user(await get_current_user(token, db)))
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Benchmark do tempo ocioso entre o fim de um job e o início do próximo
+
+Executa o DownloadQueueManager com SQLite no lugar do MySQL e um downloader
+falso que apenas registra o instante de início e fim de cada job. Com um
+único slot, a diferença entre o fim de um job e o início do seguinte é o
+tempo em que o slot ficou parado.
+
+Uso:
+    python benchmarks/bench_dispatch_latency.py [--jobs 20] [--duration 0.05]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import functools
+import statistics
+
+# Um único slot para que os jobs sejam executados em sequência
+os.environ.setdefault("MAX_CONCURRENT_DOWNLOADS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+import downloader
+from models import Base, User, SpotifyConfig, Download
+
+
+class FakeDownloader:
+    """Downloader falso que só registra o tempo de execução de cada job"""
+
+    duration = 0.05
+    log_path = None
+
+    def __init__(self, db, user_id):
+        self.db = db
+        self.user_id = user_id
+
+    def download_track(self, track_id, download_id, output_format=None):
+        start = time.time()
+        time.sleep(self.duration)
+        download = self.db.query(Download).filter(Download.download_id == download_id).first()
+        download.status = "concluido"
+        self.db.commit()
+        with open(self.log_path, "a") as log:
+            log.write(f"{start} {time.time()}\n")
+
+
+def configure(db_url, duration, log_path):
+    """SQLite no lugar do MySQL e o downloader falso (no processo da API e em cada worker)"""
+    engine = create_engine(db_url, connect_args={"check_same_thread": False})
+    database.engine = engine
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    FakeDownloader.duration = duration
+    FakeDownloader.log_path = log_path
+    downloader.SpotifyDownloader = FakeDownloader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=20, help="Número de jobs enfileirados")
+    parser.add_argument("--duration", type=float, default=0.05, help="Segundos por job")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        worker_init = functools.partial(
+            configure, f"sqlite:///{os.path.join(tmp, 'bench.db')}", args.duration, os.path.join(tmp, "jobs.log")
+        )
+        worker_init()
+        Base.metadata.create_all(bind=database.engine)
+
+        db = database.SessionLocal()
+        user = User(username="bench", email="bench@example.com", hashed_password="-")
+        db.add(user)
+        db.commit()
+        db.add(SpotifyConfig(user_id=user.id, client_id="-", client_secret="-",
+                             redirect_uri="-", download_path=tmp))
+        db.commit()
+        # A sessão passa a ser usada pelas threads do gerenciador
+        user_id = user.id
+
+        from download_queue import DownloadQueueManager
+        manager = DownloadQueueManager(db, worker_init=worker_init)
+        try:
+            for i in range(args.jobs):
+                manager.enqueue_download(user_id, f"track{i}", "track")
+
+            # Aguardar todos os jobs terminarem
+            deadline = time.time() + args.jobs * (args.duration + 2) + 10
+            while time.time() < deadline:
+                if os.path.exists(FakeDownloader.log_path):
+                    with open(FakeDownloader.log_path) as log:
+                        if len(log.readlines()) >= args.jobs:
+                            break
+                time.sleep(0.05)
+        finally:
+            manager.shutdown()
+
+        with open(FakeDownloader.log_path) as log:
+            spans = sorted(tuple(map(float, line.split())) for line in log)
+
+    gaps = [(spans[i + 1][0] - spans[i][1]) * 1000 for i in range(len(spans) - 1)]
+    print(f"jobs concluídos: {len(spans)}/{args.jobs}")
+    print(f"tempo ocioso entre jobs (ms): média {statistics.mean(gaps):.1f}, "
+          f"mediana {statistics.median(gaps):.1f}, máximo {max(gaps):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Benchmark de ponta a ponta sem acesso à internet
+
+Sobe serviços locais no lugar do Spotify (API Web), da busca do YouTube e do
+servidor de mídia, usa SQLite no lugar do MySQL e executa o fluxo real:
+DownloadQueueManager -> processos worker -> SpotifyDownloader -> yt-dlp.
+Para cada nível de concorrência (MAX_CONCURRENT_DOWNLOADS) mostra jobs/s,
+faixas/s, latência p50/p99 dos jobs (do enfileiramento ao status final) e
+escritas no banco por job.
+
+O servidor local já entrega MP3, então a etapa de conversão não chama o
+FFmpeg. Com --media http, o yt-dlp é substituído por uma requisição direta
+ao servidor de mídia.
+
+Uso:
+    python benchmarks/bench_end_to_end.py [--concurrency 1,2,4] [--tracks 20]
+                                          [--playlists 2] [--playlist-size 10]
+"""
+import io
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import functools
+import threading
+import contextlib
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Cache, limitador e tokens do Spotify em uma pasta temporária (antes de importar o projeto),
+# a mesma nos processos worker, que importam este módulo de novo
+WORK_DIR = os.environ.get("SPOTDOWN_BENCH_DIR") or tempfile.mkdtemp(prefix="spotdown_bench_")
+os.environ["SPOTDOWN_BENCH_DIR"] = WORK_DIR
+os.environ.setdefault("CACHE_PATH", os.path.join(WORK_DIR, "cache.db"))
+os.environ.setdefault("RATE_LIMIT_PATH", os.path.join(WORK_DIR, "ratelimit.db"))
+os.environ.setdefault("TRANSCODE_SLOTS_PATH", os.path.join(WORK_DIR, "transcode_slots"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import database
+import downloader
+import rate_limiter
+import download_queue
+from models import Base, User, SpotifyConfig, Download
+
+FINAL_STATUSES = ("concluido", "erro", "cancelado")
+
+
+# --- Serviços locais ---
+
+def _track(track_id):
+    """Metadados de faixa no formato da API do Spotify"""
+    return {
+        "id": track_id,
+        "name": f"Faixa {track_id}",
+        "artists": [{"name": f"Artista {track_id[:4]}"}],
+        "album": {"name": "Álbum", "images": []}
+    }
+
+
+def _video_id(query):
+    """ID de vídeo (11 caracteres) determinístico para uma busca"""
+    return hashlib.sha1(query.encode("utf-8")).hexdigest()[:11]
+
+
+class FakeServicesHandler(BaseHTTPRequestHandler):
+    """Spotify Web API, página de resultados do YouTube e mídia em um único servidor"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        time.sleep(self.server.latency)
+
+        # /v1/tracks/{id}
+        match = re.fullmatch(r"/v1/tracks/([^/]+)", url.path)
+        if match:
+            return self._json(_track(match.group(1)))
+
+        # /v1/playlists/{id} e /v1/playlists/{id}/tracks
+        match = re.fullmatch(r"/v1/playlists/([^/]+)(/tracks)?", url.path)
+        if match:
+            playlist_id = match.group(1)
+            offset = int(params.get("offset", 0))
+            limit = int(params.get("limit", 100))
+            page = self._playlist_page(playlist_id, offset, limit)
+            if match.group(2):
+                return self._json(page)
+            return self._json({"id": playlist_id, "name": f"Playlist {playlist_id}", "tracks": page})
+
+        # Página de resultados da busca
+        if url.path == "/results":
+            video_id = _video_id(params.get("search_query", ""))
+            return self._send(200, "text/html", f'<a href="/watch?v={video_id}">resultado</a>'.encode())
+
+        # Mídia (MP3 entregue diretamente, como um arquivo de áudio)
+        if url.path == "/watch":
+            return self._send(200, "audio/mpeg", self.server.media)
+
+        self._send(404, "text/plain", b"not found")
+
+    def _playlist_page(self, playlist_id, offset, limit):
+        """Página de faixas de uma playlist "{id}" com server.playlist_size faixas"""
+        total = self.server.playlist_size
+        items = [{"track": _track(f"{playlist_id}t{index}")} for index in range(offset, min(offset + limit, total))]
+        return {"total": total, "items": items}
+
+    def _json(self, data):
+        self._send(200, "application/json", json.dumps(data).encode("utf-8"))
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_services(playlist_size, media_kb, latency_ms):
+    """Inicia os serviços locais em uma thread e retorna o servidor"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeServicesHandler)
+    server.daemon_threads = True
+    # Workers encerrados no fim de cada nível fecham conexões abertas; não é erro
+    server.handle_error = lambda request, client_address: None
+    server.playlist_size = playlist_size
+    server.latency = latency_ms / 1000
+    # Cabeçalhos de frame MP3 repetidos (o conteúdo não é decodificado)
+    server.media = b"\xff\xfb\x90\x00" * (media_kb * 256)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Adaptações do downloader ---
+
+def patch_downloader(base_url, media_mode):
+    """Aponta o downloader para os serviços locais (no processo da API e em cada worker)"""
+    downloader.YOUTUBE_BASE_URL = base_url
+
+    create_client = downloader.create_spotify_client
+
+    def create_local_client(*args):
+        client = create_client(*args)
+        client.prefix = f"{base_url}/v1/"
+        return client
+
+    downloader.create_spotify_client = create_local_client
+
+    download_media = downloader.SpotifyDownloader._download_media
+
+    if media_mode == "http":
+        def fetch_media(self, ydl_opts, video_url):
+            response = self.http.get(video_url)
+            response.raise_for_status()
+            source_path = ydl_opts["outtmpl"].replace("%(ext)s", "mp3")
+            with open(source_path, "wb") as media:
+                media.write(response.content)
+            return source_path
+
+        downloader.SpotifyDownloader._download_media = fetch_media
+    else:
+        def download_quietly(self, ydl_opts, video_url):
+            return download_media(self, dict(ydl_opts, noprogress=True), video_url)
+
+        downloader.SpotifyDownloader._download_media = download_quietly
+
+    # Sem limite de requisições: o objetivo é medir o próprio pipeline
+    for name in rate_limiter.UPSTREAM_LIMITS:
+        rate_limiter.UPSTREAM_LIMITS[name] = (0, 0)
+
+
+def write_spotify_token(user_id):
+    """Token válido no cache do SpotifyOAuth (evita o fluxo de autorização)"""
+    token = {
+        "access_token": "bench",
+        "token_type": "Bearer",
+        "expires_in": 3600,
+        "expires_at": int(time.time()) + 3600,
+        "refresh_token": "bench",
+        "scope": downloader.SPOTIFY_SCOPE
+    }
+    with open(os.path.join(WORK_DIR, f".spotify_cache_{user_id}"), "w") as cache:
+        json.dump(token, cache)
+
+
+def use_sqlite(db_path, db_writes):
+    """SQLite no lugar do MySQL, contando as escritas em db_writes (compartilhado entre processos)"""
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False, "timeout": 60})
+
+    @event.listens_for(engine, "connect")
+    def _configure(connection, _):
+        connection.execute("PRAGMA journal_mode=WAL")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_writes(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().split(" ", 1)[0].upper() in ("INSERT", "UPDATE", "DELETE"):
+            with db_writes.get_lock():
+                db_writes.value += 1
+
+    database.engine = engine
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return engine
+
+
+def init_worker(db_path, db_writes, base_url, media_mode, verbose):
+    """Executado no início de cada processo worker, antes de abrir o banco"""
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    patch_downloader(base_url, media_mode)
+    use_sqlite(db_path, db_writes)
+
+
+# --- Execução ---
+
+def run_level(level, args, db_writes, base_url):
+    """Executa todos os jobs com level downloads simultâneos e retorna as medições"""
+    level_dir = os.path.join(WORK_DIR, f"level_{level}")
+    os.makedirs(level_dir)
+
+    db_path = os.path.join(level_dir, "bench.db")
+    engine = use_sqlite(db_path, db_writes)
+    Base.metadata.create_all(bind=engine)
+
+    db = database.SessionLocal()
+    user = User(username="bench", email="bench@example.com", hashed_password="-")
+    db.add(user)
+    db.commit()
+    db.add(SpotifyConfig(user_id=user.id, client_id="bench", client_secret="bench",
+                         redirect_uri="http://127.0.0.1/callback", download_path=level_dir))
+    db.commit()
+    write_spotify_token(user.id)
+    # A sessão passa a ser usada pelas threads do gerenciador
+    user_id = user.id
+
+    download_queue.MAX_CONCURRENT_DOWNLOADS = level
+    manager = download_queue.DownloadQueueManager(db, worker_init=functools.partial(
+        init_worker, db_path, db_writes, base_url, args.media, args.verbose
+    ))
+    db_writes.value = 0
+
+    # IDs únicos por nível para não aproveitar o cache de metadados do nível anterior
+    jobs = [(f"c{level}t{index}", "track") for index in range(args.tracks)]
+    jobs += [(f"c{level}p{index}", "playlist") for index in range(args.playlists)]
+
+    poll = database.SessionLocal()
+    started = time.perf_counter()
+    enqueued = {}
+    try:
+        for spotify_id, type_ in jobs:
+            download_id = manager.enqueue_download(user_id, spotify_id, type_)
+            enqueued[download_id] = time.perf_counter()
+
+        # Acompanhar o banco até todos os jobs chegarem a um status final
+        finished = {}
+        deadline = started + args.timeout
+        while len(finished) < len(enqueued) and time.perf_counter() < deadline:
+            poll.expire_all()
+            for download_id, status in poll.query(Download.download_id, Download.status).filter(
+                Download.status.in_(FINAL_STATUSES)
+            ).all():
+                if download_id not in finished:
+                    finished[download_id] = (time.perf_counter(), status)
+            poll.commit()
+            time.sleep(0.02)
+        elapsed = time.perf_counter() - started
+    finally:
+        manager.shutdown()
+        poll.close()
+        db.close()
+        engine.dispose()
+
+    latencies = sorted(done - enqueued[download_id] for download_id, (done, _) in finished.items())
+    completed = sum(1 for _, status in finished.values() if status == "concluido")
+    tracks = args.tracks + args.playlists * args.playlist_size
+    return {
+        "jobs": len(jobs),
+        "completed": completed,
+        "errors": len(finished) - completed,
+        "elapsed": elapsed,
+        "jobs_per_sec": len(finished) / elapsed,
+        "tracks_per_sec": tracks / elapsed if completed == len(jobs) else float("nan"),
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "writes_per_job": db_writes.value / len(jobs)
+    }
+
+
+def percentile(values, fraction):
+    """Percentil simples (valor na posição fraction da lista ordenada)"""
+    if not values:
+        return float("nan")
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,2,4", help="Níveis de MAX_CONCURRENT_DOWNLOADS")
+    parser.add_argument("--tracks", type=int, default=20, help="Jobs de faixa por nível")
+    parser.add_argument("--playlists", type=int, default=2, help="Jobs de playlist por nível")
+    parser.add_argument("--playlist-size", type=int, default=10, help="Faixas por playlist")
+    parser.add_argument("--media-kb", type=int, default=256, help="Tamanho de cada arquivo de mídia")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latência de cada resposta dos serviços")
+    parser.add_argument("--media", choices=["ytdlp", "http"], default="ytdlp", help="Como baixar a mídia")
+    parser.add_argument("--timeout", type=float, default=600, help="Tempo máximo por nível (segundos)")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar as mensagens da API e dos workers")
+    args = parser.parse_args()
+
+    # O SpotifyOAuth procura o cache de tokens no diretório atual
+    os.chdir(WORK_DIR)
+
+    server = start_services(args.playlist_size, args.media_kb, args.latency_ms)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    patch_downloader(base_url, args.media)
+    # Contador criado no mesmo contexto (forkserver ou spawn) dos processos worker
+    db_writes = download_queue._mp_context.Value("l", 0)
+
+    print(f"{args.tracks} faixas + {args.playlists} playlists de {args.playlist_size} faixas por nível, "
+          f"mídia via {args.media}, latência {args.latency_ms:.0f} ms")
+    print(f"{'simultâneos':>11} {'jobs/s':>8} {'faixas/s':>9} {'p50 (s)':>8} {'p99 (s)':>8} "
+          f"{'escritas/job':>13} {'erros':>6}")
+    try:
+        for level in [int(value) for value in args.concurrency.split(",")]:
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                result = run_level(level, args, db_writes, base_url)
+            print(f"{level:>11} {result['jobs_per_sec']:>8.2f} {result['tracks_per_sec']:>9.2f} "
+                  f"{result['p50']:>8.2f} {result['p99']:>8.2f} {result['writes_per_job']:>13.1f} "
+                  f"{result['errors']:>6}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
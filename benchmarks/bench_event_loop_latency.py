@@ -0,0 +1,192 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Benchmark da latência das rotas rápidas durante consultas lentas
+
+Sobe a API real (main.app, com SQLite no lugar do MySQL) em um servidor
+uvicorn e mede a latência de GET /downloads/{id} (autenticada, assíncrona)
+enquanto outras requisições executam uma consulta lenta no banco. A consulta
+lenta é feita de três formas:
+
+  - bloqueante: rota async def com a Session síncrona (como era antes),
+    que trava o event loop durante toda a consulta
+  - AsyncSession: rota async def com get_async_db (await na consulta)
+  - threadpool: rota def com get_db, executada no threadpool do Starlette
+
+Uso:
+    python benchmarks/bench_event_loop_latency.py [--duration 3] [--slow-clients 2]
+                                                  [--slow-rows 2000000]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import threading
+
+# Cache e limitador em uma pasta temporária (antes de importar o projeto)
+WORK_DIR = tempfile.mkdtemp(prefix="spotdown_bench_")
+os.environ.setdefault("CACHE_PATH", os.path.join(WORK_DIR, "cache.db"))
+os.environ.setdefault("RATE_LIMIT_PATH", os.path.join(WORK_DIR, "ratelimit.db"))
+os.environ.setdefault("TRANSCODE_SLOTS_PATH", os.path.join(WORK_DIR, "transcode_slots"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+import uvicorn
+from fastapi import Depends
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import database
+
+# SQLite no lugar do MySQL (síncrono e assíncrono, no mesmo arquivo)
+DB_PATH = os.path.join(WORK_DIR, "bench.db")
+database.engine = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=database.engine)
+database.async_engine = create_async_engine(f"sqlite+aiosqlite:///{DB_PATH}")
+database.AsyncSessionLocal = async_sessionmaker(bind=database.async_engine, autoflush=False, expire_on_commit=False)
+
+import main as api
+from auth import create_access_token
+from database import get_db, get_async_db
+from models import Base, User, Download
+
+# Consulta lenta: conta as linhas de uma sequência gerada pelo próprio SQLite
+SLOW_QUERY = text(
+    "WITH RECURSIVE seq(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM seq WHERE x < :rows) "
+    "SELECT count(*) FROM seq"
+)
+
+
+def add_slow_routes(slow_rows):
+    """Rotas de teste que executam a consulta lenta de cada forma"""
+
+    @api.app.get("/bench/bloqueante")
+    async def slow_blocking(db: Session = Depends(get_db)):
+        return {"count": db.execute(SLOW_QUERY, {"rows": slow_rows}).scalar()}
+
+    @api.app.get("/bench/async")
+    async def slow_async(db: AsyncSession = Depends(get_async_db)):
+        return {"count": (await db.execute(SLOW_QUERY, {"rows": slow_rows})).scalar()}
+
+    @api.app.get("/bench/threadpool")
+    def slow_threadpool(db: Session = Depends(get_db)):
+        return {"count": db.execute(SLOW_QUERY, {"rows": slow_rows}).scalar()}
+
+
+def create_fixtures():
+    """Cria um usuário e um download e retorna (token, download_id)"""
+    Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        user = User(username="bench", email="bench@example.com", hashed_password="-")
+        db.add(user)
+        db.commit()
+        download = Download(
+            user_id=user.id, download_id="bench-download", spotify_id="track0",
+            type="track", status="concluido", progress=100.0
+        )
+        db.add(download)
+        db.commit()
+        return create_access_token(data={"sub": user.username}), download.download_id
+    finally:
+        db.close()
+
+
+def start_server():
+    """Sobe main.app em uma porta livre (sem startup: a fila de downloads não é usada)"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(api.app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def percentile(values, fraction):
+    """Percentil simples (valor na posição fraction da lista ordenada)"""
+    if not values:
+        return float("nan")
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def measure(base_url, headers, download_id, slow_path, slow_clients, duration):
+    """
+    Mede a latência (ms) de GET /downloads/{id} durante duration segundos,
+    com slow_clients clientes pedindo slow_path sem parar. Retorna
+    (latências ordenadas, consultas lentas concluídas).
+    """
+    stop = threading.Event()
+    slow_done = []
+
+    def slow_client():
+        with requests.Session() as session:
+            while not stop.is_set():
+                session.get(base_url + slow_path).raise_for_status()
+                slow_done.append(1)
+
+    threads = [threading.Thread(target=slow_client) for _ in range(slow_clients if slow_path else 0)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.2)
+
+    latencies = []
+    with requests.Session() as session:
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            session.get(f"{base_url}/downloads/{download_id}", headers=headers).raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), len(slow_done)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=3, help="Segundos de medição por cenário")
+    parser.add_argument("--slow-clients", type=int, default=2, help="Clientes pedindo a consulta lenta")
+    parser.add_argument("--slow-rows", type=int, default=2000000, help="Tamanho da consulta lenta")
+    args = parser.parse_args()
+
+    add_slow_routes(args.slow_rows)
+    token, download_id = create_fixtures()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with database.engine.connect() as conn:
+        start = time.perf_counter()
+        conn.execute(SLOW_QUERY, {"rows": args.slow_rows})
+        slow_ms = (time.perf_counter() - start) * 1000
+
+    server, base_url = start_server()
+    results = []
+    try:
+        for name, path in (("sem consulta lenta", None), ("bloqueante (antes)", "/bench/bloqueante"),
+                           ("AsyncSession", "/bench/async"), ("threadpool (def)", "/bench/threadpool")):
+            latencies, slow_done = measure(base_url, headers, download_id, path, args.slow_clients, args.duration)
+            results.append((name, latencies, slow_done))
+    finally:
+        server.should_exit = True
+
+    print(f"Consulta lenta de {slow_ms:.0f} ms, {args.slow_clients} clientes, {args.duration:g} s por cenário")
+    print(f"{'consulta lenta':<20} {'pedidos':>8} {'p50 ms':>8} {'p99 ms':>8} {'máx ms':>8} {'lentas':>7}")
+    for name, latencies, slow_done in results:
+        print(f"{name:<20} {len(latencies):>8} {percentile(latencies, 0.50):>8.1f} "
+              f"{percentile(latencies, 0.99):>8.1f} {latencies[-1]:>8.1f} {slow_done:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Simulação da divisão dos slots de download entre usuários
+
+Simula (em tempo virtual, sem banco nem downloads reais) um usuário que
+enfileira várias playlists longas com prioridade 1 enquanto outros usuários
+pedem faixas curtas ao longo do tempo. Compara o despacho antigo (prioridade
+global e ordem de chegada) com o fair_share_order do DownloadQueueManager,
+com e sem limite de downloads simultâneos por usuário, e mostra a
+distribuição do tempo de espera na fila de cada usuário.
+
+Uso:
+    python benchmarks/bench_fair_share.py [--slots 3] [--light-users 5] [--hours 4]
+"""
+import os
+import sys
+import heapq
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from download_queue import fair_share_order
+
+
+def build_jobs(args):
+    """Gera os jobs: (user_id, prioridade, chegada, duração), tempos em segundos"""
+    rng = random.Random(args.seed)
+    jobs = []
+
+    # Usuário 1: playlists longas, todas com prioridade máxima, enfileiradas de uma vez
+    for _ in range(args.heavy_jobs):
+        jobs.append((1, 1, 0.0, args.heavy_minutes * 60))
+
+    # Demais usuários: faixas curtas chegando ao longo do período
+    for user_id in range(2, args.light_users + 2):
+        t = rng.expovariate(1 / (args.light_interval * 60))
+        while t < args.hours * 3600:
+            jobs.append((user_id, 5, t, rng.uniform(2, 5) * 60))
+            t += rng.expovariate(1 / (args.light_interval * 60))
+
+    return jobs
+
+
+def pick_global(waiting, running, shares):
+    """Despacho antigo: prioridade e ordem de chegada, sem considerar o usuário"""
+    return min(waiting, key=lambda job: (job[1], job[2], job[4]))
+
+
+def pick_fair(waiting, running, shares):
+    """Despacho por usuário (fair_share_order) e, dentro do usuário, por prioridade"""
+    oldest = {}
+    for job in waiting:
+        oldest[job[0]] = min(oldest.get(job[0], job[2]), job[2])
+
+    for user_id in fair_share_order(oldest, running, shares):
+        return min((job for job in waiting if job[0] == user_id), key=lambda job: (job[1], job[2], job[4]))
+    return None
+
+
+def simulate(jobs, slots, pick, shares):
+    """Executa a simulação e retorna user_id -> lista de esperas (segundos)"""
+    arrivals = sorted((job[2], seq, job) for seq, job in enumerate(jobs))
+    arrivals = [job + (seq,) for _, seq, job in arrivals]
+    completions = []  # heap de (fim, user_id)
+    waiting = []
+    running = {}
+    waits = {}
+    now = 0.0
+    index = 0
+
+    while index < len(arrivals) or waiting or completions:
+        # Avançar até o próximo evento (chegada ou fim de um job)
+        next_arrival = arrivals[index][2] if index < len(arrivals) else float("inf")
+        next_completion = completions[0][0] if completions else float("inf")
+        now = min(next_arrival, next_completion)
+
+        while completions and completions[0][0] <= now:
+            _, user_id = heapq.heappop(completions)
+            running[user_id] -= 1
+        while index < len(arrivals) and arrivals[index][2] <= now:
+            waiting.append(arrivals[index])
+            index += 1
+
+        # Ocupar os slots livres
+        while waiting and len(completions) < slots:
+            job = pick(waiting, running, shares)
+            if job is None:
+                break  # Todos os usuários com jobs aguardando estão no limite
+            waiting.remove(job)
+            user_id, _, arrival, duration, _ = job
+            running[user_id] = running.get(user_id, 0) + 1
+            waits.setdefault(user_id, []).append(now - arrival)
+            heapq.heappush(completions, (now + duration, user_id))
+
+        if not completions and index >= len(arrivals) and waiting:
+            break  # Nada mais pode ser despachado
+
+    return waits
+
+
+def percentile(values, fraction):
+    """Percentil simples (valor na posição fraction da lista ordenada)"""
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=3, help="MAX_CONCURRENT_DOWNLOADS")
+    parser.add_argument("--heavy-jobs", type=int, default=5, help="Playlists do usuário 1")
+    parser.add_argument("--heavy-minutes", type=float, default=180, help="Duração de cada playlist")
+    parser.add_argument("--light-users", type=int, default=5, help="Usuários que pedem faixas")
+    parser.add_argument("--light-interval", type=float, default=10, help="Minutos médios entre pedidos")
+    parser.add_argument("--hours", type=float, default=4, help="Período dos pedidos de faixas")
+    parser.add_argument("--cap", type=int, default=2, help="Limite por usuário no último cenário")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    jobs = build_jobs(args)
+    users = sorted({job[0] for job in jobs})
+    no_limit = {user_id: (1, 0) for user_id in users}
+    capped = {user_id: (1, args.cap) for user_id in users}
+
+    scenarios = [
+        ("prioridade global (antes)", pick_global, no_limit),
+        ("fair share", pick_fair, no_limit),
+        (f"fair share, limite {args.cap} por usuário", pick_fair, capped),
+    ]
+
+    print(f"{len(jobs)} jobs, {args.slots} slots; espera na fila em minutos")
+    for name, pick, shares in scenarios:
+        waits = simulate(jobs, args.slots, pick, shares)
+        print(f"\n{name}")
+        print(f"{'usuário':<10} {'jobs':>5} {'p50':>8} {'p95':>8} {'máx':>8}")
+        for user_id in users:
+            values = [wait / 60 for wait in waits.get(user_id, [])]
+            if not values:
+                continue
+            print(f"{user_id:<10} {len(values):>5} {statistics.median(values):>8.1f} "
+                  f"{percentile(values, 0.95):>8.1f} {max(values):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Benchmark da consulta de /files: sufixo do caminho (LIKE) x chave do catálogo
+
+Cria um usuário com históricos de tamanhos crescentes em um banco SQLite e
+compara a consulta antiga (Download.file_path terminando com o nome pedido,
+que percorre todos os downloads) com a busca pela chave em download_files
+(índice único), pedindo sempre o arquivo mais recente do histórico (o último
+encontrado pela varredura).
+
+Uso:
+    python benchmarks/bench_file_lookup.py [--sizes 1000 10000 100000] [--repeat 20]
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, User, Download, DownloadFile, make_file_key
+
+
+def populate(db, user_id, start, rows):
+    """Insere faixas concluídas (e seus registros no catálogo) a partir da posição start"""
+    downloads, files = [], []
+    for i in range(start, start + rows):
+        download_id = str(uuid.uuid4())
+        file_path = f"./downloads/Artista {i} - Faixa {i}.mp3"
+        downloads.append({
+            "user_id": user_id, "download_id": download_id, "spotify_id": f"track{i}",
+            "type": "track", "status": "concluido", "progress": 100.0, "file_path": file_path,
+        })
+        files.append({
+            "file_key": make_file_key(download_id, 0), "user_id": user_id,
+            "download_id": download_id, "track_index": 0, "file_path": file_path,
+        })
+    db.bulk_insert_mappings(Download, downloads)
+    db.bulk_insert_mappings(DownloadFile, files)
+    db.commit()
+
+
+def measure(fn, repeat):
+    """Retorna a mediana, em milissegundos, de repeat execuções"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Tamanhos do histórico")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+
+        user = User(username="bench", email="bench@example.com", hashed_password="-")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+
+        rows = 0
+        for size in sorted(args.sizes):
+            populate(db, user_id, rows, size - rows)
+            rows = size
+
+            newest = db.query(DownloadFile).order_by(DownloadFile.id.desc()).first()
+            file_name, file_key = newest.file_name, newest.file_key
+
+            def by_suffix():
+                db.expunge_all()
+                return db.query(Download).filter(
+                    Download.file_path.endswith(file_name),
+                    Download.user_id == user_id
+                ).first()
+
+            def by_key():
+                db.expunge_all()
+                return db.query(DownloadFile).filter(
+                    DownloadFile.file_key == file_key,
+                    DownloadFile.user_id == user_id
+                ).first()
+
+            results.append((size, measure(by_suffix, args.repeat), measure(by_key, args.repeat)))
+
+    print(f"{'downloads':>10} {'sufixo (antes) ms':>18} {'file_key ms':>12}")
+    for size, suffix, key in results:
+        print(f"{size:>10} {suffix:>18.3f} {key:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
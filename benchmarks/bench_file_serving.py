@@ -0,0 +1,110 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Benchmark dos bytes enviados por /files em uma sessão de reprodução
+
+Simula um player que toca uma faixa, avança para alguns pontos dela (Range),
+retoma uma transferência interrompida (Range com If-Range) e toca a faixa
+de novo mais tarde (If-None-Match). Compara a resposta antiga, que envia o
+arquivo inteiro a cada pedido, com a atual (206 e 304), usando a mesma
+resposta de media_response.py.
+
+Uso:
+    python benchmarks/bench_file_serving.py [--size-mb 8] [--seeks 3] [--replays 2] [--sessions 20]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from media_response import media_file_response
+
+
+def make_app(path):
+    """API mínima com a rota antiga (ignora os headers do pedido) e a atual"""
+    app = FastAPI()
+
+    @app.get("/antes")
+    def before():
+        return media_file_response({}, open(path, "rb"), "audio/mpeg", os.path.basename(path))
+
+    @app.get("/depois")
+    def after(request: Request):
+        return media_file_response(request.headers, open(path, "rb"), "audio/mpeg", os.path.basename(path))
+
+    return app
+
+
+def play_session(client, url, size, seeks, replays):
+    """Executa uma sessão de reprodução e retorna (bytes recebidos, pedidos)"""
+    received = requests = 0
+
+    def get(headers=None):
+        nonlocal received, requests
+        response = client.get(url, headers=headers or {})
+        received += len(response.content)
+        requests += 1
+        return response
+
+    # Primeira reprodução
+    etag = get().headers.get("etag", "")
+
+    # Avançar a faixa para alguns pontos (o player pede do ponto até o fim)
+    for index in range(1, seeks + 1):
+        get({"Range": f"bytes={size * index // (seeks + 1)}-"})
+
+    # Retomar uma transferência interrompida em 60%
+    get({"Range": f"bytes={size * 6 // 10}-", "If-Range": etag})
+
+    # Tocar de novo mais tarde, revalidando a cópia guardada pelo cliente
+    for _ in range(replays):
+        get({"If-None-Match": etag})
+
+    return received, requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=8, help="Tamanho da faixa (MB)")
+    parser.add_argument("--seeks", type=int, default=3, help="Avanços na faixa por sessão")
+    parser.add_argument("--replays", type=int, default=2, help="Reproduções repetidas por sessão")
+    parser.add_argument("--sessions", type=int, default=20)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "faixa.mp3")
+        with open(path, "wb") as file:
+            file.write(os.urandom(size))
+
+        with TestClient(make_app(path)) as client:
+            for name, url in (("arquivo inteiro (antes)", "/antes"), ("Range + ETag", "/depois")):
+                received = requests = 0
+                start = time.perf_counter()
+                for _ in range(args.sessions):
+                    session_bytes, session_requests = play_session(client, url, size, args.seeks, args.replays)
+                    received += session_bytes
+                    requests += session_requests
+                elapsed = time.perf_counter() - start
+                results.append((name, received / args.sessions, requests / args.sessions, elapsed / args.sessions))
+
+    print(f"Faixa de {args.size_mb:g} MB, {args.seeks} avanços, 1 retomada e {args.replays} reproduções por sessão")
+    print(f"{'resposta':<24} {'MB/sessão':>10} {'pedidos':>8} {'ms/sessão':>10}")
+    for name, received, requests, elapsed in results:
+        print(f"{name:<24} {received / 1024 / 1024:>10.2f} {requests:>8.0f} {elapsed * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Benchmark da listagem de downloads: lista completa x paginação por cursor
+
+Cria um usuário com muitos downloads em um banco SQLite e compara a latência
+da consulta antiga (todos os registros) com a paginação por cursor, tanto na
+primeira página quanto em uma página profunda.
+
+Uso:
+    python benchmarks/bench_list_downloads.py [--rows 100000] [--limit 50]
+"""
+import os
+import sys
+import time
+import uuid
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, User, Download
+from main import paginate_downloads, split_page
+
+STATUSES = ["concluido", "concluido", "concluido", "erro", "cancelado"]
+
+
+def populate(db, user_id, rows):
+    """Insere downloads com datas de criação crescentes"""
+    start = datetime(2024, 1, 1)
+    mappings = [
+        {
+            "user_id": user_id,
+            "download_id": str(uuid.uuid4()),
+            "spotify_id": f"track{i}",
+            "type": "track",
+            "status": STATUSES[i % len(STATUSES)],
+            "progress": 100.0,
+            "created_at": start + timedelta(seconds=i),
+            "updated_at": start + timedelta(seconds=i),
+        }
+        for i in range(rows)
+    ]
+    db.bulk_insert_mappings(Download, mappings)
+    db.commit()
+
+
+def measure(fn, repeat):
+    """Retorna a mediana, em milissegundos, de repeat execuções"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="Downloads do usuário")
+    parser.add_argument("--limit", type=int, default=50, help="Itens por página")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+
+        user = User(username="bench", email="bench@example.com", hashed_password="-")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        populate(db, user_id, args.rows)
+
+        base = select(Download).where(Download.user_id == user_id)
+
+        def page(statement, limit, cursor=None):
+            db.expunge_all()
+            rows = db.execute(paginate_downloads(statement, limit, cursor)).scalars().all()
+            return split_page(rows, limit)
+
+        def full_listing():
+            db.expunge_all()
+            return db.execute(base.order_by(Download.created_at.desc())).scalars().all()
+
+        # Cursor de uma página no meio do histórico
+        _, deep_cursor = page(base, args.rows // 2)
+
+        results = [
+            ("lista completa (antes)", measure(full_listing, args.repeat)),
+            ("primeira página", measure(lambda: page(base, args.limit), args.repeat)),
+            ("página no meio do histórico", measure(lambda: page(base, args.limit, deep_cursor), args.repeat)),
+            ("primeira página com status=erro",
+             measure(lambda: page(base.where(Download.status == "erro"), args.limit), args.repeat)),
+        ]
+
+    print(f"{args.rows} downloads, páginas de {args.limit}")
+    for name, elapsed in results:
+        print(f"{name:<34} {elapsed:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Benchmark do custo de CPU de cada formato de saída (mp3, remux e native)
+
+Gera com o FFmpeg uma faixa de teste no formato em que o YouTube costuma
+entregar o áudio (Opus em WebM ou AAC em M4A) e passa cópias dela pela etapa
+final do downloader (_transcode_stage, ou o registro direto no formato native).
+Mostra os segundos de CPU por faixa (somando os processos do FFmpeg), o tempo
+total por faixa e o tamanho do arquivo gerado. Requer o FFmpeg instalado.
+
+Uso:
+    python benchmarks/bench_output_formats.py [--tracks 5] [--duration 180] [--source webm]
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_store import ContentStore
+from downloader import SpotifyDownloader
+from metrics import get_metrics
+
+# Codificação da faixa de teste para cada formato de origem
+SOURCES = {
+    "webm": ["-codec:a", "libopus", "-b:a", "160k"],
+    "m4a": ["-codec:a", "aac", "-b:a", "128k"],
+}
+
+
+def make_source(path, extension, duration):
+    """Gera uma faixa de teste (tons variados, para o codificador ter trabalho)"""
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi",
+         "-i", f"sine=frequency=440:beep_factor=4:duration={duration}",
+         "-f", "lavfi", "-i", f"anoisesrc=amplitude=0.05:duration={duration}",
+         "-filter_complex", "amix=inputs=2", "-ac", "2", *SOURCES[extension], path],
+        check=True, capture_output=True
+    )
+
+
+def make_downloader(download_path):
+    """Cria um downloader sem banco de dados nem Spotify (apenas a etapa final é usada)"""
+    downloader = SpotifyDownloader.__new__(SpotifyDownloader)
+    downloader.download_path = download_path
+    downloader.content_store = ContentStore(os.path.join(download_path, ".store"))
+    downloader.metrics = get_metrics()
+    return downloader
+
+
+def children_cpu():
+    """Segundos de CPU (usuário + sistema) dos processos filhos já encerrados"""
+    times = os.times()
+    return times.children_user + times.children_system
+
+
+def run_mode(downloader, source, output_format, tracks, workdir):
+    """Processa tracks cópias da faixa no formato informado e retorna as medições"""
+    extension = os.path.splitext(source)[1][1:]
+    cpu = wall = 0.0
+    size = 0
+    for index in range(tracks):
+        filename = f"{output_format}_{index}"
+        source_path = os.path.join(workdir, f"{filename}.{extension}")
+        shutil.copyfile(source, source_path)
+        item = {
+            "track": {"id": filename}, "query": filename, "filename": filename,
+            "target_path": workdir, "source_path": source_path, "output_format": output_format
+        }
+
+        cpu_start, wall_start = children_cpu(), time.perf_counter()
+        if output_format == "native":
+            result = downloader._store_output(item, source_path)
+        else:
+            result = downloader._transcode_stage(item)
+        cpu += children_cpu() - cpu_start
+        wall += time.perf_counter() - wall_start
+        size += os.path.getsize(result["file_path"])
+
+    return {"cpu": cpu / tracks, "wall": wall / tracks, "size": size / tracks, "file": result["file_path"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type=int, default=5, help="Faixas por formato")
+    parser.add_argument("--duration", type=int, default=180, help="Duração da faixa de teste (segundos)")
+    parser.add_argument("--source", choices=sorted(SOURCES), default="webm", help="Formato baixado do YouTube")
+    args = parser.parse_args()
+
+    if shutil.which("ffmpeg") is None:
+        sys.exit("FFmpeg não encontrado: instale o FFmpeg para executar este benchmark")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, f"source.{args.source}")
+        make_source(source, args.source, args.duration)
+        downloader = make_downloader(tmp)
+
+        print(f"{args.tracks} faixas de {args.duration}s, origem {args.source}")
+        print(f"{'formato':<8} {'saída':<6} {'CPU s/faixa':>12} {'tempo s/faixa':>14} {'tamanho (KB)':>13}")
+        for output_format in ("mp3", "remux", "native"):
+            result = run_mode(downloader, source, output_format, args.tracks, tmp)
+            output = os.path.splitext(result["file"])[1][1:]
+            print(f"{output_format:<8} {output:<6} {result['cpu']:>12.3f} {result['wall']:>14.3f} "
+                  f"{result['size'] / 1024:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Benchmark do download de playlists em função do tamanho do pool de faixas
+
+Simula uma playlist em que cada faixa leva um tempo fixo de rede e, em
+seguida, uma conversão que ocupa um núcleo (em um processo separado, como o
+FFmpeg). Mede o tempo total de download_playlist para diferentes números de
+workers, com download e conversão na mesma vaga (como antes do pipeline) e
+com as etapas separadas (conversão limitada por TRANSCODE_WORKERS).
+
+Uso:
+    python benchmarks/bench_playlist_workers.py [--tracks 60] [--latency 0.2] [--transcode 0.1]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import downloader as downloader_module
+import pipeline
+from cache import SharedCache
+from config import TRANSCODE_WORKERS
+from content_store import ContentStore
+from downloader import SpotifyDownloader
+from metrics import get_metrics
+
+
+class FakeSpotify:
+    """Cliente Spotify falso que devolve uma playlist paginada"""
+
+    def __init__(self, total, page_size=100):
+        self.total = total
+        self.page_size = page_size
+
+    def _page(self, offset, limit):
+        items = [
+            {"track": {"id": f"track{i}", "name": f"Faixa {i}", "artists": [{"name": "Artista"}]}}
+            for i in range(offset, min(offset + limit, self.total))
+        ]
+        return {"items": items, "total": self.total}
+
+    def playlist(self, playlist_id, fields=None, additional_types=None):
+        return {"id": playlist_id, "name": "Benchmark", "tracks": self._page(0, self.page_size)}
+
+    def playlist_items(self, playlist_id, fields=None, limit=100, offset=0, additional_types=None):
+        return self._page(offset, limit)
+
+
+def make_downloader(total, latency, download_path, coupled):
+    """Cria um downloader sem banco de dados, simulando a latência de rede de cada faixa"""
+    downloader = SpotifyDownloader.__new__(SpotifyDownloader)
+    downloader.db = None
+    downloader.db_lock = threading.RLock()
+    downloader.user_id = 0
+    downloader.download_path = download_path
+    downloader.sp = FakeSpotify(total)
+    downloader.cache = SharedCache(os.path.join(download_path, "cache.db"))
+    downloader.content_store = ContentStore(os.path.join(download_path, ".store"))
+    downloader.metrics = get_metrics()
+    downloader.output_format = "mp3"
+    downloader.update_download_status = lambda *args, **kwargs: None
+    downloader.search_youtube = lambda query, track_id=None: track_id
+
+    def fake_media(ydl_opts, video_url):
+        time.sleep(latency)
+        source_path = ydl_opts["outtmpl"].replace("%(ext)s", "webm")
+        with open(source_path, "wb") as f:
+            f.write(b"\0" * 1024)
+        return source_path
+
+    downloader._download_media = fake_media
+
+    if coupled:
+        # Antes do pipeline: a conversão ocupava a mesma vaga do download
+        def coupled_steps():
+            return [
+                ("resolve", downloader._resolve_stage),
+                ("search", downloader._search_stage),
+                ("fetch", lambda item: downloader._fetch_stage(item) or downloader._transcode_stage(item)),
+            ]
+
+        downloader._track_steps = coupled_steps
+    return downloader
+
+
+def fake_transcoder(seconds):
+    """Conversão simulada: um processo que ocupa um núcleo por seconds segundos"""
+    code = f"import time\nwhile time.process_time() < {seconds}: pass"
+
+    def transcode(source_path, file_path):
+        if seconds > 0:
+            subprocess.run([sys.executable, "-c", code], check=True)
+        os.replace(source_path, file_path)
+
+    return transcode
+
+
+def run(args, workers, coupled):
+    """Baixa a playlist simulada e retorna o tempo total (segundos)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        downloader = make_downloader(args.tracks, args.latency, tmp, coupled)
+        start = time.perf_counter()
+        result = downloader.download_playlist("bench", "00000000-bench", max_workers=workers)
+        elapsed = time.perf_counter() - start
+        assert result["success"] == args.tracks, result
+        return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type=int, default=60, help="Número de faixas da playlist")
+    parser.add_argument("--latency", type=float, default=0.2, help="Segundos por faixa")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--transcode", type=float, default=0.1, help="Segundos de CPU por conversão")
+    args = parser.parse_args()
+
+    downloader_module.transcode_to_mp3 = fake_transcoder(args.transcode)
+    downloader_module.register_files = lambda *args, **kwargs: None
+
+    with tempfile.TemporaryDirectory() as slots_path:
+        pipeline.transcode_slots = pipeline.ProcessSlots(slots_path, TRANSCODE_WORKERS)
+
+        print(f"{args.tracks} faixas, {args.latency}s de rede + {args.transcode}s de CPU por faixa, "
+              f"{TRANSCODE_WORKERS} conversões simultâneas")
+        print(f"{'workers':>8} {'mesma vaga (s)':>15} {'pipeline (s)':>13} {'ganho':>7}")
+        for workers in args.workers:
+            coupled = run(args, workers, coupled=True)
+            staged = run(args, workers, coupled=False)
+            print(f"{workers:>8} {coupled:>15.2f} {staged:>13.2f} {coupled / staged:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
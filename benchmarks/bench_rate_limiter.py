@@ -0,0 +1,124 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Benchmark do limitador de requisições compartilhado entre processos
+
+Sobe um serviço HTTP local que aceita no máximo --upstream-rate requisições
+por segundo e responde 429 (com Retry-After) acima disso. Vários processos
+fazem requisições a ele pela sessão HTTP do projeto, primeiro sem limitador
+(como antes) e depois com um bucket na taxa do serviço, e o benchmark mostra
+as requisições atendidas por segundo e quantos 429 foram recebidos.
+
+Uso:
+    python benchmarks/bench_rate_limiter.py [--processes 6] [--upstream-rate 50] [--duration 5]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    """Serviço falso com limite de taxa (token bucket com rajada de 1 segundo)"""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            now = time.monotonic()
+            server.tokens = min(server.rate, server.tokens + (now - server.updated_at) * server.rate)
+            server.updated_at = now
+            allowed = server.tokens >= 1
+            if allowed:
+                server.tokens -= 1
+
+        self.send_response(200 if allowed else 429)
+        if not allowed:
+            self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_upstream(rate):
+    """Inicia o serviço falso em uma thread e retorna o servidor"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), UpstreamHandler)
+    server.rate = rate
+    server.tokens = rate
+    server.updated_at = time.monotonic()
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def client(url, duration, rate, limited, results):
+    """Processo cliente: faz requisições pelo tempo indicado e conta as respostas"""
+    import http_client
+    import rate_limiter
+
+    if limited:
+        rate_limiter.UPSTREAM_LIMITS["bench"] = (rate, rate)
+        http_client.UPSTREAM_HOSTS["127.0.0.1"] = "bench"
+    session = http_client.create_http_session(max_retries=0)
+
+    ok = throttled = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        if session.get(url).status_code == 200:
+            ok += 1
+        else:
+            throttled += 1
+    results.put((ok, throttled))
+
+
+def run(url, args, limited):
+    """Executa os processos clientes e soma os resultados"""
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=client, args=(url, args.duration, args.upstream_rate, limited, results))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    totals = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return sum(ok for ok, _ in totals), sum(throttled for _, throttled in totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=6)
+    parser.add_argument("--upstream-rate", type=float, default=50, help="Requisições/s aceitas pelo serviço")
+    parser.add_argument("--duration", type=float, default=5, help="Segundos por cenário")
+    args = parser.parse_args()
+
+    # Bucket em um arquivo temporário (herdado pelos processos clientes)
+    os.environ["RATE_LIMIT_PATH"] = os.path.join(tempfile.mkdtemp(), "ratelimit.db")
+
+    server = start_upstream(args.upstream_rate)
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    print(f"{args.processes} processos, serviço limitado a {args.upstream_rate:.0f} req/s")
+    print(f"{'cenário':<18} {'atendidas/s':>12} {'429':>8}")
+    for name, limited in [("sem limitador", False), ("com limitador", True)]:
+        ok, throttled = run(url, args, limited)
+        print(f"{name:<18} {ok / args.duration:>12.1f} {throttled:>8}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Cache persistente compartilhado entre a API e os processos de download
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from config import CACHE_PATH, CACHE_MAX_ENTRIES
+
+# Valor retornado por get() quando a chave não está no cache (None pode ser um valor válido)
+MISSING = object()
+
+# Quantidade de escritas entre verificações do limite de entradas
+_EVICTION_CHECK_EVERY = 100
+
+# Precisão (segundos) do último acesso usado no descarte LRU: uma leitura só grava
+# accessed_at se o valor gravado for mais antigo que isso
+_ACCESS_UPDATE_INTERVAL = 60.0
+
+# Intervalo (segundos) entre gravações dos contadores de acertos e falhas de cada processo
+_STATS_FLUSH_INTERVAL = 10.0
+
+def connect_shared(local: threading.local, path: str, **kwargs) -> sqlite3.Connection:
+    """
+    Retorna a conexão da thread atual com um arquivo SQLite compartilhado entre
+    processos (WAL), guardada em local e recriada após fork. kwargs são
+    repassados a sqlite3.connect (ex.: isolation_level=None para autocommit).
+    """
+    conn = getattr(local, "conn", None)
+    if conn is None or local.pid != os.getpid():
+        conn = sqlite3.connect(path, timeout=10.0, **kwargs)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        local.conn = conn
+        local.pid = os.getpid()
+    return conn
+
+class SharedCache:
+    """
+    Cache chave-valor com TTL e descarte LRU armazenado em um arquivo SQLite.
+
+    Cada processo (e cada thread) abre sua própria conexão com o mesmo arquivo,
+    então todos os workers compartilham as entradas e os contadores de acertos.
+    As entradas são separadas por tipo (ex.: "spotify_track").
+
+    Uma leitura normalmente não escreve no arquivo (a trava de escrita do WAL é
+    única para todos os processos): os acertos e falhas ficam na memória do
+    processo e são gravados em lote, e o último acesso só é atualizado quando
+    está mais de _ACCESS_UPDATE_INTERVAL segundos desatualizado.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+
+        # Acertos e falhas ainda não gravados, por tipo: [acertos, falhas]
+        self._stats_lock = threading.Lock()
+        self._counts: Dict[str, list] = {}
+        self._counts_pid = os.getpid()
+        self._counts_flushed_at = time.monotonic()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (kind, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed_at ON cache (accessed_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_stats ("
+                " kind TEXT PRIMARY KEY, hits INTEGER NOT NULL DEFAULT 0, misses INTEGER NOT NULL DEFAULT 0)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Retorna a conexão da thread atual (recriada após fork)"""
+        return connect_shared(self._local, self.path)
+
+    def _take_counts(self) -> Dict[str, list]:
+        """Retorna e zera os contadores do processo atual (chamar com self._stats_lock)"""
+        if self._counts_pid != os.getpid():
+            # Processo criado por fork: os contadores herdados pertencem ao processo pai
+            self._counts = {}
+            self._counts_pid = os.getpid()
+        counts, self._counts = self._counts, {}
+        self._counts_flushed_at = time.monotonic()
+        return counts
+
+    def _count(self, kind: str, hit: bool):
+        """Conta um acerto ou falha na memória do processo (gravados a cada _STATS_FLUSH_INTERVAL)"""
+        with self._stats_lock:
+            if self._counts_pid != os.getpid():
+                self._take_counts()
+            counts = self._counts.setdefault(kind, [0, 0])
+            counts[0 if hit else 1] += 1
+            due = time.monotonic() - self._counts_flushed_at >= _STATS_FLUSH_INTERVAL
+
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Soma ao arquivo os acertos e falhas acumulados neste processo (uma única transação)"""
+        with self._stats_lock:
+            counts = self._take_counts()
+        if not counts:
+            return
+
+        rows = [(kind, hits, misses) for kind, (hits, misses) in counts.items()]
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT INTO cache_stats (kind, hits, misses) VALUES (?, ?, ?) "
+                    "ON CONFLICT(kind) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+                    rows
+                )
+        except sqlite3.Error as e:
+            # Devolver à memória para a próxima tentativa
+            with self._stats_lock:
+                for kind, hits, misses in rows:
+                    counts = self._counts.setdefault(kind, [0, 0])
+                    counts[0] += hits
+                    counts[1] += misses
+            print(f"Erro ao gravar as estatísticas do cache: {str(e)}")
+
+    def get(self, kind: str, key: str) -> Any:
+        """Retorna o valor em cache ou MISSING se não existir ou estiver expirado"""
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, accessed_at FROM cache WHERE kind = ? AND key = ? AND expires_at > ?",
+            (kind, key, now)
+        ).fetchone()
+
+        self._count(kind, row is not None)
+        if row is None:
+            return MISSING
+
+        value, accessed_at = row
+        if now - accessed_at >= _ACCESS_UPDATE_INTERVAL:
+            with conn:
+                conn.execute(
+                    "UPDATE cache SET accessed_at = ? WHERE kind = ? AND key = ?",
+                    (now, kind, key)
+                )
+        return json.loads(value)
+
+    def set(self, kind: str, key: str, value: Any, ttl: float):
+        """Armazena um valor (serializável em JSON) por ttl segundos"""
+        self.set_many(kind, [(key, value)], ttl)
+
+    def set_many(self, kind: str, items: Iterable[Tuple[str, Any]], ttl: float):
+        """Armazena vários valores do mesmo tipo em uma única transação"""
+        now = time.time()
+        rows = [(kind, key, json.dumps(value), now + ttl, now) for key, value in items]
+        if not rows:
+            return
+
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (kind, key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+        self._writes += len(rows)
+        if self._writes >= _EVICTION_CHECK_EVERY:
+            self._writes = 0
+            self.evict()
+
+    def get_or_fetch(self, kind: str, key: str, fetch: Callable[[], Any], ttl: float) -> Any:
+        """Retorna o valor em cache ou obtém com fetch() e armazena o resultado"""
+        value = self.get(kind, key)
+        if value is MISSING:
+            value = fetch()
+            self.set(kind, key, value, ttl)
+        return value
+
+    def evict(self):
+        """Remove entradas expiradas e as menos usadas acima do limite de entradas"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+            count = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM cache WHERE rowid IN "
+                    "(SELECT rowid FROM cache ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        """Retorna entradas, acertos e falhas por tipo (os de outros processos, até o último lote gravado)"""
+        self.flush_stats()
+        conn = self._connect()
+        entries = dict(conn.execute(
+            "SELECT kind, COUNT(*) FROM cache WHERE expires_at > ? GROUP BY kind", (time.time(),)
+        ).fetchall())
+
+        result = {}
+        for kind, hits, misses in conn.execute("SELECT kind, hits, misses FROM cache_stats").fetchall():
+            total = hits + misses
+            result[kind] = {
+                "entries": entries.get(kind, 0),
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0
+            }
+        return result
+
+class TTLCache:
+    """Cache em memória com tempo de expiração por entrada e descarte LRU"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Any, tuple]" = OrderedDict()
+
+    def get(self, key):
+        """Retorna o valor em cache ou None se não existir ou estiver expirado"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        """Armazena um valor pelo TTL padrão (ou pelo informado, se menor)"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        """Remove uma entrada"""
+        with self.lock:
+            self.entries.pop(key, None)
+
+# Instância do cache no processo atual
+shared_cache = None
+
+def get_shared_cache() -> SharedCache:
+    """Retorna a instância do cache compartilhado (criada no primeiro uso)"""
+    global shared_cache
+    if shared_cache is None:
+        shared_cache = SharedCache()
+    return shared_cache
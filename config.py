@@ -25,6 +25,13 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "chave_secreta_temporaria")
 JWT_ALGORITHM = "HS256"
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Cache em memória da resolução token -> usuário
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "30"))
+AUTH_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "10000"))
+
+# Token fixo aceito em /metrics (Authorization: Bearer) para o Prometheus; vazio = só administradores
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 # Configuração padrão do Spotify
 DEFAULT_SPOTIFY_CONFIG = {
     "client_id": os.getenv("SPOTIFY_CLIENT_ID", ""),
@@ -38,4 +45,69 @@ API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8801"))
 
 # Configuração da fila de downloads
-MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "3"))
\ No newline at end of file
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "3"))
+
+# Downloads simultâneos por usuário quando o admin não definiu um limite próprio (0 = sem limite)
+USER_MAX_CONCURRENT_DOWNLOADS = int(os.getenv("USER_MAX_CONCURRENT_DOWNLOADS", "0"))
+
+# Número padrão de faixas simultâneas nas etapas de rede (metadados, busca e download)
+# de uma playlist; a conversão do áudio é limitada por TRANSCODE_WORKERS
+PLAYLIST_MAX_WORKERS = int(os.getenv("PLAYLIST_MAX_WORKERS", "4"))
+
+# Conversões de áudio (FFmpeg) simultâneas somando todos os processos worker e pasta
+# dos arquivos de trava que controlam essas vagas
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", str(os.cpu_count() or 1)))
+TRANSCODE_SLOTS_PATH = os.getenv("TRANSCODE_SLOTS_PATH", "./cache/transcode_slots")
+
+# Número de jobs após o qual um processo worker é reciclado (0 = nunca)
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", "50"))
+
+# Lease dos jobs em execução: validade (segundos), intervalo de renovação e tentativas por job.
+# Jobs cujo lease expira (ex.: API encerrada no meio do download) voltam para a fila.
+JOB_LEASE_TTL = int(os.getenv("JOB_LEASE_TTL", "60"))
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "15"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Intervalo (segundos) da limpeza do store de faixas deduplicadas, que remove as faixas
+# sem nenhuma cópia de usuário ou playlist há pelo menos um intervalo (0 = desativada)
+STORE_GC_INTERVAL = float(os.getenv("STORE_GC_INTERVAL", "3600"))
+
+# Gravação de progresso: intervalo máximo (segundos) e avanço mínimo (pontos percentuais)
+PROGRESS_FLUSH_INTERVAL = float(os.getenv("PROGRESS_FLUSH_INTERVAL", "2.0"))
+PROGRESS_MIN_DELTA = float(os.getenv("PROGRESS_MIN_DELTA", "5.0"))
+
+# Cache compartilhado (arquivo SQLite) de metadados
+CACHE_PATH = os.getenv("CACHE_PATH", "./cache/spotdown_cache.db")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "50000"))
+SPOTIFY_TRACK_CACHE_TTL = int(os.getenv("SPOTIFY_TRACK_CACHE_TTL", str(7 * 24 * 3600)))
+YOUTUBE_SEARCH_CACHE_TTL = int(os.getenv("YOUTUBE_SEARCH_CACHE_TTL", str(30 * 24 * 3600)))
+YOUTUBE_NEGATIVE_CACHE_TTL = int(os.getenv("YOUTUBE_NEGATIVE_CACHE_TTL", "3600"))
+
+# Clientes Spotify reaproveitados pela API (por usuário) e cache das pesquisas de cada um
+SPOTIFY_CLIENT_POOL_SIZE = int(os.getenv("SPOTIFY_CLIENT_POOL_SIZE", "256"))
+SPOTIFY_SEARCH_CACHE_TTL = float(os.getenv("SPOTIFY_SEARCH_CACHE_TTL", "120"))
+SPOTIFY_SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SPOTIFY_SEARCH_CACHE_MAX_ENTRIES", "64"))
+
+# Cliente HTTP (Spotify e busca no YouTube)
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.5"))
+
+# Limite de requisições por serviço, compartilhado por todos os processos (arquivo SQLite).
+# Taxa em requisições por segundo (0 = sem limite) e rajada máxima.
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", "./cache/spotdown_ratelimit.db")
+RATE_LIMIT_DEFAULT_BACKOFF = float(os.getenv("RATE_LIMIT_DEFAULT_BACKOFF", "5"))
+SPOTIFY_RATE_LIMIT = float(os.getenv("SPOTIFY_RATE_LIMIT", "10"))
+SPOTIFY_RATE_BURST = float(os.getenv("SPOTIFY_RATE_BURST", "20"))
+YOUTUBE_SEARCH_RATE_LIMIT = float(os.getenv("YOUTUBE_SEARCH_RATE_LIMIT", "2"))
+YOUTUBE_SEARCH_RATE_BURST = float(os.getenv("YOUTUBE_SEARCH_RATE_BURST", "5"))
+YOUTUBE_MEDIA_RATE_LIMIT = float(os.getenv("YOUTUBE_MEDIA_RATE_LIMIT", "1"))
+YOUTUBE_MEDIA_RATE_BURST = float(os.getenv("YOUTUBE_MEDIA_RATE_BURST", "3"))
+
+# Paginação da listagem de downloads
+DOWNLOADS_PAGE_SIZE = int(os.getenv("DOWNLOADS_PAGE_SIZE", "50"))
+DOWNLOADS_MAX_PAGE_SIZE = int(os.getenv("DOWNLOADS_MAX_PAGE_SIZE", "200"))
+
+# Intervalo (segundos) entre heartbeats dos streams de progresso (SSE)
+SSE_HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_INTERVAL", "15"))
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Armazenamento deduplicado de faixas já baixadas
+"""
+import os
+import re
+import time
+import uuid
+import shutil
+from typing import Optional
+
+# Pasta do store dentro da pasta base de downloads
+STORE_DIRNAME = ".store"
+
+class ContentStore:
+    """
+    Guarda uma cópia de cada faixa baixada, identificada pelo ID da faixa no
+    Spotify e pelo formato de saída.
+
+    As cópias dos usuários e playlists são hardlinks para o arquivo do store,
+    então a mesma faixa é baixada e convertida uma única vez. O contador de
+    links do sistema de arquivos funciona como contagem de referências: apagar
+    a cópia de um usuário não afeta as demais, e o arquivo do store só é
+    removido (collect_garbage, executada periodicamente pelo gerenciador de
+    downloads) quando nenhuma cópia aponta mais para ele.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        if not os.path.exists(self.root):
+            os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, track_id: str, fmt: str) -> str:
+        """Caminho do arquivo no store (distribuído em subpastas pelo prefixo do ID)"""
+        safe_id = re.sub(r"[^A-Za-z0-9]", "", track_id)
+        return os.path.join(self.root, safe_id[:2].lower(), f"{safe_id}.{fmt}")
+
+    def lookup(self, track_id: str, fmt: str) -> Optional[str]:
+        """Retorna o caminho da faixa no store, se já tiver sido baixada"""
+        path = self._path(track_id, fmt)
+        return path if os.path.isfile(path) else None
+
+    def add(self, track_id: str, fmt: str, file_path: str) -> str:
+        """Registra no store um arquivo recém-baixado (sem copiar os dados)"""
+        path = self._path(track_id, fmt)
+        if not os.path.isfile(path):
+            _link(file_path, path)
+        return path
+
+    def link(self, track_id: str, fmt: str, dest_path: str) -> bool:
+        """Cria dest_path a partir do store. Retorna False se a faixa não estiver no store"""
+        path = self.lookup(track_id, fmt)
+        if path is None:
+            return False
+
+        try:
+            if os.path.exists(dest_path) and os.path.samefile(path, dest_path):
+                return True
+            _link(path, dest_path)
+        except FileNotFoundError:
+            # Removida do store pela limpeza (collect_garbage) ao mesmo tempo
+            return False
+        return True
+
+    def collect_garbage(self, min_age: float = 0) -> int:
+        """
+        Remove do store as faixas que não têm mais nenhuma cópia de usuário ou
+        playlist (apagadas da pasta de downloads) há pelo menos min_age segundos.
+        Retorna quantas foram removidas.
+        """
+        removed = 0
+        cutoff = time.time() - min_age
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    # A última alteração do contador de links atualiza o ctime
+                    stat_result = os.stat(path)
+                    if stat_result.st_nlink == 1 and stat_result.st_ctime <= cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+def _link(src: str, dest: str):
+    """
+    Cria dest apontando para o mesmo conteúdo de src de forma atômica.
+    Usa hardlink e, se não for possível (ex.: outro sistema de arquivos), copia.
+    """
+    directory = os.path.dirname(dest)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{dest}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(src, tmp_path)
+    except OSError:
+        shutil.copyfile(src, tmp_path)
+    os.replace(tmp_path, dest)
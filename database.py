@@ -8,9 +8,11 @@ Licensed under MIT License - see LICENSE file for details.
 
 Conexão com o banco de dados
 """
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.schema import CreateColumn
 
 from config import MYSQL_HOST, MYSQL_PORT, MYSQL_USER, MYSQL_PASSWORD, MYSQL_DATABASE
 
@@ -27,6 +29,17 @@ engine = create_engine(
 # Criar factory de sessões
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine assíncrona (aiomysql) para as rotas async, que não podem bloquear o event loop
+ASYNC_SQLALCHEMY_DATABASE_URL = f"mysql+aiomysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
+
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_recycle=3600
+)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 # Base para modelos declarativos
 Base = declarative_base()
 
@@ -41,6 +54,14 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """
+    Gera uma sessão assíncrona de banco de dados para endpoints async.
+    As consultas são aguardadas (await) e não bloqueiam outras requisições.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
 def init_db():
     """
     Inicializa o banco de dados, criando todas as tabelas definidas.
@@ -50,9 +71,31 @@ def init_db():
     # Criar tabelas se não existirem
     Base.metadata.create_all(bind=engine)
     
-    # Verificar se existe usuário admin
+    # Adicionar colunas criadas depois das tabelas (create_all não altera tabelas existentes)
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                    print(f"Coluna {table.name}.{column.name} adicionada")
+    
+    # Criar índices adicionados depois da criação das tabelas (create_all não altera tabelas existentes)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    
     db = SessionLocal()
     try:
+        # Registrar no catálogo de arquivos as faixas baixadas antes dele existir
+        from file_catalog import backfill_track_files
+        registered = backfill_track_files(db)
+        if registered:
+            print(f"{registered} arquivos de faixas registrados no catálogo")
+        
+        # Verificar se existe usuário admin
         admin = db.query(User).filter(User.is_admin == True).first()
         
         # Se não existir admin, criar um padrão
@@ -8,49 +8,171 @@ Licensed under MIT License - see LICENSE file for details.
 
 Sistema de filas para gerenciar downloads e processos
 """
-import uuid
+import os
 import time
+import uuid
+import socket
 import threading
-import queue
 import multiprocessing
-from datetime import datetime
-from typing import Dict, Any, Optional
+from multiprocessing.connection import wait as wait_connections
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional, Tuple
 
 # Não importar Session para evitar a tentação de passá-lo entre processos
 # from sqlalchemy.orm import Session 
 
-from models import Download
+from sqlalchemy import and_, func, or_
+
+from models import Download, SpotifyConfig, User, FINAL_STATUSES
 # Remover downloader da importação global para evitar pickle
 # from downloader import SpotifyDownloader 
-from config import MAX_CONCURRENT_DOWNLOADS
+from config import (
+    MAX_CONCURRENT_DOWNLOADS, USER_MAX_CONCURRENT_DOWNLOADS, WORKER_MAX_JOBS,
+    JOB_LEASE_TTL, JOB_HEARTBEAT_INTERVAL, JOB_MAX_ATTEMPTS, STORE_GC_INTERVAL
+)
+from content_store import ContentStore, STORE_DIRNAME
+from events import get_broker, download_event
+from metrics import get_metrics
+
+# Intervalo mínimo (segundos) entre envios das métricas de um worker durante um job
+METRICS_FLUSH_INTERVAL = 5.0
+
+# Os workers não são criados por fork do processo da API: os novos workers são
+# criados pela thread de monitoramento enquanto outras threads podem estar com
+# travas (métricas, sessão HTTP) presas, e um fork herdaria essas travas fechadas.
+# O forkserver cria cada worker a partir de um processo limpo, que já importou os
+# módulos pesados do download (spawn onde o forkserver não existe). Ele é iniciado
+# com "python -c" e só encontra os módulos do projeto pelo PYTHONPATH (sem isso,
+# fora da pasta do projeto, o pré-carregamento falharia sem nenhum aviso).
+if "forkserver" in multiprocessing.get_all_start_methods():
+    _mp_context = multiprocessing.get_context("forkserver")
+    _mp_context.set_forkserver_preload(["downloader"])
+    _project_dir = os.path.dirname(os.path.abspath(__file__))
+    if _project_dir not in os.environ.get("PYTHONPATH", "").split(os.pathsep):
+        os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [_project_dir, os.environ.get("PYTHONPATH")]))
+else:
+    _mp_context = multiprocessing.get_context("spawn")
+
+class _Worker:
+    """Processo de download persistente e o canal usado para enviar jobs a ele"""
+    
+    def __init__(self, worker_id: int, worker_init: Optional[Callable[[], None]] = None):
+        self.worker_id = worker_id
+        self.conn, child_conn = _mp_context.Pipe()
+        self.process = _mp_context.Process(
+            target=_worker_main,
+            args=(child_conn, WORKER_MAX_JOBS, worker_init),
+            name=f"download_worker_{worker_id}",
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        
+        # download_id do job em execução (None se o worker estiver livre) e início do job
+        self.download_id: Optional[str] = None
+        self.started_at: Optional[float] = None
+    
+    def assign(self, download_info: Dict[str, Any]):
+        """Envia um job para o processo do worker"""
+        self.conn.send(download_info)
+        self.download_id = download_info["download_id"]
+        self.started_at = time.monotonic()
+    
+    def stop(self, timeout: float = 1.0):
+        """Encerra o processo do worker (de forma forçada se estiver executando um job)"""
+        try:
+            if self.process.is_alive() and self.download_id is None:
+                self.conn.send(None)
+                self.process.join(timeout=timeout)
+        except (OSError, ValueError):
+            pass
+        
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=timeout)
+        
+        self.conn.close()
 
 class DownloadQueueManager:
-    """Gerenciador de fila de downloads com processos paralelos"""
+    """
+    Gerenciador de fila de downloads com processos paralelos.
+    
+    A fila é a própria tabela downloads. Os slots livres são divididos entre
+    os usuários com jobs aguardando de forma proporcional ao peso de cada um
+    (respeitando o limite de downloads simultâneos do usuário); entre os jobs
+    de um mesmo usuário vale a prioridade e a ordem de chegada. O job escolhido
+    é reservado com um lease (dono e validade)
+    renovado periodicamente enquanto executam. Se a API for encerrada no meio
+    de um download, o lease expira e o job volta para a fila na próxima
+    verificação (inclusive na inicialização), sem perder nem duplicar jobs.
+    """
     
-    def __init__(self, db):
-        """Inicializa o gerenciador de downloads"""
+    def __init__(self, db, worker_init: Optional[Callable[[], None]] = None):
+        """
+        Inicializa o gerenciador de downloads
+        
+        Args:
+            db: Sessão do banco de dados usada pelas threads do gerenciador
+            worker_init: Função (serializável com pickle) executada no início de
+                cada processo worker, antes de abrir o banco (ex.: testes e benchmarks)
+        """
         self.db = db
+        self.worker_init = worker_init
         
-        # Fila de prioridade para downloads (menor número = maior prioridade)
-        self.queue = queue.PriorityQueue()
+        # A sessão é compartilhada entre a thread da API e as threads internas
+        self.db_lock = threading.RLock()
         
-        # Dicionário para mapear download_id para processos
-        self.active_downloads: Dict[str, multiprocessing.Process] = {}
+        # Identificador deste gerenciador nos leases dos jobs
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"[-64:]
         
-        # Lock para acessar recursos compartilhados
+        # Indica que pode haver jobs na fila do banco (evita consultas com a fila vazia)
+        self.pending_jobs = True
+        
+        # Dicionário para mapear download_id para o worker que o executa
+        self.active_downloads: Dict[str, _Worker] = {}
+        
+        # Lock para acessar recursos compartilhados e condição sinalizada sempre
+        # que um job entra na fila ou um worker fica livre
         self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        
+        # Pipe usado para acordar a thread de monitoramento quando o pool muda
+        self._wakeup_reader, self._wakeup_writer = multiprocessing.Pipe(duplex=False)
+        
+        # Pool de processos persistentes (pré-aquecidos), um por slot de download
+        self.workers: Dict[int, _Worker] = {
+            worker_id: _Worker(worker_id, worker_init) for worker_id in range(MAX_CONCURRENT_DOWNLOADS)
+        }
         
         # Flag para sinalizar encerramento
         self.shutdown_flag = False
+        self._stop_event = threading.Event()
+        
+        # Devolver à fila os jobs de uma execução anterior que ficaram sem dono
+        self._recover_expired_jobs()
         
         # Thread de processamento da fila
         self.queue_thread = threading.Thread(target=self._process_queue, daemon=True)
         self.queue_thread.start()
         
+        # Thread que recebe os eventos dos workers (conclusão, reciclagem e falhas)
+        self.monitor_thread = threading.Thread(target=self._monitor_workers, daemon=True)
+        self.monitor_thread.start()
+        
+        # Thread que renova os leases dos jobs em execução e recupera os expirados
+        self.lease_thread = threading.Thread(target=self._maintain_leases, daemon=True)
+        self.lease_thread.start()
+        
+        # Thread de limpeza periódica do store de faixas
+        self.store_thread = threading.Thread(target=self._collect_store_garbage, daemon=True)
+        if STORE_GC_INTERVAL > 0:
+            self.store_thread.start()
+        
         print(f"Gerenciador de downloads iniciado. Máximo de {MAX_CONCURRENT_DOWNLOADS} downloads simultâneos.")
         
     
-    def enqueue_download(self, user_id: int, spotify_id: str, type_: str, priority: int = 5) -> str:
+    def enqueue_download(self, user_id: int, spotify_id: str, type_: str, priority: int = 5,
+                         workers: Optional[int] = None, output_format: Optional[str] = None) -> str:
         """
         Adiciona um download à fila
         
@@ -59,6 +181,8 @@ class DownloadQueueManager:
             spotify_id: ID do item no Spotify
             type_: Tipo do item (track ou playlist)
             priority: Prioridade (1-10, onde 1 é mais alta)
+            workers: Faixas baixadas simultaneamente (apenas playlists)
+            output_format: Formato dos arquivos (None = o da configuração do usuário)
             
         Returns:
             download_id: ID único do download
@@ -66,155 +190,466 @@ class DownloadQueueManager:
         # Gerar ID único para o download
         download_id = str(uuid.uuid4())
         
-        # Criar registro no banco de dados
+        # Criar registro no banco de dados (o registro é o próprio job da fila)
         download = Download(
             user_id=user_id,
             download_id=download_id,
             spotify_id=spotify_id,
             type=type_,
             status="na_fila",
-            progress=0.0
+            progress=0.0,
+            priority=priority,
+            workers=workers,
+            output_format=output_format,
+            enqueued_at=time.time()
         )
         
-        self.db.add(download)
-        self.db.commit()
-        self.db.refresh(download)
+        with self.db_lock:
+            self.db.add(download)
+            self.db.commit()
+            self.db.refresh(download)
+            get_broker().publish(user_id, download_id, download_event(download, "Adicionado à fila"))
         
-        # Adicionar à fila de prioridade (com timestamp para desempate)
-        timestamp = time.time()
-        self.queue.put((priority, timestamp, {
-            "download_id": download_id,
-            "user_id": user_id,
-            "spotify_id": spotify_id,
-            "type": type_
-        }))
+        # Acordar o despachante
+        with self.condition:
+            self.pending_jobs = True
+            self.condition.notify_all()
         
         print(f"Download adicionado à fila: {download_id} (Prioridade: {priority})")
         return download_id
     
     def _process_queue(self):
         """Thread para processar a fila de downloads"""
-        while not self.shutdown_flag:
+        # Falhas seguidas ao reservar jobs (aumentam a espera antes da próxima tentativa)
+        failures = 0
+        while True:
             try:
-                # Verificar se podemos iniciar mais downloads
-                with self.lock:
-                    if len(self.active_downloads) >= MAX_CONCURRENT_DOWNLOADS:
-                        time.sleep(1)  # Aguardar se atingimos o limite
+                with self.condition:
+                    # Aguardar até existir um worker livre e possivelmente um job na fila
+                    while not self.shutdown_flag:
+                        worker = self._get_idle_worker()
+                        if worker is not None and self.pending_jobs:
+                            break
+                        self.condition.wait()
+                    
+                    if self.shutdown_flag:
+                        return
+                    
+                    # Reservar o próximo job no banco (cancelamentos já ficam fora da fila)
+                    download_info = self._claim_next_job()
+                    failures = 0
+                    if download_info is None:
+                        self.pending_jobs = False
                         continue
+                    
+                    download_id = download_info["download_id"]
+                    worker.download_id = download_id
+                    self.active_downloads[download_id] = worker
+                    
+                    try:
+                        worker.assign(download_info)
+                        print(f"Download iniciado no worker {worker.worker_id}: {download_id}")
+                    except (OSError, ValueError):
+                        # O worker morreu antes de receber o job: substituir e devolver à fila
+                        self._replace_worker(worker)
+                        self._requeue_job(download_id)
                 
-                # Obter próximo download da fila
-                try:
-                    _, _, download_info = self.queue.get(timeout=1)
-                except queue.Empty:
-                    time.sleep(0.5)
-                    continue
-
-                # Iniciar o download em um processo separado
-                download_id = download_info["download_id"]
-                
-                # Atualizar status no banco de dados
-                download = self.db.query(Download).filter(Download.download_id == download_id).first()
-                if not download:
-                    self.queue.task_done()
-                    continue
+            except Exception as e:
+                failures += 1
+                print(f"Erro no processamento da fila: {str(e)}")
+                with self.db_lock:
+                    self.db.rollback()
                 
-                # Atualizar status para 'processando'
-                download.status = "processando"
-                download.updated_at = datetime.utcnow()
+                # Banco indisponível ou travado: aguardar (1s, 2s, 4s... até 30s) antes
+                # de tentar de novo, em vez de repetir a consulta sem pausa
+                with self.condition:
+                    if not self.shutdown_flag:
+                        self.condition.wait(timeout=min(2 ** (failures - 1), 30))
+    
+    def _claim_next_job(self) -> Optional[Dict[str, Any]]:
+        """
+        Reserva o próximo job da fila para este gerenciador: o usuário é escolhido
+        por fair_share_order e, entre os jobs dele, vale a prioridade e a ordem de
+        chegada. A reserva é um UPDATE condicionado ao status "na_fila", então o
+        mesmo job nunca é entregue a dois gerenciadores.
+        """
+        with self.db_lock:
+            # Usuários com jobs aguardando (e a chegada do job mais antigo de cada um)
+            waiting = dict(self.db.query(
+                Download.user_id, func.min(Download.created_at)
+            ).filter(Download.status == "na_fila").group_by(Download.user_id).all())
+            
+            if not waiting:
+                self.db.commit()
+                return None
+            
+            # Jobs em execução (em qualquer gerenciador) e a divisão definida para cada usuário
+            running = dict(self.db.query(
+                Download.user_id, func.count(Download.id)
+            ).filter(
+                Download.status == "processando",
+                Download.user_id.in_(waiting)
+            ).group_by(Download.user_id).all())
+            
+            shares = {
+                user_id: (weight, USER_MAX_CONCURRENT_DOWNLOADS if limit is None else limit)
+                for user_id, weight, limit in self.db.query(
+                    User.id, User.download_weight, User.max_concurrent_downloads
+                ).filter(User.id.in_(waiting)).all()
+            }
+            
+            for user_id in fair_share_order(waiting, running, shares):
+                download_info = self._claim_user_job(user_id)
+                if download_info is not None:
+                    return download_info
+            
+            self.db.commit()
+            return None
+    
+    def _claim_user_job(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Reserva o próximo job de um usuário (por prioridade e ordem de chegada)"""
+        with self.db_lock:
+            candidates = self.db.query(Download).filter(
+                Download.status == "na_fila",
+                Download.user_id == user_id
+            ).order_by(
+                Download.priority, Download.created_at, Download.id
+            ).limit(MAX_CONCURRENT_DOWNLOADS).populate_existing().all()
+            
+            for download in candidates:
+                now = datetime.utcnow()
+                claimed = self.db.query(Download).filter(
+                    Download.id == download.id,
+                    Download.status == "na_fila"
+                ).update({
+                    Download.status: "processando",
+                    Download.attempts: Download.attempts + 1,
+                    Download.lease_owner: self.owner_id,
+                    Download.lease_expires_at: now + timedelta(seconds=JOB_LEASE_TTL),
+                    Download.updated_at: now
+                }, synchronize_session=False)
                 self.db.commit()
                 
-                # Iniciar processo de download - CORREÇÃO: Não passar objeto de sessão
-                process = multiprocessing.Process(
-                    target=self._download_worker_wrapper,
-                    args=(
-                        download_info["user_id"],
-                        download_info["spotify_id"],
-                        download_info["type"],
-                        download_id
-                    )
-                )
-                
-                # Armazenar referência ao processo
-                with self.lock:
-                    self.active_downloads[download_id] = process
+                if not claimed:
+                    continue  # Reservado por outro gerenciador ou cancelado
                 
-                # Iniciar processo
-                process.start()
-                print(f"Download iniciado em processo separado: {download_id}")
+                metrics = get_metrics()
+                metrics.inc("spotdown_jobs_total", type=download.type)
+                wait = self._queue_wait(download)
+                if wait is not None:
+                    metrics.observe("spotdown_queue_wait_seconds", wait)
                 
-                # Marcar tarefa como concluída na fila
-                self.queue.task_done()
+                get_broker().publish(download.user_id, download.download_id,
+                                     download_event(download, "Download iniciado"))
+                return {
+                    "download_id": download.download_id,
+                    "user_id": download.user_id,
+                    "spotify_id": download.spotify_id,
+                    "type": download.type,
+                    "workers": download.workers,
+                    "output_format": download.output_format
+                }
+            
+            return None
+    
+    def _queue_wait(self, download: Download) -> Optional[float]:
+        """Segundos entre a entrada do job na fila e a reserva (chamar com self.db_lock)"""
+        if download.enqueued_at is not None:
+            return max(time.time() - download.enqueued_at, 0.0)
+        
+        # Jobs enfileirados antes de enqueued_at existir: created_at, comparado
+        # com o relógio do banco que o preencheu (precisão de segundos)
+        db_now = self.db.query(func.now()).scalar()
+        if db_now is None or download.created_at is None:
+            return None
+        return max((db_now - download.created_at).total_seconds(), 0.0)
+    
+    def _requeue_job(self, download_id: str):
+        """Devolve à fila um job reservado por este gerenciador (chamar com self.lock)"""
+        with self.db_lock:
+            self.db.query(Download).filter(
+                Download.download_id == download_id,
+                Download.status == "processando",
+                Download.lease_owner == self.owner_id
+            ).update({
+                Download.status: "na_fila",
+                Download.attempts: Download.attempts - 1,
+                Download.lease_owner: None,
+                Download.lease_expires_at: None,
+                Download.enqueued_at: time.time()
+            }, synchronize_session=False)
+            self.db.commit()
+        self.pending_jobs = True
+    
+    def _release_lease(self, download_id: str):
+        """
+        Libera o lease de um job encerrado por este gerenciador. Se o worker
+        terminou o job sem gravar um status final (ex.: falhou ao gravar o próprio
+        erro), o job é marcado como erro na mesma transação: sem lease ele não
+        seria mais recuperado e ficaria "processando" para sempre.
+        """
+        with self.db_lock:
+            try:
+                unfinished = self.db.query(Download).filter(
+                    Download.download_id == download_id,
+                    Download.status == "processando",
+                    Download.lease_owner == self.owner_id
+                ).update({
+                    Download.status: "erro",
+                    Download.error_message: "Download encerrado sem status final",
+                    Download.updated_at: datetime.utcnow()
+                }, synchronize_session=False)
+                self.db.query(Download).filter(
+                    Download.download_id == download_id,
+                    Download.lease_owner == self.owner_id
+                ).update({
+                    Download.lease_owner: None,
+                    Download.lease_expires_at: None
+                }, synchronize_session=False)
+                self.db.commit()
                 
-                # Verificar e limpar downloads concluídos
-                self._cleanup_completed_downloads()
+                if unfinished:
+                    download = self.db.query(Download).filter(
+                        Download.download_id == download_id
+                    ).populate_existing().first()
+                    self.db.commit()
+                    print(f"Download {download_id} encerrado pelo worker sem status final")
+                    get_broker().publish(download.user_id, download_id, download_event(download, "Download com erro"))
+            except Exception as e:
+                self.db.rollback()
+                print(f"Erro ao liberar o lease do download {download_id}: {str(e)}")
+    
+    def _maintain_leases(self):
+        """Thread que renova os leases dos jobs em execução e recupera os expirados"""
+        while not self._stop_event.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                self._renew_leases()
+                self._recover_expired_jobs()
+            except Exception as e:
+                print(f"Erro na manutenção dos leases: {str(e)}")
+                with self.db_lock:
+                    self.db.rollback()
+    
+    def _collect_store_garbage(self):
+        """Thread que remove dos stores as faixas sem nenhuma cópia (arquivos apagados pelos usuários)"""
+        while not self._stop_event.wait(STORE_GC_INTERVAL):
+            try:
+                # Um store por pasta base de downloads configurada
+                with self.db_lock:
+                    roots = {path for (path,) in self.db.query(SpotifyConfig.download_path).distinct().all() if path}
+                    self.db.commit()
                 
+                for root in roots:
+                    store_path = os.path.join(root, STORE_DIRNAME)
+                    if not os.path.isdir(store_path):
+                        continue
+                    removed = ContentStore(store_path).collect_garbage(min_age=STORE_GC_INTERVAL)
+                    if removed:
+                        print(f"Store {store_path}: {removed} faixas sem cópias removidas")
             except Exception as e:
-                print(f"Erro no processamento da fila: {str(e)}")
-                time.sleep(1)
+                print(f"Erro na limpeza do store de faixas: {str(e)}")
+                with self.db_lock:
+                    self.db.rollback()
     
-    @staticmethod
-    def _download_worker_wrapper(user_id: int, spotify_id: str, type_: str, download_id: str):
+    def _renew_leases(self):
+        """Estende a validade dos leases dos jobs em execução neste gerenciador"""
+        with self.lock:
+            active_ids = list(self.active_downloads)
+        if not active_ids:
+            return
+        
+        with self.db_lock:
+            self.db.query(Download).filter(
+                Download.download_id.in_(active_ids),
+                Download.status == "processando",
+                Download.lease_owner == self.owner_id
+            ).update({
+                Download.lease_expires_at: datetime.utcnow() + timedelta(seconds=JOB_LEASE_TTL)
+            }, synchronize_session=False)
+            self.db.commit()
+    
+    def _recover_expired_jobs(self):
         """
-        Função wrapper para isolar a criação da sessão dentro do processo filho
+        Devolve à fila os jobs "processando" cujo lease expirou (ou que nunca
+        tiveram lease, como os criados antes da fila persistente). Jobs que já
+        atingiram JOB_MAX_ATTEMPTS tentativas são marcados como erro.
         """
-        try:
-            # Importar módulos necessários dentro da função
-            from database import SessionLocal
-            from downloader import SpotifyDownloader
+        with self.lock:
+            active_ids = set(self.active_downloads)
+        
+        recovered = 0
+        with self.db_lock:
+            now = datetime.utcnow()
             
-            # Criar nova sessão dentro do processo filho
-            db = SessionLocal()
+            # Sem lease, apenas jobs nunca reservados pela fila: um lease liberado
+            # (job cancelado ou encerrado) não indica um job abandonado
+            lease_expired = or_(
+                Download.lease_expires_at < now,
+                and_(
+                    Download.lease_expires_at.is_(None),
+                    Download.lease_owner.is_(None),
+                    Download.attempts == 0
+                )
+            )
+            expired = self.db.query(Download).filter(
+                Download.status == "processando",
+                lease_expired
+            ).populate_existing().all()
             
-            try:
-                # Inicializar downloader
-                downloader = SpotifyDownloader(db, user_id)
+            for download in expired:
+                if download.download_id in active_ids:
+                    continue  # Em execução aqui: o lease será renovado
                 
-                # Executar download de acordo com o tipo
-                if type_ == "track":
-                    downloader.download_track(spotify_id, download_id)
-                elif type_ == "playlist":
-                    downloader.download_playlist(spotify_id, download_id)
+                exhausted = download.attempts >= JOB_MAX_ATTEMPTS
+                values = {
+                    Download.lease_owner: None,
+                    Download.lease_expires_at: None,
+                    Download.updated_at: now
+                }
+                if exhausted:
+                    values[Download.status] = "erro"
+                    values[Download.error_message] = "Número máximo de tentativas atingido"
                 else:
-                    # Atualizar status para erro
-                    download = db.query(Download).filter(Download.download_id == download_id).first()
-                    if download:
-                        download.status = "erro"
-                        download.error_message = "Tipo de download inválido"
-                        download.updated_at = datetime.utcnow()
-                        db.commit()
-            finally:
-                # Garantir que a sessão seja fechada
-                db.close()
-        
-        except Exception as e:
-            print(f"Erro no worker de download {download_id}: {str(e)}")
-            
+                    values[Download.status] = "na_fila"
+                    values[Download.progress] = 0.0
+                    values[Download.enqueued_at] = time.time()
+                
+                # Condicionar ao lease ainda expirado (pode ter sido renovado pelo dono)
+                updated = self.db.query(Download).filter(
+                    Download.id == download.id,
+                    Download.status == "processando",
+                    lease_expired
+                ).update(values, synchronize_session=False)
+                self.db.commit()
+                
+                if updated:
+                    self.db.refresh(download)
+                    message = "Download com erro" if exhausted else "Devolvido à fila após interrupção"
+                    get_broker().publish(download.user_id, download.download_id, download_event(download, message))
+                    print(f"Download {download.download_id}: {message.lower()}")
+                    recovered += not exhausted
+        
+        if recovered:
+            with self.condition:
+                self.pending_jobs = True
+                self.condition.notify_all()
+    
+    def _monitor_workers(self):
+        """Thread que aguarda mensagens dos workers e o término dos seus processos"""
+        while not self.shutdown_flag:
             try:
-                # Tentar atualizar status de erro no banco
-                from database import SessionLocal
-                db = SessionLocal()
-                download = db.query(Download).filter(Download.download_id == download_id).first()
-                if download:
+                with self.lock:
+                    workers = list(self.workers.values())
+                
+                # Bloqueia até um worker enviar um evento, um processo terminar
+                # ou o pool ser alterado (sinalizado pelo pipe de wakeup)
+                waitables = [self._wakeup_reader]
+                for worker in workers:
+                    waitables.extend([worker.conn, worker.process.sentinel])
+                ready = wait_connections(waitables)
+                
+                if self._wakeup_reader in ready:
+                    while self._wakeup_reader.poll():
+                        self._wakeup_reader.recv_bytes()
+                
+                with self.condition:
+                    for worker in workers:
+                        if self.workers.get(worker.worker_id) is not worker:
+                            continue  # Worker já substituído (ex.: download cancelado)
+                        if worker.conn in ready or worker.process.sentinel in ready:
+                            self._handle_worker_events(worker)
+            except Exception as e:
+                if not self.shutdown_flag:
+                    print(f"Erro no monitoramento dos workers: {str(e)}")
+    
+    def _handle_worker_events(self, worker: _Worker):
+        """Processa as mensagens de um worker e detecta se ele morreu (chamar com self.lock)"""
+        recycle = False
+        try:
+            while worker.conn.poll():
+                event, download_id, data = worker.conn.recv()
+                if event == "status":
+                    # Repassar o progresso do worker aos clientes conectados
+                    get_broker().publish(data["user_id"], download_id, data)
+                elif event == "metrics":
+                    # Somar as medições do worker às do processo da API
+                    get_metrics().merge(data)
+                elif event == "done":
+                    recycle = data
+                    self._release_lease(download_id)
+                    if worker.download_id == download_id:
+                        self._release_worker(worker)
+        except (EOFError, OSError):
+            pass
+        
+        if recycle:
+            # Worker atingiu o limite de jobs e está encerrando: criar um novo
+            self._replace_worker(worker)
+        elif not worker.process.is_alive():
+            # O processo morreu inesperadamente
+            if worker.download_id is not None:
+                self._mark_crashed(worker.download_id)
+            self._replace_worker(worker)
+    
+    def _get_idle_worker(self) -> Optional[_Worker]:
+        """Retorna um worker vivo sem job em execução (chamar com self.lock)"""
+        for worker in self.workers.values():
+            if worker.download_id is None and worker.process.is_alive():
+                return worker
+        return None
+    
+    def _record_busy_time(self, worker: _Worker):
+        """Contabiliza o tempo que o worker passou no job atual (chamar com self.lock)"""
+        if worker.started_at is not None:
+            get_metrics().inc("spotdown_worker_busy_seconds_total", time.monotonic() - worker.started_at)
+            worker.started_at = None
+    
+    def _release_worker(self, worker: _Worker):
+        """Marca o worker como livre e acorda o despachante (chamar com self.lock)"""
+        self._record_busy_time(worker)
+        self.active_downloads.pop(worker.download_id, None)
+        worker.download_id = None
+        
+        # Um usuário que estava no limite de downloads simultâneos pode ter liberado vaga
+        self.pending_jobs = True
+        self.condition.notify_all()
+    
+    def _replace_worker(self, worker: _Worker):
+        """Encerra um worker e cria um novo processo no mesmo slot (chamar com self.lock)"""
+        self._record_busy_time(worker)
+        
+        # Encerrar antes de liberar o job: um worker ainda ocupado (ex.: download
+        # cancelado) é terminado na hora, sem a espera do encerramento normal
+        worker.stop()
+        if worker.download_id is not None:
+            self.active_downloads.pop(worker.download_id, None)
+            worker.download_id = None
+        
+        if not self.shutdown_flag:
+            self.workers[worker.worker_id] = _Worker(worker.worker_id, self.worker_init)
+        
+        # Acordar o monitor (novo conjunto de pipes) e o despachante (slot livre)
+        self._wakeup_writer.send_bytes(b"")
+        self.pending_jobs = True
+        self.condition.notify_all()
+    
+    def _mark_crashed(self, download_id: str):
+        """Marca como erro um download cujo worker morreu durante a execução"""
+        print(f"Worker do download {download_id} encerrou inesperadamente")
+        with self.db_lock:
+            try:
+                download = self.db.query(Download).filter(Download.download_id == download_id).first()
+                if download and download.status == "processando":
                     download.status = "erro"
-                    download.error_message = str(e)
+                    download.error_message = "Processo de download encerrado inesperadamente"
+                    download.lease_owner = None
+                    download.lease_expires_at = None
                     download.updated_at = datetime.utcnow()
-                    db.commit()
-                db.close()
-            except Exception as inner_e:
-                print(f"Erro ao atualizar status do download {download_id}: {str(inner_e)}")
-    
-    def _cleanup_completed_downloads(self):
-        """Remove referências a processos que já foram concluídos"""
-        with self.lock:
-            completed = []
-            for download_id, process in self.active_downloads.items():
-                if not process.is_alive():
-                    process.join(timeout=0.1)  # Limpar recursos do processo
-                    completed.append(download_id)
-            
-            # Remover downloads concluídos do dicionário ativo
-            for download_id in completed:
-                del self.active_downloads[download_id]
+                    self.db.commit()
+                    get_broker().publish(download.user_id, download_id, download_event(download))
+            except Exception as e:
+                self.db.rollback()
+                print(f"Erro ao atualizar status do download {download_id}: {str(e)}")
     
     def cancel_download(self, download_id: str, user_id: Optional[int] = None) -> bool:
         """
@@ -227,31 +662,30 @@ class DownloadQueueManager:
         Returns:
             bool: True se cancelado com sucesso, False caso contrário
         """
-        # Verificar se o download existe e pertence ao usuário (se user_id fornecido)
-        download = self.db.query(Download).filter(Download.download_id == download_id)
-        if user_id is not None:
-            download = download.filter(Download.user_id == user_id)
-        
-        download = download.first()
-        
-        if not download:
-            return False
-        
-        # Atualizar status no banco de dados
-        download.status = "cancelado"
-        download.updated_at = datetime.utcnow()
-        self.db.commit()
+        with self.db_lock:
+            # Verificar se o download existe e pertence ao usuário (se user_id fornecido)
+            download = self.db.query(Download).filter(Download.download_id == download_id)
+            if user_id is not None:
+                download = download.filter(Download.user_id == user_id)
+            
+            download = download.first()
+            
+            if not download:
+                return False
+            
+            # Atualizar status no banco de dados (o job sai da fila)
+            download.status = "cancelado"
+            download.lease_owner = None
+            download.lease_expires_at = None
+            download.updated_at = datetime.utcnow()
+            self.db.commit()
+            get_broker().publish(download.user_id, download_id, download_event(download, "Download cancelado"))
         
-        # Se estiver em execução, encerrar o processo
-        with self.lock:
+        # Se estiver em execução, encerrar o worker e colocar um novo no lugar
+        with self.condition:
             if download_id in self.active_downloads:
-                process = self.active_downloads[download_id]
-                if process.is_alive():
-                    process.terminate()
-                    process.join(timeout=1.0)
-                
-                # Remover do dicionário
-                del self.active_downloads[download_id]
+                worker = self.active_downloads[download_id]
+                self._replace_worker(worker)
                 return True
         
         # Se chegamos aqui, o download não estava ativo, mas foi marcado como cancelado no banco
@@ -259,34 +693,96 @@ class DownloadQueueManager:
     
     def get_queue_status(self):
         """Retorna informações sobre o estado atual da fila"""
+        with self.db_lock:
+            queue_size = self.db.query(Download).filter(Download.status == "na_fila").count()
+            self.db.commit()
+        
         with self.lock:
             return {
                 "active_downloads": len(self.active_downloads),
-                "queue_size": self.queue.qsize(),
+                "queue_size": queue_size,
                 "max_concurrent": MAX_CONCURRENT_DOWNLOADS
             }
     
+    def render_metrics(self) -> str:
+        """Métricas da API e dos workers no formato do Prometheus, com o estado atual da fila"""
+        status = self.get_queue_status()
+        with self.lock:
+            workers = len(self.workers)
+        
+        return get_metrics().render({
+            "spotdown_workers": workers,
+            "spotdown_workers_busy": status["active_downloads"],
+            "spotdown_queue_size": status["queue_size"]
+        })
+    
     def shutdown(self):
         """Desliga o gerenciador de downloads"""
         print("Encerrando gerenciador de downloads...")
-        self.shutdown_flag = True
+        with self.condition:
+            self.shutdown_flag = True
+            self.condition.notify_all()
+        self._stop_event.set()
+        self._wakeup_writer.send_bytes(b"")
         
-        # Aguardar thread da fila finalizar
+        # Aguardar threads internas finalizarem
         if self.queue_thread.is_alive():
             self.queue_thread.join(timeout=2.0)
+        if self.monitor_thread.is_alive():
+            self.monitor_thread.join(timeout=2.0)
+        if self.lease_thread.is_alive():
+            self.lease_thread.join(timeout=2.0)
+        if self.store_thread.is_alive():
+            self.store_thread.join(timeout=2.0)
         
-        # Encerrar todos os processos ativos
+        # Encerrar todos os workers do pool
         with self.lock:
-            for download_id, process in self.active_downloads.items():
-                if process.is_alive():
-                    print(f"Encerrando processo de download: {download_id}")
-                    process.terminate()
-                    process.join(timeout=1.0)
+            interrupted = []
+            for worker in self.workers.values():
+                if worker.download_id is not None:
+                    print(f"Encerrando processo de download: {worker.download_id}")
+                    interrupted.append(worker.download_id)
+                worker.stop()
             
+            self.workers.clear()
             self.active_downloads.clear()
+            
+            # Devolver à fila os jobs interrompidos, para a próxima execução retomá-los
+            for download_id in interrupted:
+                try:
+                    self._requeue_job(download_id)
+                except Exception as e:
+                    with self.db_lock:
+                        self.db.rollback()
+                    print(f"Erro ao devolver o download {download_id} à fila: {str(e)}")
         
         print("Gerenciador de downloads encerrado")
 
+def fair_share_order(waiting: Dict[int, Any], running: Dict[int, int],
+                     shares: Dict[int, Tuple[int, int]]) -> List[int]:
+    """
+    Ordem em que os usuários com jobs aguardando devem ocupar o próximo slot livre.
+    
+    Args:
+        waiting: user_id -> chegada do job mais antigo do usuário na fila
+        running: user_id -> jobs do usuário em execução
+        shares: user_id -> (peso, limite de downloads simultâneos; 0 = sem limite)
+        
+    Returns:
+        Usuários abaixo do próprio limite, do menor para o maior uso de slots
+        relativo ao peso (running / peso); no empate, quem espera há mais tempo.
+    """
+    eligible = []
+    for user_id, oldest in waiting.items():
+        weight, limit = shares.get(user_id, (1, USER_MAX_CONCURRENT_DOWNLOADS))
+        active = running.get(user_id, 0)
+        if limit and active >= limit:
+            continue
+        eligible.append((active / max(weight, 1), oldest, user_id))
+    
+    eligible.sort()
+    return [user_id for _, _, user_id in eligible]
+
 # Instância global do gerenciador de downloads
 download_manager = None
 
@@ -302,4 +798,129 @@ def get_download_manager() -> DownloadQueueManager:
     global download_manager
     if download_manager is None:
         raise RuntimeError("Gerenciador de downloads não inicializado")
-    return download_manager
\ No newline at end of file
+    return download_manager
+
+def _worker_main(conn, max_jobs: int, worker_init: Optional[Callable[[], None]] = None):
+    """
+    Loop de um processo worker persistente.
+    
+    Os módulos pesados (yt_dlp, spotipy) são importados uma única vez e a sessão
+    do banco e os downloaders de cada usuário são reaproveitados entre jobs.
+    Após max_jobs jobs (0 = sem limite) o processo termina para ser reciclado.
+    """
+    if worker_init is not None:
+        worker_init()
+    
+    from database import SessionLocal, engine
+    from downloader import SpotifyDownloader
+    
+    # Não reutilizar conexões herdadas do processo pai
+    engine.dispose(close=False)
+    
+    # Descartar as métricas herdadas do processo pai (já contabilizadas por ele)
+    metrics = get_metrics()
+    metrics.take_delta()
+    
+    db = SessionLocal()
+    downloaders: Dict[int, Any] = {}
+    jobs = 0
+    
+    try:
+        while True:
+            job = conn.recv()
+            if job is None:
+                break
+            
+            jobs += 1
+            _run_download_job(db, downloaders, SpotifyDownloader, job, conn)
+            
+            recycle = max_jobs > 0 and jobs >= max_jobs
+            conn.send(("metrics", job["download_id"], metrics.take_delta()))
+            conn.send(("done", job["download_id"], recycle))
+            if recycle:
+                break
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        # Garantir que a sessão seja fechada
+        db.close()
+        
+        # Gravar os acertos e falhas do cache ainda acumulados neste processo
+        import cache
+        if cache.shared_cache is not None:
+            cache.shared_cache.flush_stats()
+        
+        from http_client import get_http_stats
+        print(f"Worker encerrado após {jobs} jobs. Conexões HTTP: {get_http_stats()}")
+
+def _run_download_job(db, downloaders: Dict[int, Any], downloader_class, job: Dict[str, Any], conn=None):
+    """Executa um job de download dentro do processo worker"""
+    download_id = job["download_id"]
+    user_id = job["user_id"]
+    
+    try:
+        # Descartar objetos em cache da sessão para enxergar alterações de outros processos
+        db.expire_all()
+        
+        # Reaproveitar o downloader do usuário enquanto a configuração não mudar
+        config = db.query(SpotifyConfig).filter(SpotifyConfig.user_id == user_id).first()
+        cached = downloaders.get(user_id)
+        if cached and config and cached[0] == config.updated_at:
+            downloader = cached[1]
+        else:
+            downloader = downloader_class(db, user_id)
+            downloaders[user_id] = (config.updated_at, downloader)
+        
+        # Enviar cada status gravado ao gerenciador (que publica para os clientes),
+        # acompanhado periodicamente das métricas acumuladas no job
+        if conn is not None:
+            last_flush = [time.monotonic()]
+            
+            def send_status(event):
+                conn.send(("status", download_id, event))
+                if time.monotonic() - last_flush[0] >= METRICS_FLUSH_INTERVAL:
+                    conn.send(("metrics", download_id, get_metrics().take_delta()))
+                    last_flush[0] = time.monotonic()
+            
+            downloader.status_listener = send_status
+        
+        # Executar download de acordo com o tipo
+        if job["type"] == "track":
+            downloader.download_track(job["spotify_id"], download_id, output_format=job.get("output_format"))
+        elif job["type"] == "playlist":
+            downloader.download_playlist(job["spotify_id"], download_id, max_workers=job.get("workers"),
+                                         output_format=job.get("output_format"))
+        else:
+            # Atualizar status para erro
+            download = db.query(Download).filter(
+                Download.download_id == download_id,
+                Download.status.notin_(FINAL_STATUSES)
+            ).first()
+            if download:
+                download.status = "erro"
+                download.error_message = "Tipo de download inválido"
+                download.updated_at = datetime.utcnow()
+                db.commit()
+                if conn is not None:
+                    conn.send(("status", download_id, download_event(download)))
+    
+    except Exception as e:
+        print(f"Erro no worker de download {download_id}: {str(e)}")
+        
+        try:
+            # Tentar atualizar status de erro no banco
+            db.rollback()
+            download = db.query(Download).filter(
+                Download.download_id == download_id,
+                Download.status.notin_(FINAL_STATUSES)
+            ).first()
+            if download:
+                download.status = "erro"
+                download.error_message = str(e)
+                download.updated_at = datetime.utcnow()
+                db.commit()
+                if conn is not None:
+                    conn.send(("status", download_id, download_event(download)))
+        except Exception as inner_e:
+            db.rollback()
+            print(f"Erro ao atualizar status do download {download_id}: {str(inner_e)}")
\ No newline at end of file
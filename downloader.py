@@ -10,12 +10,144 @@ Classe para download de músicas e playlists do Spotify
 """
 import os
 import re
-import requests
+import time
+import threading
+import subprocess
+import unicodedata
 import yt_dlp
 import spotipy
+from concurrent.futures import as_completed
 from spotipy.oauth2 import SpotifyOAuth
 from sqlalchemy.orm import Session
-from models import Download, SpotifyConfig
+from models import Download, SpotifyConfig, FINAL_STATUSES
+from config import (
+    PLAYLIST_MAX_WORKERS, SPOTIFY_TRACK_CACHE_TTL,
+    YOUTUBE_SEARCH_CACHE_TTL, YOUTUBE_NEGATIVE_CACHE_TTL, HTTP_TIMEOUT, HTTP_MAX_RETRIES,
+    RATE_LIMIT_DEFAULT_BACKOFF
+)
+from http_client import get_http_session
+from rate_limiter import get_rate_limiter
+from metrics import get_metrics
+from progress import ProgressBuffer
+from cache import get_shared_cache, MISSING
+from content_store import ContentStore, STORE_DIRNAME
+from playlist_manifest import PlaylistManifest
+from events import download_event
+from pipeline import DownloadPipeline, run_steps
+from file_catalog import register_files
+
+# Campos das faixas de uma playlist realmente usados no download
+PLAYLIST_TRACK_FIELDS = "total,items(track(id,name,artists(name),album(name,images)))"
+
+# Maior página permitida pela API do Spotify para itens de playlist
+PLAYLIST_PAGE_SIZE = 100
+
+# Permissões solicitadas ao Spotify
+SPOTIFY_SCOPE = "user-library-read playlist-read-private"
+
+# Endereço usado na busca e no download dos vídeos (substituível nos benchmarks)
+YOUTUBE_BASE_URL = "https://www.youtube.com"
+
+# Contêiner só de áudio usado no formato remux para cada extensão baixada (Opus e
+# Vorbis vão para Ogg, AAC para M4A). Extensões fora da lista são convertidas para MP3
+REMUX_EXTENSIONS = {
+    "webm": "ogg", "opus": "ogg", "ogg": "ogg",
+    "mp4": "m4a", "m4a": "m4a", "aac": "m4a",
+    "mp3": "mp3",
+}
+
+# Muxer do FFmpeg de cada extensão de saída
+FFMPEG_MUXERS = {"mp3": "mp3", "ogg": "ogg", "m4a": "mp4"}
+
+# Extensões já baixadas que atendem a cada formato de saída (reaproveitadas do store)
+OUTPUT_EXTENSIONS = {
+    "mp3": ("mp3",),
+    "remux": ("ogg", "m4a"),
+    "native": ("webm", "m4a"),
+}
+
+def _compact_track(track):
+    """Remove da faixa os campos volumosos que não são usados (ex.: available_markets)"""
+    track = {key: value for key, value in track.items() if key != "available_markets"}
+    if isinstance(track.get("album"), dict):
+        track["album"] = {key: value for key, value in track["album"].items() if key != "available_markets"}
+    return track
+
+def _normalize_query(query):
+    """Normaliza uma busca para uso como chave de cache"""
+    query = unicodedata.normalize("NFKC", query).casefold()
+    return re.sub(r"\s+", " ", query).strip()
+
+def create_spotify_client(user_id, client_id, client_secret, redirect_uri):
+    """Cria um cliente Spotify autenticado do usuário (usando o pool de conexões HTTP do processo)"""
+    http = get_http_session()
+    return spotipy.Spotify(
+        auth_manager=SpotifyOAuth(
+            client_id=client_id,
+            client_secret=client_secret,
+            redirect_uri=redirect_uri,
+            scope=SPOTIFY_SCOPE,
+            cache_path=f".spotify_cache_{user_id}",
+            requests_session=http,
+            requests_timeout=HTTP_TIMEOUT
+        ),
+        requests_session=http,
+        requests_timeout=HTTP_TIMEOUT
+    )
+
+def parse_search_results(results, search_type):
+    """Converte a resposta de sp.search nos itens retornados pela API"""
+    items = []
+    if search_type == "track":
+        for track in results["tracks"]["items"]:
+            items.append({
+                "id": track["id"],
+                "name": track["name"],
+                "artist": track["artists"][0]["name"] if track["artists"] else None,
+                "type": "track",
+                "image_url": track["album"]["images"][0]["url"] if track["album"]["images"] else None
+            })
+    elif search_type == "playlist":
+        for playlist in results["playlists"]["items"]:
+            items.append({
+                "id": playlist["id"],
+                "name": playlist["name"],
+                "artist": playlist["owner"]["display_name"],
+                "type": "playlist",
+                "image_url": playlist["images"][0]["url"] if playlist["images"] else None
+            })
+    return items
+
+def transcode_to_mp3(source_path, file_path):
+    """Converte o áudio baixado para MP3 (320 kbps) com o FFmpeg e remove o arquivo original"""
+    _run_ffmpeg(source_path, file_path, ["-codec:a", "libmp3lame", "-b:a", "320k"])
+
+def remux_audio(source_path, file_path):
+    """Copia o áudio baixado, sem recodificar, para o contêiner de file_path e remove o original"""
+    _run_ffmpeg(source_path, file_path, ["-codec:a", "copy"])
+
+def _run_ffmpeg(source_path, file_path, codec_args):
+    """Gera file_path a partir de source_path com o FFmpeg (gravação atômica)"""
+    extension = os.path.splitext(file_path)[1][1:].lower()
+    muxer = FFMPEG_MUXERS.get(extension)
+    if muxer is None:
+        raise RuntimeError(f"Formato de saída não suportado pelo FFmpeg: .{extension}")
+    temp_path = f"{file_path}.part"
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-i", source_path, "-vn",
+             *codec_args, "-f", muxer, temp_path],
+            check=True, capture_output=True
+        )
+    except FileNotFoundError:
+        raise RuntimeError("FFmpeg não encontrado: instale o FFmpeg para converter o áudio")
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise RuntimeError(f"Erro na conversão com o FFmpeg: {e.stderr.decode(errors='replace').strip()}")
+    
+    os.replace(temp_path, file_path)
+    os.remove(source_path)
 
 class SpotifyDownloader:
     """Classe para download de conteúdo do Spotify via YouTube"""
@@ -25,6 +157,21 @@ class SpotifyDownloader:
         self.db = db
         self.user_id = user_id
         
+        # Serializa o uso da sessão entre a thread do download e o timer do buffer de progresso
+        self.db_lock = threading.RLock()
+        
+        # Função chamada a cada status gravado (usada pelo worker para publicar o progresso)
+        self.status_listener = None
+        
+        # Buffer que agrupa atualizações de progresso antes de gravá-las
+        self.progress_buffer = ProgressBuffer(self._write_download_status)
+        
+        # Cache de metadados do Spotify compartilhado entre processos
+        self.cache = get_shared_cache()
+        
+        # Medições de duração e erros por etapa (enviadas pelo worker ao gerenciador)
+        self.metrics = get_metrics()
+        
         # Obter configuração do usuário
         config = db.query(SpotifyConfig).filter(SpotifyConfig.user_id == user_id).first()
         
@@ -35,12 +182,16 @@ class SpotifyDownloader:
         self.client_secret = config.client_secret
         self.redirect_uri = config.redirect_uri
         self.download_path = config.download_path
-        self.scope = "user-library-read playlist-read-private"
+        self.output_format = config.output_format or "mp3"
+        self.scope = SPOTIFY_SCOPE
         
         # Verificar se as credenciais foram configuradas
         if not self.client_id or not self.client_secret:
             raise ValueError("Erro: Configure client_id e client_secret")
         
+        # Store de faixas deduplicadas, compartilhado por todos os usuários da mesma pasta base
+        self.content_store = ContentStore(os.path.join(self.download_path, STORE_DIRNAME))
+        
         # Criar diretório de downloads se não existir
         user_download_path = os.path.join(self.download_path, f"user_{user_id}")
         self.download_path = user_download_path
@@ -48,140 +199,216 @@ class SpotifyDownloader:
         if not os.path.exists(self.download_path):
             os.makedirs(self.download_path)
         
-        # Inicializar cliente Spotify
-        self.sp = spotipy.Spotify(auth_manager=SpotifyOAuth(
-            client_id=self.client_id,
-            client_secret=self.client_secret,
-            redirect_uri=self.redirect_uri,
-            scope=self.scope,
-            cache_path=f".spotify_cache_{user_id}"
-        ))
+        # Inicializar cliente Spotify (usando o pool de conexões HTTP do processo)
+        self.http = get_http_session()
+        self.sp = create_spotify_client(user_id, self.client_id, self.client_secret, self.redirect_uri)
     
     def update_download_status(self, download_id: str, status: str, message: str, progress: float = None, 
                               file_path: str = None, error_message: str = None, name: str = None, 
                               artist: str = None):
-        """Atualiza o status de um download no banco de dados"""
-        download = self.db.query(Download).filter(
-            Download.download_id == download_id,
-            Download.user_id == self.user_id
-        ).first()
+        """Atualiza o status de um download (atualizações de progresso passam pelo buffer)"""
+        self.progress_buffer.update(
+            download_id, status, message, progress=progress,
+            file_path=file_path, error_message=error_message, name=name, artist=artist
+        )
         
-        if not download:
-            return
+        # Ao finalizar o download, registrar quantas escritas o buffer evitou
+        if status in FINAL_STATUSES:
+            stats = self.progress_buffer.pop_stats(download_id)
+            print(f"Download {download_id}: {stats['writes']} escritas de status, {stats['saved']} evitadas")
+    
+    def _write_download_status(self, download_id: str, status: str, message: str, progress: float = None, 
+                               file_path: str = None, error_message: str = None, name: str = None, 
+                               artist: str = None):
+        """
+        Grava o status de um download no banco de dados. A gravação é condicionada
+        ao download ainda não estar finalizado: um worker que continua rodando
+        depois de um cancelamento não desfaz o status "cancelado".
+        """
+        # A sessão (e o canal do worker) também é usada pelo timer do buffer de progresso
+        with self.db_lock:
+            with self.metrics.time_stage("db_status_write"):
+                values = {Download.status: status}
+                
+                if progress is not None:
+                    values[Download.progress] = progress
+                
+                if file_path:
+                    values[Download.file_path] = file_path
+                
+                if error_message:
+                    values[Download.error_message] = error_message
+                
+                if name:
+                    values[Download.name] = name
+                
+                if artist:
+                    values[Download.artist] = artist
+                
+                query = self.db.query(Download).filter(
+                    Download.download_id == download_id,
+                    Download.user_id == self.user_id
+                )
+                updated = query.filter(
+                    Download.status.notin_(FINAL_STATUSES)
+                ).update(values, synchronize_session=False)
+                self.db.commit()
+                
+                if not updated:
+                    return
+                
+                download = query.populate_existing().first()
+                if not download:
+                    return
+            
+            if self.status_listener is not None:
+                try:
+                    self.status_listener(download_event(download, message))
+                except Exception as e:
+                    print(f"Erro ao publicar status do download {download_id}: {str(e)}")
+    
+    def get_track(self, track_id):
+        """Obtém os metadados de uma faixa (do cache, se disponível)"""
+        return self.cache.get_or_fetch(
+            "spotify_track", track_id,
+            lambda: _compact_track(self._spotify_lookup(self.sp.track, track_id)),
+            SPOTIFY_TRACK_CACHE_TTL
+        )
+    
+    def _spotify_lookup(self, method, *args, **kwargs):
+        """Chama a API do Spotify medindo a duração da consulta"""
+        with self.metrics.time_stage("spotify_lookup"):
+            return method(*args, **kwargs)
+    
+    def _cache_playlist_tracks(self, items):
+        """Armazena no cache as faixas completas que já vieram na página da playlist"""
+        self.cache.set_many(
+            "spotify_track",
+            [(item["track"]["id"], _compact_track(item["track"]))
+             for item in items if item.get("track") and item["track"].get("id")],
+            SPOTIFY_TRACK_CACHE_TTL
+        )
+    
+    def search_youtube(self, query, track_id=None):
+        """
+        Busca uma música no YouTube, consultando antes o cache de buscas.
         
-        download.status = status
+        O resultado é guardado pelo ID da faixa no Spotify (quando informado) e
+        pela busca normalizada. Buscas sem resultado também são guardadas, por
+        um tempo menor, para não repetir a requisição.
+        """
+        keys = [("youtube_track", track_id)] if track_id else []
+        keys.append(("youtube_query", _normalize_query(query)))
         
-        if progress is not None:
-            download.progress = progress
+        for kind, key in keys:
+            video_id = self.cache.get(kind, key)
+            if video_id is not MISSING:
+                return video_id
+        
+        try:
+            with self.metrics.time_stage("youtube_search"):
+                video_id = self._search_youtube_uncached(query)
+        except Exception as e:
+            # Erros de rede não são guardados no cache
+            print(f"Erro ao buscar no YouTube: {e}")
+            return None
         
-        if file_path:
-            download.file_path = file_path
+        ttl = YOUTUBE_SEARCH_CACHE_TTL if video_id else YOUTUBE_NEGATIVE_CACHE_TTL
+        for kind, key in keys:
+            self.cache.set(kind, key, video_id, ttl)
         
-        if error_message:
-            download.error_message = error_message
+        return video_id
+    
+    def _download_media(self, ydl_opts, video_url):
+        """
+        Baixa o áudio com o yt-dlp dentro do limite de requisições de mídia do
+        YouTube e retorna o caminho do arquivo baixado (ainda no formato original).
+        Um bloqueio (429) suspende os downloads de mídia de todos os processos e
+        o download é repetido depois, em vez de falhar a faixa.
+        """
+        limiter = get_rate_limiter()
+        metrics = self.metrics
+        started = {}
         
-        if name:
-            download.name = name
+        # Medir o download da mídia (até o yt-dlp concluir o arquivo)
+        def on_download(d):
+            if d["status"] == "finished":
+                metrics.observe("spotdown_stage_duration_seconds",
+                                time.perf_counter() - started["download"], stage="media_download")
+                metrics.inc("spotdown_downloaded_bytes_total",
+                            d.get("total_bytes") or d.get("downloaded_bytes") or 0)
         
-        if artist:
-            download.artist = artist
+        ydl_opts = dict(ydl_opts)
+        ydl_opts["progress_hooks"] = list(ydl_opts.get("progress_hooks", [])) + [on_download]
         
-        self.db.commit()
-        self.db.refresh(download)
+        for attempt in range(HTTP_MAX_RETRIES + 1):
+            limiter.acquire("youtube_media")
+            started["download"] = time.perf_counter()
+            try:
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    info = ydl.extract_info(video_url, download=True)
+                    downloads = info.get("requested_downloads") or [{}]
+                    return downloads[0].get("filepath") or ydl.prepare_filename(info)
+            except yt_dlp.utils.DownloadError as e:
+                throttled = "429" in str(e) or "Too Many Requests" in str(e)
+                if not throttled or attempt == HTTP_MAX_RETRIES:
+                    metrics.inc("spotdown_stage_errors_total", stage="media_download")
+                    raise
+                limiter.block("youtube_media", RATE_LIMIT_DEFAULT_BACKOFF * (2 ** attempt))
     
-    def search_youtube(self, query):
+    def _search_youtube_uncached(self, query):
         """Busca uma música no YouTube usando requisições diretas"""
-        try:
-            search_url = f"https://www.youtube.com/results?search_query={query.replace(' ', '+')}"
-            response = requests.get(search_url)
-            
-            # Extrair o vídeo ID do primeiro resultado usando regex
-            video_ids = re.findall(r"watch\?v=(\S{11})", response.text)
-            
-            if not video_ids:
-                return None
-                
-            # Pegar o primeiro resultado
-            return video_ids[0]
-        except Exception as e:
-            print(f"Erro ao buscar no YouTube: {e}")
+        response = self.http.get(f"{YOUTUBE_BASE_URL}/results", params={"search_query": query})
+        response.raise_for_status()
+        
+        # Extrair o vídeo ID do primeiro resultado usando regex
+        video_ids = re.findall(r"watch\?v=(\S{11})", response.text)
+        
+        if not video_ids:
             return None
+            
+        # Pegar o primeiro resultado
+        return video_ids[0]
     
-    def download_track(self, track_id, download_id):
-        """Baixa uma faixa específica do Spotify"""
+    def download_track(self, track_id, download_id, output_format=None):
+        """Baixa uma faixa específica do Spotify (no formato informado ou no da configuração)"""
         try:
             # Atualizar status
             self.update_download_status(download_id, "processando", "Obtendo informações da faixa")
             
-            # Obter informações da faixa
-            track = self.sp.track(track_id)
-            artist = track["artists"][0]["name"]
-            title = track["name"]
-            query = f"{artist} - {title}"
-            
-            # Atualizar nome e artista no banco de dados
-            self.update_download_status(
-                download_id, "processando", 
-                f"Buscando: {query}", 
-                name=title, artist=artist, progress=10.0
-            )
-            
-            # Buscar no YouTube
-            video_id = self.search_youtube(query)
+            # Executar as etapas em sequência nesta thread (uma faixa só não tem o que
+            # sobrepor no pipeline); a conversão ainda ocupa uma vaga de CPU compartilhada
+            item = {
+                "track_id": track_id, "target_path": self.download_path, "download_id": download_id,
+                "output_format": output_format or self.output_format
+            }
+            result = run_steps(self._track_steps(), item)
             
-            if not video_id:
+            if result["status"] != "concluido":
                 self.update_download_status(
                     download_id, "erro", 
-                    f"Não foi possível encontrar: {query}", 
-                    error_message=f"Não foi possível encontrar vídeo para: {query}"
+                    result["message"], 
+                    error_message=result["error_message"]
                 )
-                return {"status": "erro", "message": f"Não foi possível encontrar: {query}"}
-            
-            video_url = f"https://www.youtube.com/watch?v={video_id}"
-            
-            # Atualizar status
-            self.update_download_status(
-                download_id, "processando", 
-                f"Baixando: {query}", 
-                progress=30.0
-            )
+                return {"status": "erro", "message": result["message"]}
             
-            # Sanitizar nome de arquivo
-            safe_title = re.sub(r'[\\/*?:"<>|]', "", title)
-            safe_artist = re.sub(r'[\\/*?:"<>|]', "", artist)
-            filename = f"{safe_artist} - {safe_title}"
-            file_path = os.path.join(self.download_path, f"{filename}.mp3")
-            
-            # Configurar opções de download
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': os.path.join(self.download_path, f"{filename}.%(ext)s"),
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '320',
-                }],
-                'quiet': True,
-                'no_warnings': True,
-                'progress_hooks': [lambda d: self._progress_hook(d, download_id)]
-            }
-            
-            # Baixar áudio
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([video_url])
+            # Registrar o arquivo no catálogo antes de anunciar a conclusão
+            with self.db_lock:
+                register_files(self.db, self.user_id, download_id, [(0, result["file_path"])])
             
             # Atualizar status final
+            message = f"Download concluído: {item['artist']} - {item['title']}"
             self.update_download_status(
                 download_id, "concluido", 
-                f"Download concluído: {artist} - {title}", 
-                file_path=file_path, 
+                message, 
+                file_path=result["file_path"], 
                 progress=100.0
             )
             
             return {
                 "status": "concluido", 
-                "message": f"Download concluído: {artist} - {title}",
-                "file_path": file_path
+                "message": message,
+                "file_path": result["file_path"]
             }
         
         except Exception as e:
@@ -194,6 +421,129 @@ class SpotifyDownloader:
             )
             return {"status": "erro", "message": f"Erro ao baixar {track_id}: {error_msg}"}
     
+    def _track_steps(self):
+        """Etapas do download de uma faixa no pipeline"""
+        return [
+            ("resolve", self._resolve_stage),
+            ("search", self._search_stage),
+            ("fetch", self._fetch_stage),
+            ("transcode", self._transcode_stage),
+        ]
+    
+    def _report(self, item, message, **fields):
+        """
+        Grava o progresso de um job de faixa a partir de uma etapa. Nas playlists
+        (itens sem download_id) quem grava é a thread principal do job.
+        """
+        if item.get("download_id"):
+            self.update_download_status(item["download_id"], "processando", message, **fields)
+    
+    def _resolve_stage(self, item):
+        """Etapa resolve: metadados da faixa e reaproveitamento de arquivos já baixados"""
+        extensions = OUTPUT_EXTENSIONS[item["output_format"]]
+        
+        # Pular as faixas da playlist que já constam (e conferem) no manifesto, no formato pedido
+        manifest = item.get("manifest")
+        if manifest is not None:
+            file_path = manifest.verify(item["track_id"])
+            if file_path and os.path.splitext(file_path)[1][1:].lower() in extensions:
+                return {"status": "concluido", "message": f"Já baixada: {item['track_id']}",
+                        "file_path": file_path, "skipped": True}
+        
+        # Obter informações da faixa (se ainda não vieram com a página da playlist)
+        track = item.get("track") or self.get_track(item["track_id"])
+        artist = track["artists"][0]["name"]
+        title = track["name"]
+        query = f"{artist} - {title}"
+        
+        # Sanitizar nome de arquivo
+        safe_title = re.sub(r'[\\/*?:"<>|]', "", title)
+        safe_artist = re.sub(r'[\\/*?:"<>|]', "", artist)
+        filename = f"{safe_artist} - {safe_title}"
+        
+        item.update(track=track, artist=artist, title=title, query=query, filename=filename)
+        
+        # Atualizar nome e artista no banco de dados
+        self._report(item, f"Buscando: {query}", name=title, artist=artist, progress=10.0)
+        
+        # Reaproveitar a faixa se ela já foi baixada (por qualquer usuário) neste formato
+        for extension in extensions:
+            file_path = os.path.join(item["target_path"], f"{filename}.{extension}")
+            if self.content_store.link(track["id"], extension, file_path):
+                item["file_path"] = file_path
+                return self._track_done(item)
+        return None
+    
+    def _search_stage(self, item):
+        """Etapa search: vídeo correspondente no YouTube"""
+        query = item["query"]
+        video_id = self.search_youtube(query, track_id=item["track"]["id"])
+        
+        if not video_id:
+            return {
+                "status": "erro",
+                "message": f"Não foi possível encontrar: {query}",
+                "error_message": f"Não foi possível encontrar vídeo para: {query}"
+            }
+        
+        item["video_url"] = f"{YOUTUBE_BASE_URL}/watch?v={video_id}"
+        self._report(item, f"Baixando: {query}", progress=30.0)
+        return None
+    
+    def _fetch_stage(self, item):
+        """Etapa fetch: download do áudio no formato original"""
+        ydl_opts = {
+            'format': 'bestaudio/best',
+            'outtmpl': os.path.join(item["target_path"], f"{item['filename']}.%(ext)s"),
+            'quiet': True,
+            'no_warnings': True,
+        }
+        if item.get("download_id"):
+            ydl_opts['progress_hooks'] = [lambda d: self._progress_hook(d, item["download_id"])]
+        
+        item["source_path"] = self._download_media(ydl_opts, item["video_url"])
+        
+        # No formato native o arquivo baixado já é o resultado: concluir sem ocupar uma vaga de CPU
+        if item["output_format"] == "native":
+            return self._store_output(item, item["source_path"])
+        return None
+    
+    def _transcode_stage(self, item):
+        """Etapa transcode (CPU): conversão para MP3 ou cópia do áudio para um contêiner de áudio"""
+        source_path = item["source_path"]
+        source_extension = os.path.splitext(source_path)[1][1:].lower()
+        
+        if item["output_format"] == "remux" and source_extension in REMUX_EXTENSIONS:
+            extension = REMUX_EXTENSIONS[source_extension]
+            convert, stage = remux_audio, "ffmpeg_remux"
+        else:
+            if item["output_format"] == "remux":
+                print(f"Áudio .{source_extension} sem contêiner para cópia direta, convertendo para MP3: {item['query']}")
+            extension = "mp3"
+            convert, stage = transcode_to_mp3, "ffmpeg_conversion"
+        
+        file_path = os.path.join(item["target_path"], f"{item['filename']}.{extension}")
+        if os.path.normcase(source_path) != os.path.normcase(file_path):
+            with self.metrics.time_stage(stage):
+                convert(source_path, file_path)
+        
+        return self._store_output(item, file_path)
+    
+    def _store_output(self, item, file_path):
+        """Registra o arquivo final da faixa no store (para os próximos pedidos) e conclui a faixa"""
+        item["file_path"] = file_path
+        extension = os.path.splitext(file_path)[1][1:].lower()
+        self.content_store.add(item["track"]["id"], extension, file_path)
+        return self._track_done(item)
+    
+    def _track_done(self, item):
+        """Resultado de uma faixa concluída (com a entrada do manifesto, nas playlists)"""
+        result = {"status": "concluido", "message": f"Concluído: {item['query']}", "file_path": item["file_path"]}
+        if item.get("manifest") is not None:
+            # Calculado aqui (na thread da etapa) para não atrasar a thread principal
+            result["manifest_entry"] = PlaylistManifest.build_entry(item["track"]["id"], item["file_path"])
+        return result
+    
     def _progress_hook(self, d, download_id):
         """Hook para acompanhar o progresso de download do yt-dlp"""
         if d['status'] == 'downloading':
@@ -212,7 +562,7 @@ class SpotifyDownloader:
         elif d['status'] == 'finished':
             self.update_download_status(
                 download_id, "processando", 
-                "Convertendo para MP3...", 
+                "Processando o áudio...", 
                 progress=95.0
             )
     
@@ -220,34 +570,20 @@ class SpotifyDownloader:
         """Pesquisa faixas ou playlists no Spotify"""
         try:
             results = self.sp.search(q=query, limit=limit, type=search_type)
-            
-            items = []
-            if search_type == "track":
-                for track in results["tracks"]["items"]:
-                    items.append({
-                        "id": track["id"],
-                        "name": track["name"],
-                        "artist": track["artists"][0]["name"] if track["artists"] else None,
-                        "type": "track",
-                        "image_url": track["album"]["images"][0]["url"] if track["album"]["images"] else None
-                    })
-            elif search_type == "playlist":
-                for playlist in results["playlists"]["items"]:
-                    items.append({
-                        "id": playlist["id"],
-                        "name": playlist["name"],
-                        "artist": playlist["owner"]["display_name"],
-                        "type": "playlist",
-                        "image_url": playlist["images"][0]["url"] if playlist["images"] else None
-                    })
-                    
-            return items
+            return parse_search_results(results, search_type)
         except Exception as e:
             raise Exception(f"Erro na pesquisa: {str(e)}")
     
-    def download_playlist(self, playlist_id, download_id):
-        """Baixa todas as faixas de uma playlist do Spotify"""
+    def download_playlist(self, playlist_id, download_id, max_workers=None, output_format=None):
+        """Baixa todas as faixas de uma playlist do Spotify (no formato informado ou no da configuração)"""
         try:
+            # Tamanho do pool de faixas simultâneas desta playlist
+            if not max_workers or max_workers < 1:
+                max_workers = PLAYLIST_MAX_WORKERS
+            
+            # Formato dos arquivos (o da configuração, se o pedido não informar)
+            output_format = output_format or self.output_format
+            
             # Atualizar status
             self.update_download_status(
                 download_id, "processando", 
@@ -255,8 +591,14 @@ class SpotifyDownloader:
                 progress=5.0
             )
             
-            # Obter informações da playlist
-            playlist = self.sp.playlist(playlist_id)
+            # Obter nome e a primeira página de faixas em uma única requisição,
+            # apenas com os campos necessários
+            playlist = self._spotify_lookup(
+                self.sp.playlist,
+                playlist_id,
+                fields=f"id,name,tracks({PLAYLIST_TRACK_FIELDS})",
+                additional_types=("track",)
+            )
             playlist_name = playlist["name"]
             
             # Sanitizar nome da playlist
@@ -275,104 +617,104 @@ class SpotifyDownloader:
             if not os.path.exists(playlist_path):
                 os.makedirs(playlist_path)
             
-            # Backup da pasta de downloads original
-            original_path = self.download_path
-            self.download_path = playlist_path
-            
-            # Obter todas as faixas da playlist
-            tracks = self.sp.playlist_tracks(playlist_id)
+            # Primeira página de faixas da playlist
+            tracks = playlist["tracks"]
             total = tracks["total"]
             
             self.update_download_status(
                 download_id, "processando", 
-                f"Playlist com {total} faixas. Iniciando downloads...", 
+                f"Playlist com {total} faixas. Iniciando downloads ({max_workers} simultâneos)...", 
                 progress=15.0
             )
             
+            # Manifesto das faixas já concluídas (permite retomar a playlist)
+            manifest = PlaylistManifest(playlist_path)
+            
             # Baixar cada faixa
             success_count = 0
+            skipped_count = 0
             failed_tracks = []
             
+            # Arquivos concluídos (posição na playlist, caminho) para o catálogo
+            completed_files = []
+            
             # Calcular quanto cada faixa vale no progresso
             progress_per_track = 80.0 / total if total > 0 else 0
-            current_progress = 15.0
             
-            # Processar o primeiro lote de faixas
-            for i, item in enumerate(tracks["items"]):
-                if item["track"] is None:
-                    continue
+            # As faixas passam em paralelo pelas etapas do pipeline (max_workers nas
+            # etapas de rede, a conversão limitada pelos núcleos). Apenas esta thread
+            # acessa o banco de dados (a sessão não é thread-safe), então as etapas
+            # só baixam e devolvem o resultado.
+            futures = {}
+            with DownloadPipeline(io_workers=max_workers, name=f"playlist_{download_id[:8]}") as pipeline:
+                offset = 0
+                while True:
+                    # As faixas da página já trazem os metadados: guardar no cache e
+                    # repassar ao download, sem um sp.track() por faixa
+                    self._cache_playlist_tracks(tracks["items"])
+                    
+                    for position, item in enumerate(tracks["items"], start=offset + 1):
+                        if item["track"] is None or not item["track"].get("id"):
+                            continue
+                        
+                        track = item["track"]
+                        future = pipeline.submit(self._track_steps(), {
+                            "track_id": track["id"], "track": track,
+                            "target_path": playlist_path, "manifest": manifest,
+                            "output_format": output_format
+                        })
+                        futures[future] = (position, track)
                     
-                track = item["track"]
-                current_progress += progress_per_track / 2
+                    # Obter mais faixas se a playlist for grande
+                    offset += len(tracks["items"])
+                    if not tracks["items"] or offset >= total:
+                        break
+                    tracks = self._spotify_lookup(
+                        self.sp.playlist_items,
+                        playlist_id,
+                        fields=PLAYLIST_TRACK_FIELDS,
+                        limit=PLAYLIST_PAGE_SIZE,
+                        offset=offset,
+                        additional_types=("track",)
+                    )
                 
-                self.update_download_status(
-                    download_id, "processando", 
-                    f"[{i+1}/{total}] Baixando: {track['name']}", 
-                    progress=current_progress
-                )
-
-                try:
-                    # Criar um ID temporário para a faixa (não salvo no banco)
-                    track_temp_id = f"{download_id}_track_{i}"
+                # Processar os resultados na ordem em que terminam
+                for future in as_completed(futures):
+                    position, track = futures[future]
                     
-                    # Baixar a faixa
-                    result = self._download_track_internal(track["id"], track_temp_id)
+                    try:
+                        result = future.result()
+                    except Exception as track_error:
+                        result = {"status": "erro", "message": str(track_error)}
                     
                     if result.get("status") == "concluido":
                         success_count += 1
-                        current_progress += progress_per_track / 2
-                        self.update_download_status(
-                            download_id, "processando", 
-                            f"[{i+1}/{total}] Concluído: {track['name']}", 
-                            progress=current_progress
-                        )
+                        completed_files.append((position, result["file_path"]))
+                        if result.get("skipped"):
+                            skipped_count += 1
+                            message = "Já baixada"
+                        else:
+                            manifest.record(result["manifest_entry"])
+                            message = "Concluído"
                     else:
                         failed_tracks.append(f"{track['artists'][0]['name']} - {track['name']}")
-                except Exception as track_error:
-                    failed_tracks.append(f"{track['artists'][0]['name']} - {track['name']}")
-            
-            # Obter mais faixas se a playlist for grande
-            while tracks["next"]:
-                tracks = self.sp.next(tracks)
-                for i, item in enumerate(tracks["items"]):
-                    if item["track"] is None:
-                        continue
-                        
-                    track = item["track"]
-                    current_index = i + 1 + success_count + len(failed_tracks)
-                    current_progress += progress_per_track / 2
+                        message = "Falhou"
                     
+                    done = success_count + len(failed_tracks)
                     self.update_download_status(
                         download_id, "processando", 
-                        f"[{current_index}/{total}] Baixando: {track['name']}", 
-                        progress=current_progress
+                        f"[{done}/{total}] {message}: {track['name']}", 
+                        progress=min(15.0 + done * progress_per_track, 95.0)
                     )
-                    
-                    try:
-                        # Criar um ID temporário para a faixa (não salvo no banco)
-                        track_temp_id = f"{download_id}_track_{current_index}"
-                        
-                        # Baixar a faixa
-                        result = self._download_track_internal(track["id"], track_temp_id)
-                        
-                        if result.get("status") == "concluido":
-                            success_count += 1
-                            current_progress += progress_per_track / 2
-                            self.update_download_status(
-                                download_id, "processando", 
-                                f"[{current_index}/{total}] Concluído: {track['name']}", 
-                                progress=current_progress
-                            )
-                        else:
-                            failed_tracks.append(f"{track['artists'][0]['name']} - {track['name']}")
-                    except Exception as track_error:
-                        failed_tracks.append(f"{track['artists'][0]['name']} - {track['name']}")
             
-            # Restaurar caminho original
-            self.download_path = original_path
+            # Registrar os arquivos no catálogo (uma única transação) antes de anunciar a conclusão
+            with self.db_lock:
+                register_files(self.db, self.user_id, download_id, completed_files)
             
             # Finalizar o download
             status_message = f"Download da playlist concluído: {success_count}/{total} faixas"
+            if skipped_count:
+                status_message += f" ({skipped_count} já baixadas anteriormente)"
             if failed_tracks:
                 status_message += f" ({len(failed_tracks)} falhas)"
             
@@ -400,47 +742,4 @@ class SpotifyDownloader:
                 error_message=error_msg,
                 progress=0.0
             )
-            return {"status": "erro", "message": f"Erro ao baixar playlist {playlist_id}: {error_msg}"}
-    
-    def _download_track_internal(self, track_id, temp_id):
-        """Versão simplificada de download_track para uso interno na playlist"""
-        try:
-            # Obter informações da faixa
-            track = self.sp.track(track_id)
-            artist = track["artists"][0]["name"]
-            title = track["name"]
-            query = f"{artist} - {title}"
-            
-            # Buscar no YouTube
-            video_id = self.search_youtube(query)
-            
-            if not video_id:
-                return {"status": "erro", "message": f"Não foi possível encontrar: {query}"}
-            
-            video_url = f"https://www.youtube.com/watch?v={video_id}"
-            
-            # Sanitizar nome de arquivo
-            safe_title = re.sub(r'[\\/*?:"<>|]', "", title)
-            safe_artist = re.sub(r'[\\/*?:"<>|]', "", artist)
-            filename = f"{safe_artist} - {safe_title}"
-            
-            # Configurar opções de download
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': os.path.join(self.download_path, f"{filename}.%(ext)s"),
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '320',
-                }],
-                'quiet': True,
-                'no_warnings': True,
-            }
-            
-            # Baixar áudio
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([video_url])
-            
-            return {"status": "concluido", "message": f"Concluído: {query}"}
-        except Exception as e:
-            return {"status": "erro", "message": f"Erro ao baixar {track_id}: {str(e)}"}
\ No newline at end of file
+            return {"status": "erro", "message": f"Erro ao baixar playlist {playlist_id}: {error_msg}"}
\ No newline at end of file
@@ -0,0 +1,98 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Pub/sub em memória para eventos de progresso dos downloads
+"""
+import asyncio
+import threading
+from typing import Any, Dict, Optional, Set
+
+# Eventos pendentes por assinante antes de descartar os mais antigos
+SUBSCRIBER_QUEUE_SIZE = 100
+
+class Subscription:
+    """Assinatura de um cliente: recebe eventos de um usuário (ou de um único download)"""
+
+    def __init__(self, user_id: int, download_id: Optional[str], loop: asyncio.AbstractEventLoop):
+        self.user_id = user_id
+        self.download_id = download_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def _offer(self, event: Dict[str, Any]):
+        """Enfileira o evento (no loop do assinante), descartando o mais antigo se cheio"""
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[Dict[str, Any]]:
+        """Aguarda o próximo evento; retorna None se nada chegar dentro do timeout"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class ProgressBroker:
+    """
+    Distribui os eventos de status publicados pelo gerenciador de downloads
+    (em qualquer thread) para os assinantes conectados à API (no event loop).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers: Dict[int, Set[Subscription]] = {}
+
+    def subscribe(self, user_id: int, download_id: Optional[str] = None) -> Subscription:
+        """Cria uma assinatura (chamar de dentro do event loop)"""
+        subscription = Subscription(user_id, download_id, asyncio.get_running_loop())
+        with self.lock:
+            self.subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Remove uma assinatura"""
+        with self.lock:
+            subscriptions = self.subscribers.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscribers[subscription.user_id]
+
+    def publish(self, user_id: int, download_id: str, event: Dict[str, Any]):
+        """Publica um evento de um download para os assinantes do usuário"""
+        with self.lock:
+            subscriptions = list(self.subscribers.get(user_id, ()))
+
+        for subscription in subscriptions:
+            if subscription.download_id is None or subscription.download_id == download_id:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription._offer, event)
+                except RuntimeError:
+                    # Loop encerrado: a assinatura será removida pelo próprio cliente
+                    pass
+
+def download_event(download, message: str = "") -> Dict[str, Any]:
+    """Monta o evento de status a partir de um registro de Download"""
+    return {
+        "download_id": download.download_id,
+        "user_id": download.user_id,
+        "status": download.status,
+        "progress": download.progress,
+        "message": message,
+        "name": download.name,
+        "artist": download.artist,
+        "file_path": download.file_path,
+        "error_message": download.error_message
+    }
+
+# Instância global do broker
+broker = ProgressBroker()
+
+def get_broker() -> ProgressBroker:
+    """Retorna a instância global do broker de eventos"""
+    return broker
@@ -0,0 +1,71 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Catálogo dos arquivos baixados, consultado por /files
+"""
+from typing import Iterable, Tuple
+
+from models import Download, DownloadFile, make_file_key
+from archive import list_entries
+
+def register_files(db, user_id: int, download_id: str, files: Iterable[Tuple[int, str]], commit: bool = True):
+    """
+    Registra no catálogo os arquivos (posição, caminho) de um download.
+    Arquivos já registrados (ex.: job executado novamente) têm o caminho atualizado.
+    """
+    paths = {make_file_key(download_id, index): (index, path) for index, path in files}
+    if not paths:
+        return
+
+    existing = {
+        row.file_key: row
+        for row in db.query(DownloadFile).filter(DownloadFile.file_key.in_(list(paths))).all()
+    }
+    for key, (index, path) in paths.items():
+        row = existing.get(key)
+        if row is not None:
+            row.file_path = path
+        else:
+            db.add(DownloadFile(
+                file_key=key, user_id=user_id, download_id=download_id,
+                track_index=index, file_path=path
+            ))
+
+    if commit:
+        db.commit()
+
+def index_playlist_folder(db, download: Download) -> int:
+    """
+    Registra os arquivos da pasta de uma playlist concluída antes da existência
+    do catálogo, em ordem de nome. Retorna quantos arquivos foram registrados.
+    """
+    entries = list_entries(download.file_path)
+    register_files(db, download.user_id, download.download_id,
+                   [(index, entry.path) for index, entry in enumerate(entries, start=1)])
+    return len(entries)
+
+def backfill_track_files(db, batch_size: int = 1000) -> int:
+    """Registra as faixas concluídas antes da existência do catálogo. Retorna quantas foram registradas"""
+    total = 0
+    while True:
+        rows = db.query(Download.download_id, Download.user_id, Download.file_path).outerjoin(
+            DownloadFile, DownloadFile.download_id == Download.download_id
+        ).filter(
+            Download.type == "track",
+            Download.status == "concluido",
+            Download.file_path.isnot(None),
+            DownloadFile.id.is_(None)
+        ).limit(batch_size).all()
+
+        if not rows:
+            return total
+
+        for download_id, user_id, file_path in rows:
+            register_files(db, user_id, download_id, [(0, file_path)], commit=False)
+        db.commit()
+        total += len(rows)
@@ -0,0 +1,143 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Cliente HTTP compartilhado (conexões persistentes, timeout e novas tentativas)
+"""
+import os
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import HTTP_POOL_SIZE, HTTP_TIMEOUT, HTTP_MAX_RETRIES, HTTP_BACKOFF_FACTOR
+from rate_limiter import get_rate_limiter, retry_after_seconds
+
+# Serviço (bucket do limitador de requisições) de cada host externo
+UPSTREAM_HOSTS = {
+    "api.spotify.com": "spotify",
+    "accounts.spotify.com": "spotify",
+    "www.youtube.com": "youtube_search",
+}
+
+def upstream_for_url(url: str) -> Optional[str]:
+    """Serviço limitado ao qual a URL pertence (None se não for limitado)"""
+    return UPSTREAM_HOSTS.get(urlsplit(url).hostname or "")
+
+class PooledSession(requests.Session):
+    """
+    Sessão requests com timeout padrão em todas as requisições.
+
+    Requisições aos serviços limitados passam pelo limitador compartilhado
+    entre processos; um 429 suspende o serviço para todos pelo tempo do
+    Retry-After e a requisição é repetida depois (até max_retries vezes).
+    """
+
+    def __init__(self, timeout: float = HTTP_TIMEOUT, max_retries: int = HTTP_MAX_RETRIES):
+        super().__init__()
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+
+        upstream = upstream_for_url(url)
+        if upstream is None:
+            return super().request(method, url, **kwargs)
+
+        limiter = get_rate_limiter()
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire(upstream)
+            response = super().request(method, url, **kwargs)
+            if response.status_code != 429:
+                return response
+
+            # Suspender o serviço para todos os processos, inclusive na última tentativa
+            limiter.block(upstream, retry_after_seconds(response.headers.get("Retry-After")))
+            if attempt == self.max_retries:
+                return response
+            response.close()
+        return response
+
+class _Retry(Retry):
+    """Retry do urllib3 que não repete o 429 (tratado pela PooledSession)"""
+
+    RETRY_AFTER_STATUS_CODES = frozenset([413, 503])
+
+def create_http_session(pool_size: int = HTTP_POOL_SIZE, timeout: float = HTTP_TIMEOUT,
+                        max_retries: int = HTTP_MAX_RETRIES,
+                        backoff_factor: float = HTTP_BACKOFF_FACTOR) -> PooledSession:
+    """
+    Cria uma sessão com pool de conexões keep-alive e novas tentativas com
+    backoff exponencial para erros 5xx. O 429 é tratado pela PooledSession,
+    para que o Retry-After valha para todos os processos.
+    """
+    retry = _Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=max_retries,
+        status=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS", "POST", "PUT", "DELETE"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = PooledSession(timeout=timeout, max_retries=max_retries)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# Sessão do processo atual (recriada após fork, pois sockets não devem ser compartilhados)
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def get_http_session() -> PooledSession:
+    """Retorna a sessão HTTP compartilhada do processo atual"""
+    global _session, _session_pid
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = create_http_session()
+            _session_pid = os.getpid()
+        return _session
+
+def get_http_stats() -> Dict[str, Any]:
+    """
+    Requisições e conexões abertas por host na sessão do processo atual.
+    Quanto menor a razão conexões/requisições, maior o reaproveitamento.
+    """
+    if _session is None or _session_pid != os.getpid():
+        return {}
+
+    stats = {}
+    seen = set()
+    for adapter in _session.adapters.values():
+        if id(adapter) in seen:
+            continue
+        seen.add(id(adapter))
+
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}"
+            entry = stats.setdefault(host, {"requests": 0, "connections": 0})
+            entry["requests"] += pool.num_requests
+            entry["connections"] += pool.num_connections
+
+    for entry in stats.values():
+        requests_count = entry["requests"]
+        entry["reused"] = max(requests_count - entry["connections"], 0)
+        entry["reuse_ratio"] = round(entry["reused"] / requests_count, 4) if requests_count else 0.0
+    return stats
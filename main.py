@@ -10,31 +10,49 @@ Arquivo principal para o Spotify Downloader API
 """
 import os
 import re
+import json
 import uuid
+import base64
 import uvicorn
 from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query, status
+from urllib.parse import quote
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 # Importar módulos do aplicativo
-from config import API_HOST, API_PORT, JWT_ACCESS_TOKEN_EXPIRE_MINUTES
-from database import get_db, init_db
+from config import (
+    API_HOST, API_PORT, JWT_ACCESS_TOKEN_EXPIRE_MINUTES, SSE_HEARTBEAT_INTERVAL,
+    DOWNLOADS_PAGE_SIZE, DOWNLOADS_MAX_PAGE_SIZE
+)
+from database import get_db, get_async_db, init_db
 from models import (
-    User, SpotifyConfig, Download, 
-    UserCreate, UserResponse, UserUpdate, Token,
+    User, SpotifyConfig, Download, DownloadFile, FINAL_STATUSES,
+    UserCreate, UserResponse, UserUpdate, AdminUserUpdate, Token,
     SpotifyConfigCreate, SpotifyConfigResponse,
     SpotifyUrl, SpotifyId,
-    DownloadRequest, DownloadStatus, DownloadResponse,
+    DownloadRequest, DownloadStatus, DownloadResponse, DownloadFileResponse,
     SearchResult
 )
 from auth import (
     get_password_hash, authenticate_user, create_access_token,
-    get_current_active_user, get_admin_user
+    get_current_active_user, get_admin_user, invalidate_user_cache, verify_metrics_access
 )
 from download_queue import init_download_manager, get_download_manager
+from cache import get_shared_cache
+from http_client import get_http_stats
+from rate_limiter import get_rate_limiter
+from events import get_broker, download_event
+from spotify_clients import get_spotify_clients
+from archive import TarArchive, iter_zip, list_entries, parse_byte_range
+from file_catalog import index_playlist_folder
+from media_response import media_file_response
 
 # Inicializar aplicação FastAPI
 app = FastAPI(
@@ -50,6 +68,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Permitir todos os métodos
     allow_headers=["*"],  # Permitir todos os headers
+    expose_headers=["X-Next-Cursor"],  # Cursor da paginação de /downloads, lido pelos clientes web
 )
 
 # --- Eventos de inicialização e encerramento ---
@@ -79,6 +98,9 @@ async def shutdown_event():
     print("API encerrada com sucesso!")
 
 # --- Rotas da API ---
+# Rotas com acesso síncrono ao banco, hash de senha ou chamadas bloqueantes são
+# declaradas com "def" (o FastAPI as executa em um pool de threads). Rotas "async"
+# usam apenas a sessão assíncrona (get_async_db) para não bloquear o event loop.
 
 @app.get("/")
 async def root():
@@ -92,7 +114,7 @@ async def root():
 # --- Rotas de Autenticação ---
 
 @app.post("/users/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+def create_user(user: UserCreate, db: Session = Depends(get_db)):
     """Criar um novo usuário"""
     # Verificar se o nome de usuário já existe
     db_user = db.query(User).filter(User.username == user.username).first()
@@ -120,7 +142,7 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
     return db_user
 
 @app.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Endpoint para obter token de acesso"""
     user = authenticate_user(db, form_data.username, form_data.password)
     if not user:
@@ -143,7 +165,7 @@ async def read_users_me(current_user: User = Depends(get_current_active_user)):
     return current_user
 
 @app.put("/users/me", response_model=UserResponse)
-async def update_user(
+def update_user(
     user_update: UserUpdate,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -163,6 +185,7 @@ async def update_user(
     
     db.commit()
     db.refresh(user)
+    invalidate_user_cache(user.username)
     
     return user
 
@@ -173,16 +196,16 @@ async def list_users(
     skip: int = 0, 
     limit: int = 100, 
     admin_user: User = Depends(get_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Listar todos os usuários (apenas admin)"""
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    result = await db.execute(select(User).order_by(User.id).offset(skip).limit(limit))
+    return result.scalars().all()
 
 @app.put("/admin/users/{user_id}", response_model=UserResponse)
-async def admin_update_user(
+def admin_update_user(
     user_id: int,
-    user_update: UserUpdate,
+    user_update: AdminUserUpdate,
     admin_user: User = Depends(get_admin_user),
     db: Session = Depends(get_db)
 ):
@@ -201,13 +224,21 @@ async def admin_update_user(
     if user_update.password is not None:
         user.hashed_password = get_password_hash(user_update.password)
     
+    # Divisão dos slots da fila de downloads entre os usuários
+    if user_update.download_weight is not None:
+        user.download_weight = user_update.download_weight
+    
+    if user_update.max_concurrent_downloads is not None:
+        user.max_concurrent_downloads = user_update.max_concurrent_downloads
+    
     db.commit()
     db.refresh(user)
+    invalidate_user_cache(user.username)
     
     return user
 
 @app.delete("/admin/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(
+def delete_user(
     user_id: int,
     admin_user: User = Depends(get_admin_user),
     db: Session = Depends(get_db)
@@ -221,27 +252,48 @@ async def delete_user(
     if user.id == admin_user.id:
         raise HTTPException(status_code=400, detail="Não é possível excluir o próprio usuário admin")
     
+    username = user.username
     db.delete(user)
     db.commit()
+    invalidate_user_cache(username)
+    get_spotify_clients().invalidate(user_id)
     
     return None
 
+@app.get("/admin/cache")
+async def get_cache_stats(admin_user: User = Depends(get_admin_user)):
+    """Estatísticas do cache de metadados compartilhado e das pesquisas no Spotify (apenas admin)"""
+    stats = await run_in_threadpool(get_shared_cache().stats)
+    stats["spotify_search"] = get_spotify_clients().stats()
+    return stats
+
+@app.get("/admin/http")
+async def get_http_client_stats(admin_user: User = Depends(get_admin_user)):
+    """Requisições e conexões HTTP do processo da API por host (apenas admin)"""
+    return get_http_stats()
+
+@app.get("/admin/rate-limits")
+async def get_rate_limits(admin_user: User = Depends(get_admin_user)):
+    """Fichas disponíveis e bloqueios do limite de requisições de cada serviço (apenas admin)"""
+    return await run_in_threadpool(get_rate_limiter().budget)
+
 # --- Rotas para configuração do Spotify ---
 
 @app.get("/spotify/config", response_model=SpotifyConfigResponse)
 async def get_spotify_config(
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obter configuração do Spotify do usuário atual"""
-    config = db.query(SpotifyConfig).filter(SpotifyConfig.user_id == current_user.id).first()
+    result = await db.execute(select(SpotifyConfig).where(SpotifyConfig.user_id == current_user.id))
+    config = result.scalars().first()
     if not config:
         raise HTTPException(status_code=404, detail="Configuração não encontrada")
     
     return config
 
 @app.post("/spotify/config", response_model=SpotifyConfigResponse)
-async def create_spotify_config(
+def create_spotify_config(
     config: SpotifyConfigCreate,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -267,6 +319,9 @@ async def create_spotify_config(
     db.commit()
     db.refresh(db_config)
     
+    # Descartar o cliente Spotify e as pesquisas em cache feitos com a configuração anterior
+    get_spotify_clients().invalidate(current_user.id)
+    
     return db_config
 
 # --- Rotas para extração de ID e pesquisa ---
@@ -303,7 +358,7 @@ async def extract_id(spotify_url: SpotifyUrl):
         raise HTTPException(status_code=500, detail=f"Erro ao extrair ID: {str(e)}")
 
 @app.get("/search", response_model=Dict[str, List[SearchResult]])
-async def search_spotify(
+def search_spotify(
     query: str = Query(..., description="Termo de busca"),
     type: str = Query("track", description="Tipo de busca (track ou playlist)"),
     limit: int = Query(5, description="Número máximo de resultados"),
@@ -312,6 +367,13 @@ async def search_spotify(
 ):
     """Pesquisar no Spotify"""
     try:
+        clients = get_spotify_clients()
+        
+        # Pesquisas recentes do usuário são respondidas sem consultar o banco nem o Spotify
+        results = clients.cached_search(current_user.id, query, limit, type)
+        if results is not None:
+            return {"results": results}
+        
         # Verificar se usuário possui configuração do Spotify
         config = db.query(SpotifyConfig).filter(SpotifyConfig.user_id == current_user.id).first()
         if not config:
@@ -320,12 +382,8 @@ async def search_spotify(
                 detail="Você não possui configuração do Spotify. Configure primeiro."
             )
         
-        # Inicializar downloader
-        from downloader import SpotifyDownloader
-        downloader = SpotifyDownloader(db, current_user.id)
-        
-        # Executar pesquisa
-        results = downloader.search(query, limit, type)
+        # Executar pesquisa com o cliente do usuário (reaproveitado entre requisições)
+        results = clients.search(config, query, limit, type)
         return {"results": results}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -335,7 +393,7 @@ async def search_spotify(
 # --- Rotas para downloads ---
 
 @app.post("/downloads", response_model=DownloadStatus)
-async def start_download(
+def start_download(
     download_request: DownloadRequest,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -360,7 +418,9 @@ async def start_download(
             current_user.id,
             download_request.spotify_id,
             download_request.type,
-            download_request.priority
+            download_request.priority,
+            download_request.workers,
+            download_request.output_format
         )
         
         return {
@@ -373,13 +433,114 @@ async def start_download(
             raise e
         raise HTTPException(status_code=500, detail=f"Erro ao iniciar download: {str(e)}")
 
+def _format_sse(event: Dict[str, Any]) -> str:
+    """Formata um evento de status no formato Server-Sent Events"""
+    return f"event: status\ndata: {json.dumps(event, default=str)}\n\n"
+
+async def _stream_download_events(request: Request, subscription, snapshot: List[Dict[str, Any]],
+                                  single_download: bool):
+    """Envia o estado atual e depois cada mudança de status publicada pelo gerenciador"""
+    try:
+        for event in snapshot:
+            yield _format_sse(event)
+        
+        # Download único que já terminou: nada mais a enviar
+        if single_download and snapshot and snapshot[0]["status"] in FINAL_STATUSES:
+            return
+        
+        while not await request.is_disconnected():
+            event = await subscription.get(timeout=SSE_HEARTBEAT_INTERVAL)
+            if event is None:
+                # Comentário SSE para manter a conexão aberta
+                yield ": ping\n\n"
+                continue
+            
+            yield _format_sse(event)
+            if single_download and event["status"] in FINAL_STATUSES:
+                return
+    finally:
+        get_broker().unsubscribe(subscription)
+
+def _event_stream_response(generator) -> StreamingResponse:
+    """Resposta text/event-stream sem cache nem buffer em proxies"""
+    return StreamingResponse(
+        generator,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/downloads/events")
+async def stream_user_downloads(
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stream (SSE) das mudanças de status de todos os downloads do usuário"""
+    # Assinar antes de ler o estado atual para não perder eventos
+    subscription = get_broker().subscribe(current_user.id)
+    
+    result = await db.execute(
+        select(Download).where(
+            Download.user_id == current_user.id,
+            Download.status.in_(["na_fila", "processando"])
+        ).order_by(Download.created_at)
+    )
+    snapshot = [download_event(download) for download in result.scalars().all()]
+    
+    return _event_stream_response(_stream_download_events(request, subscription, snapshot, False))
+
+@app.get("/downloads/{download_id}/events")
+async def stream_download(
+    download_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Stream (SSE) das mudanças de status de um download específico"""
+    subscription = get_broker().subscribe(current_user.id, download_id)
+    
+    result = await db.execute(
+        select(Download).where(
+            Download.download_id == download_id, 
+            Download.user_id == current_user.id
+        )
+    )
+    download = result.scalars().first()
+    
+    if not download:
+        get_broker().unsubscribe(subscription)
+        raise HTTPException(status_code=404, detail="Download não encontrado")
+    
+    snapshot = [download_event(download)]
+    return _event_stream_response(_stream_download_events(request, subscription, snapshot, True))
+
 @app.get("/downloads/{download_id}", response_model=DownloadResponse)
 async def get_download_status(
     download_id: str,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obter status de um download específico"""
+    result = await db.execute(
+        select(Download).where(
+            Download.download_id == download_id, 
+            Download.user_id == current_user.id
+        )
+    )
+    download = result.scalars().first()
+    
+    if not download:
+        raise HTTPException(status_code=404, detail="Download não encontrado")
+    
+    return download
+
+@app.get("/downloads/{download_id}/files", response_model=List[DownloadFileResponse])
+def list_download_files(
+    download_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: Session = Depends(get_db)
+):
+    """Listar os arquivos de um download (chaves usadas em /files/{file_key})"""
     download = db.query(Download).filter(
         Download.download_id == download_id, 
         Download.user_id == current_user.id
@@ -388,10 +549,89 @@ async def get_download_status(
     if not download:
         raise HTTPException(status_code=404, detail="Download não encontrado")
     
-    return download
+    files = db.query(DownloadFile).filter(
+        DownloadFile.download_id == download_id
+    ).order_by(DownloadFile.track_index).all()
+    
+    # Playlists concluídas antes do catálogo existir: registrar os arquivos da pasta agora
+    if (not files and download.type == "playlist" and download.status == "concluido"
+            and download.file_path and os.path.isdir(download.file_path)):
+        index_playlist_folder(db, download)
+        files = db.query(DownloadFile).filter(
+            DownloadFile.download_id == download_id
+        ).order_by(DownloadFile.track_index).all()
+    
+    return files
+
+@app.get("/downloads/{download_id}/archive")
+async def download_archive(
+    download_id: str,
+    request: Request,
+    format: str = Query("zip", pattern="^(zip|tar)$", description="Formato do pacote (zip ou tar)"),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Baixar uma playlist concluída em um único arquivo, gerado durante o envio.
+    
+    O ZIP é enviado sem compressão e sem tamanho prévio. O tar tem tamanho
+    conhecido e aceita Range (com If-Range/ETag) para retomar o download.
+    """
+    result = await db.execute(
+        select(Download).where(
+            Download.download_id == download_id, 
+            Download.user_id == current_user.id
+        )
+    )
+    download = result.scalars().first()
+    
+    if not download:
+        raise HTTPException(status_code=404, detail="Download não encontrado")
+    
+    if download.type != "playlist" or download.status != "concluido":
+        raise HTTPException(status_code=409, detail="Apenas playlists concluídas podem ser baixadas como pacote")
+    
+    if not download.file_path or not await run_in_threadpool(os.path.isdir, download.file_path):
+        raise HTTPException(status_code=404, detail="Pasta da playlist não encontrada no sistema")
+    
+    entries = await run_in_threadpool(list_entries, download.file_path)
+    filename = f"{os.path.basename(os.path.normpath(download.file_path))}.{format}"
+    headers = {"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+    
+    if format == "zip":
+        headers["Accept-Ranges"] = "none"
+        return StreamingResponse(iter_zip(entries), media_type="application/zip", headers=headers)
+    
+    archive = await run_in_threadpool(TarArchive, entries)
+    headers.update({"Accept-Ranges": "bytes", "ETag": archive.etag})
+    
+    # Retomar a partir de um intervalo, se o pacote não mudou desde o pedido anterior
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range == archive.etag):
+        try:
+            byte_range = parse_byte_range(range_header, archive.size)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Intervalo inválido",
+                headers={"Content-Range": f"bytes */{archive.size}"}
+            )
+        
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{archive.size}"
+            headers["Content-Length"] = str(end - start + 1)
+            return StreamingResponse(
+                archive.iter_range(start, end), status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type="application/x-tar", headers=headers
+            )
+    
+    headers["Content-Length"] = str(archive.size)
+    return StreamingResponse(archive.iter_range(0, archive.size - 1), media_type="application/x-tar", headers=headers)
 
 @app.delete("/downloads/{download_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def cancel_download(
+def cancel_download(
     download_id: str,
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db)
@@ -414,24 +654,71 @@ async def cancel_download(
     
     return None
 
+def _encode_cursor(download: Download) -> str:
+    """Gera o cursor (opaco) que aponta para depois do download informado"""
+    raw = json.dumps([download.created_at.isoformat(), download.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def _decode_cursor(cursor: str):
+    """Lê um cursor gerado por _encode_cursor"""
+    try:
+        created_at, download_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(download_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def paginate_downloads(statement, limit: int, cursor: Optional[str] = None):
+    """
+    Paginação por cursor (keyset) em ordem de criação decrescente.
+    
+    Em vez de OFFSET, filtra a partir do último item da página anterior, então
+    cada página custa o mesmo (percorre o índice a partir do cursor).
+    Retorna a consulta da página, com um item a mais para split_page saber se
+    existe próxima página.
+    """
+    if cursor:
+        created_at, download_id = _decode_cursor(cursor)
+        # O primeiro termo (redundante) delimita a faixa do índice a percorrer
+        statement = statement.where(
+            Download.created_at <= created_at,
+            or_(Download.created_at < created_at, Download.id < download_id)
+        )
+    
+    return statement.order_by(Download.created_at.desc(), Download.id.desc()).limit(limit + 1)
+
+def split_page(rows, limit: int):
+    """Separa os itens da página e o cursor da próxima (None na última página)"""
+    next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
 @app.get("/downloads", response_model=List[DownloadResponse])
 async def list_downloads(
+    response: Response,
     status: Optional[str] = Query(None, description="Filtrar por status"),
+    limit: int = Query(DOWNLOADS_PAGE_SIZE, ge=1, le=DOWNLOADS_MAX_PAGE_SIZE, description="Itens por página"),
+    cursor: Optional[str] = Query(None, description="Cursor da página (header X-Next-Cursor da resposta anterior)"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Listar todos os downloads do usuário"""
-    query = db.query(Download).filter(Download.user_id == current_user.id)
+    """Listar os downloads do usuário (paginado, mais recentes primeiro)"""
+    statement = select(Download).where(Download.user_id == current_user.id)
     
     if status:
         if status not in ["na_fila", "processando", "concluido", "erro", "cancelado"]:
             raise HTTPException(status_code=400, detail="Status inválido")
-        query = query.filter(Download.status == status)
+        statement = statement.where(Download.status == status)
     
-    return query.order_by(Download.created_at.desc()).all()
+    result = await db.execute(paginate_downloads(statement, limit, cursor))
+    downloads, next_cursor = split_page(result.scalars().all(), limit)
+    
+    # O cursor da próxima página vai no header para manter o corpo como lista
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return downloads
 
 @app.get("/queue/status")
-async def get_queue_status(
+def get_queue_status(
     current_user: User = Depends(get_current_active_user)
 ):
     """Obter status da fila de downloads"""
@@ -448,36 +735,69 @@ async def get_queue_status(
         "max_concurrent": queue_status["max_concurrent"]
     }
 
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(verify_metrics_access)])
+def get_metrics_text():
+    """Métricas da fila, dos workers e das etapas do download no formato do Prometheus"""
+    return PlainTextResponse(
+        get_download_manager().render_metrics(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
 # --- Rota para servir arquivos ---
 
-@app.get("/files/{file_path:path}")
+# Tipo de mídia de cada extensão dos arquivos baixados (formatos mp3, remux e native)
+AUDIO_MEDIA_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".webm": "audio/webm",
+}
+
+def _open_media_file(headers, file_path: str, media_type: str, filename: str):
+    """Abre o arquivo e monta a resposta de /files (chamadas bloqueantes, executar no threadpool)"""
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado no sistema")
+    try:
+        file = open(file_path, "rb")
+    except OSError:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado no sistema")
+    
+    return media_file_response(headers, file, media_type, filename)
+
+@app.api_route("/files/{file_key}", methods=["GET", "HEAD"])
 async def get_file(
-    file_path: str,
+    file_key: str,
+    request: Request,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Servir um arquivo de download"""
-    # Verificar se o arquivo pertence ao usuário
-    download = db.query(Download).filter(
-        Download.file_path.endswith(file_path), 
-        Download.user_id == current_user.id
-    ).first()
+    """
+    Servir um arquivo de download pela chave do catálogo (file_key).
+    
+    Aceita Range (206, com If-Range) para players que avançam a faixa e para
+    retomar downloads, e If-None-Match/If-Modified-Since (304) com a ETag e o
+    Last-Modified enviados na resposta anterior.
+    """
+    # Consultar o catálogo pela chave (índice único), apenas entre os arquivos do usuário
+    result = await db.execute(
+        select(DownloadFile).where(
+            DownloadFile.file_key == file_key,
+            DownloadFile.user_id == current_user.id
+        )
+    )
+    download_file = result.scalars().first()
     
-    if not download:
+    if not download_file:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado")
     
-    # Verificar se o arquivo existe
-    if not os.path.exists(download.file_path):
-        raise HTTPException(status_code=404, detail="Arquivo não encontrado no sistema")
-    
     # Obter tipo de arquivo
-    file_type = "audio/mpeg" if download.file_path.endswith(".mp3") else "application/octet-stream"
+    extension = os.path.splitext(download_file.file_path)[1].lower()
+    file_type = AUDIO_MEDIA_TYPES.get(extension, "application/octet-stream")
     
-    from fastapi.responses import FileResponse
-    return FileResponse(
-        path=download.file_path,
-        media_type=file_type,
-        filename=os.path.basename(download.file_path)
+    # Abrir e inspecionar o arquivo fora do event loop (o envio usa o mesmo arquivo aberto)
+    return await run_in_threadpool(
+        _open_media_file, request.headers, download_file.file_path, file_type, download_file.file_name
     )
 
 # --- Iniciar a aplicação ---
@@ -0,0 +1,170 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Envio dos arquivos de áudio de /files com intervalos de bytes (Range),
+validadores (ETag e Last-Modified) e GET condicional
+"""
+import os
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import BinaryIO, Mapping, Optional
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException, status
+from starlette.responses import Response
+
+from archive import CHUNK_SIZE, parse_byte_range
+from metrics import get_metrics
+
+# Os arquivos são de um usuário (rota autenticada): o cliente pode guardá-los,
+# mas revalida a cada uso (If-None-Match), recebendo 304 se nada mudou
+CACHE_CONTROL = "private, no-cache"
+
+def file_etag(stat_result: os.stat_result) -> str:
+    """
+    ETag forte a partir da identidade do arquivo (dispositivo e inode), do
+    tamanho e da data de modificação em nanossegundos. Um arquivo regravado
+    (os.replace ao concluir um download) tem outro inode e, portanto, outra ETag.
+    """
+    identity = f"{stat_result.st_dev}:{stat_result.st_ino}:{stat_result.st_size}:{stat_result.st_mtime_ns}"
+    return f'"{hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32]}"'
+
+def is_not_modified(headers: Mapping[str, str], etag: str, last_modified: float) -> bool:
+    """
+    Indica se o cliente já tem esta versão do arquivo. If-None-Match tem
+    precedência; If-Modified-Since só é considerado quando ele não é enviado.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        # Comparação fraca: W/"x" corresponde a "x"
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return False
+    return int(last_modified) <= since
+
+class MediaFileResponse(Response):
+    """
+    Envia length bytes de um arquivo já aberto, a partir de offset.
+
+    Se o servidor ASGI oferece a extensão http.response.zerocopysend, o corpo
+    é enviado por ele direto do descritor (sendfile, sem passar pelo Python);
+    com http.response.pathsend, o arquivo inteiro é enviado pelo caminho.
+    Caso contrário, o arquivo é lido em blocos numa thread. O arquivo é
+    fechado ao final, e a leitura para se o cliente desconectar.
+    """
+
+    def __init__(self, file: BinaryIO, offset: int, length: int, status_code: int,
+                 headers: Mapping[str, str], media_type: Optional[str] = None):
+        self.file = file
+        self.offset = offset
+        self.length = length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers(headers)
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if scope["method"].upper() == "HEAD" or self.length == 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+                return
+
+            async with anyio.create_task_group() as task_group:
+                async def send_body():
+                    await self._send_body(scope, send)
+                    task_group.cancel_scope.cancel()
+
+                task_group.start_soon(send_body)
+                while (await receive())["type"] != "http.disconnect":
+                    pass
+                task_group.cancel_scope.cancel()
+        finally:
+            self.file.close()
+
+    async def _send_body(self, scope, send):
+        """Envia o corpo pelo meio mais direto que o servidor oferece"""
+        extensions = scope.get("extensions") or {}
+        if "http.response.zerocopysend" in extensions:
+            await send({
+                "type": "http.response.zerocopysend", "file": self.file,
+                "offset": self.offset, "count": self.length, "more_body": False
+            })
+        elif "http.response.pathsend" in extensions and self.status_code == status.HTTP_200_OK:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.file.name)})
+        else:
+            await anyio.to_thread.run_sync(self.file.seek, self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(self.file.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"Arquivo alterado durante o envio: {self.file.name}")
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+        get_metrics().inc("spotdown_served_bytes_total", self.length, status=self.status_code)
+
+def media_file_response(headers: Mapping[str, str], file: BinaryIO, media_type: str, filename: str) -> Response:
+    """
+    Monta a resposta de um arquivo aberto conforme os headers do pedido:
+    304 se o cliente já tem esta versão, 206 para um intervalo (Range, com
+    If-Range), 416 para um intervalo fora do arquivo e 200 com o arquivo inteiro.
+    Consulta o arquivo (fstat): em rotas async, executar no threadpool.
+    """
+    stat_result = os.fstat(file.fileno())
+    size = stat_result.st_size
+    etag = file_etag(stat_result)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    response_headers = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    if is_not_modified(headers, etag, stat_result.st_mtime):
+        file.close()
+        get_metrics().inc("spotdown_served_files_total", status=status.HTTP_304_NOT_MODIFIED)
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=response_headers)
+
+    response_headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{quote(filename)}"
+
+    # Intervalo pedido, se a versão do arquivo é a mesma do pedido anterior (If-Range)
+    range_header = headers.get("range")
+    if_range = headers.get("if-range")
+    if range_header and (if_range is None or if_range in (etag, last_modified)):
+        try:
+            byte_range = parse_byte_range(range_header, size)
+        except ValueError:
+            file.close()
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Intervalo inválido",
+                headers={"Content-Range": f"bytes */{size}"}
+            )
+
+        if byte_range:
+            start, end = byte_range
+            response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            response_headers["Content-Length"] = str(end - start + 1)
+            get_metrics().inc("spotdown_served_files_total", status=status.HTTP_206_PARTIAL_CONTENT)
+            return MediaFileResponse(
+                file, start, end - start + 1, status.HTTP_206_PARTIAL_CONTENT, response_headers, media_type
+            )
+
+    response_headers["Content-Length"] = str(size)
+    get_metrics().inc("spotdown_served_files_total", status=status.HTTP_200_OK)
+    return MediaFileResponse(file, 0, size, status.HTTP_200_OK, response_headers, media_type)
@@ -0,0 +1,158 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Métricas no formato de texto do Prometheus
+"""
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Limites (segundos) dos buckets dos histogramas de latência
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+
+# Nome, tipo e descrição das métricas conhecidas
+METRICS = {
+    "spotdown_queue_wait_seconds": ("histogram", "Tempo entre a entrada do download na fila e o início da execução"),
+    "spotdown_stage_duration_seconds": ("histogram", "Duração de cada etapa do download"),
+    "spotdown_pipeline_wait_seconds": ("histogram", "Tempo de espera na fila de cada etapa do pipeline"),
+    "spotdown_stage_errors_total": ("counter", "Erros por etapa do download"),
+    "spotdown_downloaded_bytes_total": ("counter", "Bytes de mídia baixados do YouTube"),
+    "spotdown_served_files_total": ("counter", "Respostas de /files por status (200, 206 ou 304)"),
+    "spotdown_served_bytes_total": ("counter", "Bytes de áudio enviados por /files"),
+    "spotdown_jobs_total": ("counter", "Jobs executados pelos workers"),
+    "spotdown_worker_busy_seconds_total": ("counter", "Tempo total dos workers executando jobs"),
+    "spotdown_workers": ("gauge", "Processos worker no pool"),
+    "spotdown_workers_busy": ("gauge", "Workers executando um job"),
+    "spotdown_queue_size": ("gauge", "Downloads aguardando na fila"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas de um processo.
+
+    Os workers registram as próprias medições e as enviam ao gerenciador
+    (take_delta) junto com os eventos de status; o gerenciador soma tudo no
+    registro do processo da API (merge), que é exposto em /metrics.
+    """
+
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        """Incrementa um contador"""
+        key = (name, _labels(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Registra uma medição em um histograma"""
+        key = (name, _labels(labels))
+        with self.lock:
+            # Contagem por bucket (não acumulada), seguida da soma e do total de medições
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[index] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @contextmanager
+    def time_stage(self, stage: str):
+        """Mede a duração de uma etapa e conta as falhas dela"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.inc("spotdown_stage_errors_total", stage=stage)
+            raise
+        finally:
+            self.observe("spotdown_stage_duration_seconds", time.perf_counter() - start, stage=stage)
+
+    def take_delta(self) -> Dict[str, Any]:
+        """Retorna as medições acumuladas desde a última chamada e zera o registro"""
+        with self.lock:
+            delta = {"counters": self.counters, "histograms": self.histograms}
+            self.counters = {}
+            self.histograms = {}
+        return delta
+
+    def merge(self, delta: Dict[str, Any]):
+        """Soma as medições recebidas de outro processo"""
+        with self.lock:
+            for key, value in delta["counters"].items():
+                self.counters[key] = self.counters.get(key, 0.0) + value
+            for key, values in delta["histograms"].items():
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    self.histograms[key] = list(values)
+                else:
+                    for index, value in enumerate(values):
+                        histogram[index] += value
+
+    def render(self, gauges: Dict[str, float] = None) -> str:
+        """Gera o texto de exposição do Prometheus (gauges são calculados na hora da coleta)"""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {key: list(values) for key, values in self.histograms.items()}
+
+        series: Dict[str, List[str]] = {}
+        for (name, labels), value in sorted(counters.items()):
+            series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        for (name, labels), values in sorted(histograms.items()):
+            lines = series.setdefault(name, [])
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} "
+                             f"{_format_value(cumulative)}")
+            lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {_format_value(values[-1])}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]}")
+            lines.append(f"{name}_count{_format_labels(labels)} {_format_value(values[-1])}")
+
+        for name, value in (gauges or {}).items():
+            series.setdefault(name, []).append(f"{name} {_format_value(value)}")
+
+        output = []
+        for name, lines in series.items():
+            kind, description = METRICS.get(name, ("untyped", ""))
+            output.append(f"# HELP {name} {description}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(lines)
+        return "\n".join(output) + "\n"
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    """Labels em forma ordenada e imutável (usada como chave)"""
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels: Labels) -> str:
+    """Formata os labels no padrão {chave="valor",...}"""
+    if not labels:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    """Formata números inteiros sem casas decimais"""
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+# Registro do processo atual
+metrics = MetricsRegistry()
+
+def get_metrics() -> MetricsRegistry:
+    """Retorna o registro de métricas do processo atual"""
+    return metrics
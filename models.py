@@ -8,16 +8,25 @@ Licensed under MIT License - see LICENSE file for details.
 
 Modelos do banco de dados e esquemas Pydantic
 """
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text
+import os
+import hashlib
+from sqlalchemy import Boolean, Column, DateTime, Double, Float, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, List, Dict, Any, Annotated
+from typing import Optional, List, Dict, Any, Annotated, Literal
 from datetime import datetime as py_datetime
 
 # Define SQLAlchemy DateTime as annotated datetime for Pydantic
 SQLAlchemyDateTime = Annotated[py_datetime, None]
 
+# Formato dos arquivos baixados: mp3 (convertido com o FFmpeg), remux (áudio original
+# copiado, sem recodificar, para um contêiner só de áudio) ou native (arquivo como baixado)
+OutputFormat = Literal["mp3", "remux", "native"]
+
+# Status a partir dos quais um download não muda mais
+FINAL_STATUSES = ("concluido", "erro", "cancelado")
+
 # Definição da classe Base para modelos SQLAlchemy
 Base = declarative_base()
 
@@ -33,6 +42,10 @@ class User(Base):
     hashed_password = Column(String(255), nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
     is_admin = Column(Boolean, default=False, nullable=False)
+    # Divisão dos slots de download: peso do usuário e limite de downloads
+    # simultâneos (None = padrão da configuração, 0 = sem limite)
+    download_weight = Column(Integer, default=1, server_default="1", nullable=False)
+    max_concurrent_downloads = Column(Integer, nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
 
@@ -46,6 +59,7 @@ class SpotifyConfig(Base):
     client_secret = Column(String(100), nullable=False)
     redirect_uri = Column(String(255), nullable=False)
     download_path = Column(String(255), nullable=False)
+    output_format = Column(String(10), default="mp3", server_default="mp3", nullable=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
 
@@ -66,6 +80,57 @@ class Download(Base):
     error_message = Column(Text, nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    # Fila persistente: prioridade (1-10, menor = mais alta), faixas simultâneas (playlists),
+    # formato de saída (None = o da configuração do usuário), tentativas e o lease do
+    # processo que está executando o job
+    priority = Column(Integer, default=5, server_default="5", nullable=False)
+    workers = Column(Integer, nullable=True)
+    output_format = Column(String(10), nullable=True)
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    lease_owner = Column(String(64), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    
+    # Entrada na fila (epoch em segundos, com fração; DOUBLE porque o FLOAT do MySQL
+    # perderia os segundos): created_at só tem precisão de segundos, insuficiente
+    # para medir a espera na fila
+    enqueued_at = Column(Double, nullable=True)
+    
+    # Índices para a listagem paginada por usuário (com e sem filtro de status)
+    # e para a fila (usuários com jobs aguardando e próximo job de cada um)
+    __table_args__ = (
+        Index("ix_downloads_user_created", "user_id", "created_at", "id"),
+        Index("ix_downloads_user_status_created", "user_id", "status", "created_at", "id"),
+        Index("ix_downloads_queue", "status", "user_id", "priority", "created_at", "id"),
+    )
+    
+    @property
+    def file_key(self) -> Optional[str]:
+        """Chave do arquivo de uma faixa concluída no catálogo (usada em /files)"""
+        if self.type == "track" and self.status == "concluido" and self.file_path:
+            return make_file_key(self.download_id, 0)
+        return None
+
+class DownloadFile(Base):
+    """Catálogo dos arquivos baixados: chave estável -> caminho do arquivo"""
+    __tablename__ = "download_files"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    file_key = Column(String(32), unique=True, index=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    download_id = Column(String(36), ForeignKey("downloads.download_id", ondelete="CASCADE"), index=True, nullable=False)
+    track_index = Column(Integer, nullable=False)  # 0 para faixas; posição na playlist (a partir de 1)
+    file_path = Column(String(512), nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    
+    @property
+    def file_name(self) -> str:
+        """Nome do arquivo (sem a pasta)"""
+        return os.path.basename(self.file_path)
+
+def make_file_key(download_id: str, track_index: int) -> str:
+    """Chave estável de um arquivo: hash do download e da posição da faixa"""
+    return hashlib.sha256(f"{download_id}:{track_index}".encode("utf-8")).hexdigest()[:32]
 
 # --- Esquemas Pydantic ---
 
@@ -87,11 +152,18 @@ class UserUpdate(BaseModel):
     
     model_config = {"from_attributes": True}
 
+class AdminUserUpdate(UserUpdate):
+    """Esquema para atualização de usuários pelo admin (inclui a divisão dos slots de download)"""
+    download_weight: Optional[int] = Field(None, ge=1, le=100)
+    max_concurrent_downloads: Optional[int] = Field(None, ge=0)  # 0 = sem limite
+
 class UserResponse(UserBase):
     """Esquema para resposta de usuários"""
     id: int
     is_active: bool
     is_admin: bool
+    download_weight: int = 1
+    max_concurrent_downloads: Optional[int] = None
     created_at: SQLAlchemyDateTime
     
     model_config = {"from_attributes": True}
@@ -107,6 +179,7 @@ class SpotifyConfigBase(BaseModel):
     client_secret: str
     redirect_uri: str = "http://127.0.0.1:8888/callback"
     download_path: str = "./downloads"
+    output_format: OutputFormat = "mp3"
     
     model_config = {"from_attributes": True}
 
@@ -137,6 +210,8 @@ class DownloadRequest(BaseModel):
     spotify_id: str
     type: str = "track"  # track ou playlist
     priority: int = Field(5, ge=1, le=10)  # 1-10, onde 1 é maior prioridade
+    workers: Optional[int] = Field(None, ge=1, le=16)  # Faixas simultâneas (apenas playlists)
+    output_format: Optional[OutputFormat] = None  # Padrão: o formato da configuração do Spotify
 
 class DownloadStatus(BaseModel):
     """Esquema para status de download"""
@@ -156,12 +231,22 @@ class DownloadResponse(BaseModel):
     status: str
     progress: float
     file_path: Optional[str] = None
+    file_key: Optional[str] = None
+    output_format: Optional[str] = None
     error_message: Optional[str] = None
     created_at: SQLAlchemyDateTime
     updated_at: SQLAlchemyDateTime
     
     model_config = {"from_attributes": True}
 
+class DownloadFileResponse(BaseModel):
+    """Esquema para um arquivo de download no catálogo"""
+    file_key: str
+    track_index: int
+    file_name: str
+    
+    model_config = {"from_attributes": True}
+
 class SearchResult(BaseModel):
     """Esquema para resultado de pesquisa"""
     id: str
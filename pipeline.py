@@ -0,0 +1,211 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Pipeline de download em etapas, cada uma com fila e limite próprios
+"""
+import os
+import time
+import random
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import TRANSCODE_WORKERS, TRANSCODE_SLOTS_PATH
+from metrics import get_metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Etapas limitadas pela rede (largura definida por job) e pela CPU (largura = núcleos)
+NETWORK_STAGES = ("resolve", "search", "fetch")
+CPU_STAGES = ("transcode",)
+
+# Etapa: (nome, função que recebe o item e retorna o resultado final ou None para seguir)
+Step = Tuple[str, Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]]
+
+class ProcessSlots:
+    """
+    Semáforo entre processos: cada vaga é um arquivo travado enquanto está em uso.
+
+    A trava é liberada pelo sistema operacional quando o processo termina (ex.:
+    worker encerrado ao cancelar um download), então uma vaga nunca se perde.
+    """
+
+    def __init__(self, path: str = TRANSCODE_SLOTS_PATH, count: int = TRANSCODE_WORKERS):
+        self.path = path
+        self.count = max(count, 1)
+        os.makedirs(path, exist_ok=True)
+
+    def acquire(self, poll_interval: float = 0.05):
+        """Aguarda uma vaga livre e retorna o arquivo travado (devolver com release)"""
+        while True:
+            first = random.randrange(self.count)
+            for index in range(self.count):
+                slot = (first + index) % self.count
+                handle = open(os.path.join(self.path, f"slot_{slot}.lock"), "a+b")
+                if _try_lock(handle):
+                    return handle
+                handle.close()
+            time.sleep(poll_interval)
+
+    def release(self, handle):
+        """Libera a vaga obtida com acquire"""
+        try:
+            _unlock(handle)
+        finally:
+            handle.close()
+
+def _try_lock(handle) -> bool:
+    """Trava o arquivo sem bloquear. Retorna False se outro processo ou thread já o travou"""
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+def _unlock(handle):
+    """Destrava um arquivo travado por _try_lock"""
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+class DownloadPipeline:
+    """
+    Executa os itens de um job (as faixas de uma playlist) em etapas: resolver
+    os metadados, buscar no YouTube, baixar a mídia e converter o áudio.
+
+    Cada etapa tem a própria fila (um executor). As etapas de rede usam
+    io_workers threads; a conversão usa cpu_workers threads e, além disso,
+    uma vaga de ProcessSlots, que limita as conversões somando todos os
+    processos worker ao número de núcleos. Assim uma faixa sendo convertida
+    não ocupa uma vaga de rede e um download lento não segura um núcleo.
+    """
+
+    def __init__(self, io_workers: int, cpu_workers: int = TRANSCODE_WORKERS,
+                 slots: Optional[ProcessSlots] = None, name: str = "pipeline"):
+        self.slots = slots if slots is not None else get_transcode_slots()
+        self.metrics = get_metrics()
+
+        # Um executor por etapa, na ordem do pipeline (usada também no encerramento)
+        self.executors: Dict[str, ThreadPoolExecutor] = {}
+        for stage in NETWORK_STAGES + CPU_STAGES:
+            workers = cpu_workers if stage in CPU_STAGES else io_workers
+            self.executors[stage] = ThreadPoolExecutor(
+                max_workers=max(workers, 1), thread_name_prefix=f"{name}_{stage}"
+            )
+
+    def submit(self, steps: List[Step], item: Dict[str, Any]) -> Future:
+        """
+        Envia um item pelas etapas, em sequência. Cada função recebe o item
+        (onde pode guardar dados para as próximas) e retorna o resultado final,
+        encerrando o item, ou None para seguir à próxima etapa. O resultado da
+        última etapa é o resultado do item.
+        """
+        result = Future()
+        self._submit_step(steps, 0, item, result)
+        return result
+
+    def _submit_step(self, steps: List[Step], index: int, item: Dict[str, Any], result: Future):
+        """Coloca o item na fila da etapa steps[index]"""
+        stage, function = steps[index]
+        try:
+            future = self.executors[stage].submit(self._run_step, stage, function, item, time.perf_counter())
+        except Exception as e:
+            result.set_exception(e)
+            return
+        future.add_done_callback(lambda done: self._step_done(steps, index, item, result, done))
+
+    def _run_step(self, stage: str, function, item: Dict[str, Any], queued_at: float):
+        """Executa uma etapa (as de CPU dentro de uma vaga compartilhada entre processos)"""
+        if stage not in CPU_STAGES:
+            self.metrics.observe("spotdown_pipeline_wait_seconds", time.perf_counter() - queued_at, stage=stage)
+            return function(item)
+
+        handle = self.slots.acquire()
+        try:
+            self.metrics.observe("spotdown_pipeline_wait_seconds", time.perf_counter() - queued_at, stage=stage)
+            return function(item)
+        finally:
+            self.slots.release(handle)
+
+    def _step_done(self, steps: List[Step], index: int, item: Dict[str, Any], result: Future, future: Future):
+        """Encerra o item ou o envia para a próxima etapa"""
+        try:
+            value = future.result()
+        except Exception as e:
+            result.set_exception(e)
+            return
+
+        if value is not None or index + 1 == len(steps):
+            result.set_result(value)
+        else:
+            self._submit_step(steps, index + 1, item, result)
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        """
+        Encerra os executores (na ordem das etapas). Por padrão aguarda os itens
+        em andamento; com cancel_futures, os itens ainda nas filas são cancelados
+        (e os que passariam à próxima etapa terminam com erro).
+        """
+        for executor in self.executors.values():
+            executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Em caso de erro (ex.: falha ao listar a playlist), não baixar as faixas
+        # que ainda estão nas filas nem aguardar as que estão em andamento
+        if exc_type is not None:
+            self.shutdown(wait=False, cancel_futures=True)
+        else:
+            self.shutdown()
+
+def run_steps(steps: List[Step], item: Dict[str, Any], slots: Optional[ProcessSlots] = None) -> Optional[Dict[str, Any]]:
+    """
+    Executa as etapas de um único item em sequência, na thread atual, sem os
+    executores do pipeline (usado nos jobs de uma faixa, em que não há outros
+    itens para sobrepor). As etapas de CPU continuam ocupando uma vaga de
+    ProcessSlots, mantendo o limite de conversões somando todos os processos.
+    """
+    slots = slots if slots is not None else get_transcode_slots()
+    metrics = get_metrics()
+    result = None
+    for stage, function in steps:
+        if stage in CPU_STAGES:
+            queued_at = time.perf_counter()
+            handle = slots.acquire()
+            try:
+                metrics.observe("spotdown_pipeline_wait_seconds", time.perf_counter() - queued_at, stage=stage)
+                result = function(item)
+            finally:
+                slots.release(handle)
+        else:
+            result = function(item)
+        
+        if result is not None:
+            return result
+    return result
+
+# Vagas de conversão do processo atual
+transcode_slots = None
+
+def get_transcode_slots() -> ProcessSlots:
+    """Retorna as vagas de conversão compartilhadas (criadas no primeiro uso)"""
+    global transcode_slots
+    if transcode_slots is None:
+        transcode_slots = ProcessSlots()
+    return transcode_slots
@@ -0,0 +1,91 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Manifesto de faixas concluídas de uma playlist (para retomar downloads)
+"""
+import os
+import json
+import hashlib
+import threading
+from typing import Any, Dict, Optional
+
+MANIFEST_FILENAME = ".manifest.jsonl"
+
+class PlaylistManifest:
+    """
+    Registro em disco das faixas já concluídas de uma playlist.
+
+    Cada faixa concluída é acrescentada como uma linha JSON (ID da faixa,
+    caminho, tamanho e SHA-256). Como o arquivo só recebe linhas novas, um
+    processo encerrado no meio da playlist perde no máximo a última linha,
+    que é ignorada na leitura. Ao baixar a playlist novamente, as faixas
+    cujo arquivo ainda confere com o manifesto são puladas.
+    """
+
+    def __init__(self, playlist_path: str):
+        self.path = os.path.join(playlist_path, MANIFEST_FILENAME)
+        self.lock = threading.Lock()
+        self.entries: Dict[str, Dict[str, Any]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Lê o manifesto, ignorando linhas incompletas ou inválidas"""
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+
+        with open(self.path, "r", encoding="utf-8") as manifest:
+            for line in manifest:
+                try:
+                    entry = json.loads(line)
+                    entries[entry["track_id"]] = entry
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return entries
+
+    def verify(self, track_id: str) -> Optional[str]:
+        """Retorna o caminho da faixa se ela consta no manifesto e o arquivo confere"""
+        entry = self.entries.get(track_id)
+        if not entry:
+            return None
+
+        file_path = entry["file_path"]
+        try:
+            if os.path.getsize(file_path) != entry["size"]:
+                return None
+            if _sha256(file_path) != entry["sha256"]:
+                return None
+        except OSError:
+            return None
+        return file_path
+
+    @staticmethod
+    def build_entry(track_id: str, file_path: str) -> Dict[str, Any]:
+        """Calcula a entrada do manifesto de um arquivo recém-baixado"""
+        return {
+            "track_id": track_id,
+            "file_path": file_path,
+            "size": os.path.getsize(file_path),
+            "sha256": _sha256(file_path)
+        }
+
+    def record(self, entry: Dict[str, Any]):
+        """Acrescenta uma faixa concluída ao manifesto"""
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as manifest:
+                manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                manifest.flush()
+                os.fsync(manifest.fileno())
+            self.entries[entry["track_id"]] = entry
+
+def _sha256(file_path: str) -> str:
+    """Calcula o SHA-256 de um arquivo lendo em blocos"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,145 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Buffer de progresso para reduzir escritas no banco de dados
+"""
+import time
+import threading
+from typing import Callable, Dict, Any, Optional
+
+from config import PROGRESS_FLUSH_INTERVAL, PROGRESS_MIN_DELTA
+
+# Campos que, quando informados, exigem escrita imediata
+_IMMEDIATE_FIELDS = ("file_path", "error_message", "name", "artist")
+
+class ProgressBuffer:
+    """
+    Agrupa atualizações de progresso de cada download antes de gravá-las.
+
+    Mudanças de status e de campos descritivos são gravadas imediatamente.
+    Atualizações que só alteram o progresso são acumuladas e gravadas quando
+    o progresso avança pelo menos min_delta pontos ou quando interval segundos
+    se passaram desde a última escrita. Se nenhuma atualização nova chegar (ex.:
+    download parado), um timer grava a pendente ao fim do intervalo.
+    Atualizações substituídas por outras mais recentes nunca chegam ao banco e
+    são contadas como escritas evitadas.
+    
+    Como o timer grava a partir de outra thread, a função write deve poder ser
+    chamada fora da thread do download.
+    """
+
+    def __init__(self, write: Callable[..., Any], interval: float = PROGRESS_FLUSH_INTERVAL,
+                 min_delta: float = PROGRESS_MIN_DELTA):
+        """
+        Args:
+            write: Função que grava o status (mesma assinatura de update_download_status)
+            interval: Intervalo máximo, em segundos, entre escritas de progresso
+            min_delta: Avanço mínimo de progresso (em pontos percentuais) que força escrita
+        """
+        self.write = write
+        self.interval = interval
+        self.min_delta = min_delta
+        self.lock = threading.Lock()
+
+        # Estado por download_id
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.last_written: Dict[str, Dict[str, Any]] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.timers: Dict[str, threading.Timer] = {}
+
+    def update(self, download_id: str, status: str, message: str, progress: Optional[float] = None,
+               **fields) -> bool:
+        """
+        Registra uma atualização e grava no banco se necessário
+
+        Returns:
+            bool: True se a atualização foi gravada, False se ficou no buffer
+        """
+        update = {"status": status, "message": message, "progress": progress, **fields}
+
+        with self.lock:
+            stats = self.stats.setdefault(download_id, {"writes": 0, "saved": 0})
+            last = self.last_written.get(download_id)
+
+            if not self._should_write(last, update):
+                # Substituir a atualização pendente anterior (que nunca será gravada)
+                if download_id in self.pending:
+                    stats["saved"] += 1
+                self.pending[download_id] = update
+                self._schedule_flush(download_id, last)
+                return False
+
+            # A atualização atual substitui qualquer pendente
+            if self.pending.pop(download_id, None) is not None:
+                stats["saved"] += 1
+            self._cancel_flush(download_id)
+            self._write(download_id, update)
+            return True
+
+    def flush(self, download_id: str):
+        """Grava a atualização pendente de um download, se houver (chamada também pelo timer)"""
+        with self.lock:
+            self._cancel_flush(download_id)
+            update = self.pending.pop(download_id, None)
+            if update is not None:
+                try:
+                    self._write(download_id, update)
+                except Exception as e:
+                    print(f"Erro ao gravar o progresso do download {download_id}: {str(e)}")
+
+    def pop_stats(self, download_id: str) -> Dict[str, int]:
+        """Remove o estado do download e retorna o contador de escritas feitas e evitadas"""
+        with self.lock:
+            self._cancel_flush(download_id)
+            self.pending.pop(download_id, None)
+            self.last_written.pop(download_id, None)
+            return self.stats.pop(download_id, {"writes": 0, "saved": 0})
+
+    def _schedule_flush(self, download_id: str, last: Dict[str, Any]):
+        """Agenda a gravação da atualização pendente para o fim do intervalo (chamar com self.lock)"""
+        if download_id in self.timers:
+            return
+        delay = max(self.interval - (time.monotonic() - last["time"]), 0.0)
+        timer = threading.Timer(delay, self.flush, args=(download_id,))
+        timer.daemon = True
+        self.timers[download_id] = timer
+        timer.start()
+
+    def _cancel_flush(self, download_id: str):
+        """Cancela a gravação agendada de um download (chamar com self.lock)"""
+        timer = self.timers.pop(download_id, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _should_write(self, last: Optional[Dict[str, Any]], update: Dict[str, Any]) -> bool:
+        """Decide se a atualização deve ser gravada imediatamente"""
+        if last is None or last["status"] != update["status"]:
+            return True
+
+        if any(update.get(field) for field in _IMMEDIATE_FIELDS):
+            return True
+
+        if update["progress"] is None:
+            return False
+
+        if abs(update["progress"] - (last["progress"] or 0.0)) >= self.min_delta:
+            return True
+
+        return time.monotonic() - last["time"] >= self.interval
+
+    def _write(self, download_id: str, update: Dict[str, Any]):
+        """Grava a atualização e registra o momento da escrita (chamar com self.lock)"""
+        self.write(download_id, **update)
+        self.stats[download_id]["writes"] += 1
+
+        last = self.last_written.get(download_id, {"progress": None})
+        self.last_written[download_id] = {
+            "status": update["status"],
+            "progress": update["progress"] if update["progress"] is not None else last["progress"],
+            "time": time.monotonic()
+        }
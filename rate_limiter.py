@@ -0,0 +1,175 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Limite de requisições compartilhado entre a API e os processos de download
+"""
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+from cache import connect_shared
+from config import (
+    RATE_LIMIT_PATH, RATE_LIMIT_DEFAULT_BACKOFF,
+    SPOTIFY_RATE_LIMIT, SPOTIFY_RATE_BURST,
+    YOUTUBE_SEARCH_RATE_LIMIT, YOUTUBE_SEARCH_RATE_BURST,
+    YOUTUBE_MEDIA_RATE_LIMIT, YOUTUBE_MEDIA_RATE_BURST
+)
+
+# Limites por serviço: (requisições por segundo, rajada máxima); taxa 0 = sem limite
+UPSTREAM_LIMITS: Dict[str, Tuple[float, float]] = {
+    "spotify": (SPOTIFY_RATE_LIMIT, SPOTIFY_RATE_BURST),
+    "youtube_search": (YOUTUBE_SEARCH_RATE_LIMIT, YOUTUBE_SEARCH_RATE_BURST),
+    "youtube_media": (YOUTUBE_MEDIA_RATE_LIMIT, YOUTUBE_MEDIA_RATE_BURST),
+}
+
+class RateLimiter:
+    """
+    Token bucket por serviço armazenado em um arquivo SQLite.
+
+    Todos os processos usam o mesmo arquivo, então a taxa configurada vale para
+    o conjunto dos workers e não para cada um. Cada requisição consome uma
+    ficha; as fichas são repostas na taxa configurada até o tamanho da rajada.
+    Um 429 bloqueia o serviço para todos os processos pelo tempo do Retry-After.
+    """
+
+    def __init__(self, path: str = RATE_LIMIT_PATH, limits: Dict[str, Tuple[float, float]] = UPSTREAM_LIMITS):
+        self.path = path
+        self.limits = limits
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            " name TEXT PRIMARY KEY, tokens REAL NOT NULL,"
+            " updated_at REAL NOT NULL, blocked_until REAL NOT NULL DEFAULT 0)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Retorna a conexão da thread atual (recriada após fork), em modo autocommit"""
+        return connect_shared(self._local, self.path, isolation_level=None)
+
+    def _update(self, name: str, change) -> Any:
+        """
+        Lê o bucket (já reabastecido até agora), aplica change(tokens, blocked_until, now)
+        -> (tokens, blocked_until, resultado) e grava, tudo em uma transação exclusiva
+        """
+        rate, burst = self.limits[name]
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT tokens, updated_at, blocked_until FROM rate_buckets WHERE name = ?", (name,)
+            ).fetchone()
+            if row is None:
+                tokens, blocked_until = burst, 0.0
+            else:
+                tokens = min(burst, row[0] + max(now - row[1], 0) * rate)
+                blocked_until = row[2]
+
+            tokens, blocked_until, result = change(tokens, blocked_until, now)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated_at, blocked_until) "
+                "VALUES (?, ?, ?, ?)",
+                (name, tokens, now, blocked_until)
+            )
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def try_acquire(self, name: str, tokens: float = 1.0) -> float:
+        """Consome as fichas se houver; senão retorna quantos segundos esperar (0 = liberado)"""
+        if name not in self.limits:
+            return 0.0
+        rate, _ = self.limits[name]
+
+        def change(available, blocked_until, now):
+            # Um bloqueio (Retry-After) vale mesmo para serviços sem limite de taxa
+            if blocked_until > now:
+                return available, blocked_until, blocked_until - now
+            if rate <= 0:
+                return available, blocked_until, 0.0
+            if available >= tokens:
+                return available - tokens, blocked_until, 0.0
+            return available, blocked_until, (tokens - available) / rate
+
+        return self._update(name, change)
+
+    def acquire(self, name: str, tokens: float = 1.0) -> float:
+        """Aguarda até poder fazer a requisição. Retorna o tempo esperado (segundos)"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(name, tokens)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def block(self, name: str, seconds: float):
+        """Suspende o serviço em todos os processos (ex.: após um 429 com Retry-After)"""
+        if name not in self.limits:
+            return
+
+        def change(available, blocked_until, now):
+            return 0.0, max(blocked_until, now + seconds), None
+
+        self._update(name, change)
+
+    def budget(self) -> Dict[str, Any]:
+        """Fichas disponíveis e bloqueio atual de cada serviço"""
+        now = time.time()
+        rows = {
+            name: (tokens, updated_at, blocked_until)
+            for name, tokens, updated_at, blocked_until in self._connect().execute(
+                "SELECT name, tokens, updated_at, blocked_until FROM rate_buckets"
+            ).fetchall()
+        }
+
+        result = {}
+        for name, (rate, burst) in self.limits.items():
+            tokens, updated_at, blocked_until = rows.get(name, (burst, now, 0.0))
+            result[name] = {
+                "rate": rate,
+                "burst": burst,
+                "tokens": round(min(burst, tokens + max(now - updated_at, 0) * rate), 2) if rate > 0 else None,
+                "blocked_for": round(max(blocked_until - now, 0.0), 2)
+            }
+        return result
+
+def retry_after_seconds(value: Optional[str], default: float = RATE_LIMIT_DEFAULT_BACKOFF) -> float:
+    """Converte o header Retry-After (segundos ou data HTTP) em segundos"""
+    if not value:
+        return default
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return default
+
+# Instância do limitador no processo atual
+rate_limiter = None
+
+def get_rate_limiter() -> RateLimiter:
+    """Retorna a instância do limitador compartilhado (criada no primeiro uso)"""
+    global rate_limiter
+    if rate_limiter is None:
+        rate_limiter = RateLimiter()
+    return rate_limiter
@@ -0,0 +1,119 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Pool de clientes Spotify por usuário usado pelas rotas da API
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from config import SPOTIFY_CLIENT_POOL_SIZE, SPOTIFY_SEARCH_CACHE_TTL, SPOTIFY_SEARCH_CACHE_MAX_ENTRIES
+from cache import TTLCache
+from downloader import create_spotify_client, parse_search_results, _normalize_query
+
+class _UserClient:
+    """Cliente Spotify de um usuário e o cache das pesquisas feitas com ele"""
+
+    def __init__(self, config):
+        self.config_key = _config_key(config)
+        self.sp = create_spotify_client(config.user_id, config.client_id, config.client_secret, config.redirect_uri)
+        self.searches = TTLCache(SPOTIFY_SEARCH_CACHE_TTL, SPOTIFY_SEARCH_CACHE_MAX_ENTRIES)
+
+class SpotifyClientPool:
+    """
+    Mantém um cliente Spotify por usuário entre requisições, evitando recriar
+    o SpotifyOAuth (e reler o cache de token em disco) a cada pesquisa.
+
+    O cliente é recriado quando a configuração do usuário muda e os menos
+    usados são descartados ao atingir o limite do pool.
+    """
+
+    def __init__(self, max_entries: int = SPOTIFY_CLIENT_POOL_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.clients: "OrderedDict[int, _UserClient]" = OrderedDict()
+        self.search_hits = 0
+        self.search_misses = 0
+
+    def _get(self, config) -> _UserClient:
+        """Retorna o cliente do usuário, criando-o se não existir ou se a configuração mudou"""
+        with self.lock:
+            client = self.clients.get(config.user_id)
+            if client is not None and client.config_key == _config_key(config):
+                self.clients.move_to_end(config.user_id)
+                return client
+
+        client = _UserClient(config)
+        with self.lock:
+            self.clients[config.user_id] = client
+            self.clients.move_to_end(config.user_id)
+            while len(self.clients) > self.max_entries:
+                self.clients.popitem(last=False)
+        return client
+
+    def cached_search(self, user_id: int, query: str, limit: int, search_type: str):
+        """Resultado em cache de uma pesquisa recente do usuário (None se não houver)"""
+        with self.lock:
+            client = self.clients.get(user_id)
+        if client is None:
+            return None
+
+        items = client.searches.get(_search_key(query, limit, search_type))
+        if items is not None:
+            with self.lock:
+                self.search_hits += 1
+        return items
+
+    def search(self, config, query: str, limit: int = 5, search_type: str = "track") -> List[Dict[str, Any]]:
+        """Pesquisa no Spotify com o cliente do usuário, usando o cache de pesquisas"""
+        client = self._get(config)
+        key = _search_key(query, limit, search_type)
+
+        items = client.searches.get(key)
+        if items is not None:
+            with self.lock:
+                self.search_hits += 1
+            return items
+
+        with self.lock:
+            self.search_misses += 1
+        results = client.sp.search(q=query, limit=limit, type=search_type)
+        items = parse_search_results(results, search_type)
+        client.searches.set(key, items)
+        return items
+
+    def invalidate(self, user_id: int):
+        """Descarta o cliente (e as pesquisas em cache) de um usuário"""
+        with self.lock:
+            self.clients.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Clientes no pool e taxa de acerto do cache de pesquisas"""
+        with self.lock:
+            total = self.search_hits + self.search_misses
+            return {
+                "clients": len(self.clients),
+                "search_hits": self.search_hits,
+                "search_misses": self.search_misses,
+                "search_hit_rate": round(self.search_hits / total, 4) if total else 0.0
+            }
+
+def _config_key(config):
+    """Campos da configuração que exigem recriar o cliente quando mudam"""
+    return (config.client_id, config.client_secret, config.redirect_uri, config.updated_at)
+
+def _search_key(query: str, limit: int, search_type: str):
+    """Chave do cache de pesquisas"""
+    return (search_type, limit, _normalize_query(query))
+
+# Instância global do pool
+spotify_clients = SpotifyClientPool()
+
+def get_spotify_clients() -> SpotifyClientPool:
+    """Retorna a instância global do pool de clientes Spotify"""
+    return spotify_clients
@@ -0,0 +1,63 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Configuração comum dos testes: SQLite no lugar do MySQL e arquivos
+compartilhados (cache, limitador, slots de conversão) em uma pasta temporária
+"""
+import os
+import sys
+import tempfile
+
+# Antes de importar o projeto (config.py lê as variáveis na importação)
+WORK_DIR = tempfile.mkdtemp(prefix="spotdown_tests_")
+os.environ.setdefault("CACHE_PATH", os.path.join(WORK_DIR, "cache.db"))
+os.environ.setdefault("RATE_LIMIT_PATH", os.path.join(WORK_DIR, "ratelimit.db"))
+os.environ.setdefault("TRANSCODE_SLOTS_PATH", os.path.join(WORK_DIR, "transcode_slots"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Os workers da fila (forkserver) importam deste diretório as funções passadas em worker_init
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [TESTS_DIR, os.environ.get("PYTHONPATH")]))
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, User, SpotifyConfig
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    """Banco SQLite vazio, com as tabelas do projeto"""
+    url = f"sqlite:///{tmp_path / 'tests.db'}"
+    engine = create_engine(url)
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+    return url
+
+
+@pytest.fixture
+def session_factory(db_url):
+    engine = create_engine(db_url, connect_args={"check_same_thread": False})
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def user(session_factory, tmp_path):
+    """Usuário com configuração do Spotify (download_path na pasta do teste)"""
+    db = session_factory()
+    user = User(username="tests", email="tests@example.com", hashed_password="-")
+    db.add(user)
+    db.commit()
+    db.add(SpotifyConfig(user_id=user.id, client_id="-", client_secret="-",
+                         redirect_uri="-", download_path=str(tmp_path)))
+    db.commit()
+    user_id = user.id
+    db.close()
+    return user_id
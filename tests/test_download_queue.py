@@ -0,0 +1,234 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Testes da fila de downloads (DownloadQueueManager)
+"""
+import os
+import time
+import functools
+import threading
+import statistics
+import multiprocessing
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import database
+import downloader
+import download_queue
+from download_queue import DownloadQueueManager, _run_download_job
+from models import Download
+
+
+def bare_manager(db):
+    """Gerenciador sem threads nem workers, para testar o tratamento dos eventos"""
+    manager = DownloadQueueManager.__new__(DownloadQueueManager)
+    manager.db = db
+    manager.db_lock = threading.RLock()
+    manager.owner_id = "tests:1:manager"
+    manager.pending_jobs = False
+    manager.active_downloads = {}
+    manager.lock = threading.Lock()
+    manager.condition = threading.Condition(manager.lock)
+    return manager
+
+
+def add_download(db, user_id, download_id, **values):
+    values.setdefault("progress", 0.0)
+    download = Download(user_id=user_id, download_id=download_id, spotify_id="track", type="track", **values)
+    db.add(download)
+    db.commit()
+    return download
+
+
+class FailingDownloader:
+    """Downloader cujo download sempre falha"""
+
+    def __init__(self, db, user_id):
+        self.db = db
+        self.user_id = user_id
+
+    def download_track(self, track_id, download_id, output_format=None):
+        raise RuntimeError("falha no download")
+
+
+class FakeDownloader:
+    """
+    Downloader falso usado pelos workers de verdade. O spotify_id escolhe o
+    comportamento: "crash" encerra o processo, "slow" fica baixando até ser
+    interrompido e qualquer outro conclui em duration segundos (registrando
+    início e fim em log_path).
+    """
+
+    duration = 0.05
+    log_path = None
+
+    def __init__(self, db, user_id):
+        self.db = db
+        self.user_id = user_id
+
+    def download_track(self, track_id, download_id, output_format=None):
+        if track_id == "crash":
+            os._exit(1)
+        if track_id == "slow":
+            time.sleep(60)
+
+        start = time.time()
+        time.sleep(self.duration)
+        download = self.db.query(Download).filter(Download.download_id == download_id).first()
+        download.status = "concluido"
+        download.progress = 100.0
+        self.db.commit()
+        with open(self.log_path, "a") as log:
+            log.write(f"{start} {time.time()}\n")
+
+
+def configure_worker(db_url, log_path):
+    """SQLite dos testes e o downloader falso dentro de cada worker (worker_init)"""
+    engine = create_engine(db_url, connect_args={"check_same_thread": False})
+    database.engine = engine
+    database.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    FakeDownloader.log_path = log_path
+    downloader.SpotifyDownloader = FakeDownloader
+
+
+@pytest.fixture
+def manager(session_factory, db_url, tmp_path, monkeypatch):
+    """Gerenciador completo (threads e workers) com um único slot"""
+    monkeypatch.setattr(download_queue, "MAX_CONCURRENT_DOWNLOADS", 1)
+    worker_init = functools.partial(configure_worker, db_url, str(tmp_path / "jobs.log"))
+    manager = DownloadQueueManager(session_factory(), worker_init=worker_init)
+    yield manager
+    manager.shutdown()
+    manager.db.close()
+
+
+def wait_for(condition, timeout=15.0):
+    """Aguarda condition() ser verdadeira (falha o teste após timeout segundos)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return
+        time.sleep(0.02)
+    pytest.fail("Tempo esgotado aguardando a fila de downloads")
+
+
+def download_status(session_factory, download_id):
+    db = session_factory()
+    try:
+        return db.query(Download).filter_by(download_id=download_id).one()
+    finally:
+        db.close()
+
+
+def test_done_without_final_status_marks_job_as_error(session_factory, user, monkeypatch):
+    manager = bare_manager(session_factory())
+    add_download(manager.db, user, "orphan", status="processando", attempts=1,
+                 lease_owner=manager.owner_id)
+
+    # O download falha e a gravação do erro pelo worker também: o job fica "processando"
+    worker_db = session_factory()
+
+    def failing_commit():
+        raise OperationalError("UPDATE downloads", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(worker_db, "commit", failing_commit)
+    _run_download_job(worker_db, {}, FailingDownloader,
+                      {"download_id": "orphan", "user_id": user, "spotify_id": "track", "type": "track"})
+    worker_db.close()
+
+    manager.db.expire_all()
+    assert manager.db.query(Download).filter_by(download_id="orphan").one().status == "processando"
+
+    # O worker avisa o fim do job ("done")
+    conn, child_conn = multiprocessing.Pipe()
+    worker = SimpleNamespace(conn=conn, download_id="orphan", started_at=None,
+                             process=SimpleNamespace(is_alive=lambda: True))
+    manager.active_downloads["orphan"] = worker
+    child_conn.send(("done", "orphan", False))
+    with manager.condition:
+        manager._handle_worker_events(worker)
+
+    manager.db.expire_all()
+    download = manager.db.query(Download).filter_by(download_id="orphan").one()
+    assert download.status == "erro"
+    assert download.lease_owner is None and download.lease_expires_at is None
+    assert worker.download_id is None and not manager.active_downloads
+
+
+def test_queue_wait_uses_enqueue_timestamp(session_factory, user):
+    manager = bare_manager(session_factory())
+    download = add_download(manager.db, user, "waiting", status="na_fila", enqueued_at=time.time() - 0.25)
+
+    # Espera com fração de segundo (created_at tem precisão de segundos)
+    assert 0.25 <= manager._queue_wait(download) < 0.75
+
+    download.enqueued_at = None
+    assert manager._queue_wait(download) >= 0.0
+
+
+def test_done_keeps_final_status(session_factory, user):
+    manager = bare_manager(session_factory())
+    add_download(manager.db, user, "finished", status="concluido", progress=100.0, attempts=1,
+                 lease_owner=manager.owner_id)
+
+    manager._release_lease("finished")
+
+    manager.db.expire_all()
+    download = manager.db.query(Download).filter_by(download_id="finished").one()
+    assert download.status == "concluido"
+    assert download.lease_owner is None
+
+
+def test_idle_gap_between_jobs(manager, user, tmp_path):
+    jobs = 10
+    for i in range(jobs):
+        manager.enqueue_download(user, f"track{i}", "track")
+
+    log_path = tmp_path / "jobs.log"
+    wait_for(lambda: log_path.exists() and len(log_path.read_text().splitlines()) >= jobs)
+
+    # Com um único slot, o intervalo entre o fim de um job e o início do seguinte é tempo ocioso
+    spans = sorted(tuple(map(float, line.split())) for line in log_path.read_text().splitlines())
+    gaps = [spans[i + 1][0] - spans[i][1] for i in range(len(spans) - 1)]
+    assert statistics.median(gaps) < 0.1
+    assert max(gaps) < 1.0
+
+
+def test_cancelled_running_job_stays_cancelled(manager, user, session_factory):
+    download_id = manager.enqueue_download(user, "slow", "track")
+    wait_for(lambda: download_id in manager.active_downloads)
+    worker = manager.active_downloads[download_id]
+
+    assert manager.cancel_download(download_id, user)
+
+    # O worker é terminado no meio do download e o slot recebe um novo processo
+    wait_for(lambda: not worker.process.is_alive())
+    wait_for(lambda: manager._get_idle_worker() is not None)
+    time.sleep(0.5)
+    download = download_status(session_factory, download_id)
+    assert download.status == "cancelado"
+    assert download.lease_owner is None
+    assert not manager.active_downloads
+
+
+def test_crashed_worker_marks_job_as_error(manager, user, session_factory):
+    download_id = manager.enqueue_download(user, "crash", "track")
+
+    wait_for(lambda: download_status(session_factory, download_id).status == "erro")
+    download = download_status(session_factory, download_id)
+    assert download.error_message == "Processo de download encerrado inesperadamente"
+    assert download.lease_owner is None
+
+    # O slot continua atendendo a fila com um novo worker
+    next_id = manager.enqueue_download(user, "track0", "track")
+    wait_for(lambda: download_status(session_factory, next_id).status == "concluido")
@@ -0,0 +1,47 @@
+"""
+Spotify Downloader API - Educational Project
+Copyright (c) 2025 https://github.com/gaab0418
+
+This project is for educational purposes only.
+Licensed under MIT License - see LICENSE file for details.
+
+
+Testes do pipeline de etapas (DownloadPipeline)
+"""
+import time
+from concurrent.futures import wait
+
+import pytest
+
+from pipeline import DownloadPipeline
+
+
+def test_exit_with_error_cancels_queued_items():
+    done = []
+
+    def slow_step(item):
+        time.sleep(0.2)
+        done.append(item["index"])
+
+    futures = []
+    start = time.monotonic()
+    with pytest.raises(RuntimeError):
+        with DownloadPipeline(io_workers=1, name="tests") as pipeline:
+            for index in range(20):
+                futures.append(pipeline.submit([("resolve", slow_step), ("search", slow_step)], {"index": index}))
+            raise RuntimeError("falha ao listar a playlist")
+
+    # Sem aguardar as faixas: apenas a que já estava em execução chega ao fim da etapa
+    assert time.monotonic() - start < 0.2
+    wait(futures, timeout=5)
+    assert all(future.done() for future in futures)
+    assert done == [0]
+    assert all(future.exception() is not None for future in futures)
+
+
+def test_exit_without_error_waits_for_items():
+    with DownloadPipeline(io_workers=2, name="tests") as pipeline:
+        futures = [pipeline.submit([("resolve", lambda item: None), ("search", lambda item: item["index"])],
+                                   {"index": index}) for index in range(5)]
+
+    assert [future.result(timeout=0) for future in futures] == list(range(5))